@@ -0,0 +1,376 @@
+"""Async variant of the service layer used by the FastAPI endpoints.
+
+Network calls to Qdrant go through ``AsyncQdrantClient`` so a single worker
+can keep many requests in flight without holding a threadpool thread per
+request. CPU-bound work (chunking, embedding) is moved onto a dedicated
+executor so it neither blocks the event loop nor competes with Starlette's
+threadpool. Planning, caching and payload logic is shared with
+``services`` so both paths stay behaviourally identical.
+"""
+from __future__ import annotations
+
+import asyncio
+import contextvars
+import logging
+import os
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
+
+try:
+    from app.config import QDRANT_URL, CPU_EXECUTOR_WORKERS, QDRANT_SEARCH_TIMEOUT, QDRANT_CONNECT_RETRIES
+    from app.config import COLLECTION_CACHE_TTL
+    from app.models import IngestResult, SearchResult
+    from app.registry import CollectionRegistry
+    from app import services
+    from app.timing import stage
+    from app.upload import upload_plan_async
+    from app import metrics
+except ImportError:
+    from config import QDRANT_URL, CPU_EXECUTOR_WORKERS, QDRANT_SEARCH_TIMEOUT, QDRANT_CONNECT_RETRIES
+    from config import COLLECTION_CACHE_TTL
+    from models import IngestResult, SearchResult
+    from registry import CollectionRegistry
+    import services
+    from timing import stage
+    from upload import upload_plan_async
+    import metrics
+
+logger = logging.getLogger("docservice")
+
+_async_client = None
+_client_lock: asyncio.Lock | None = None
+_cpu_executor: ThreadPoolExecutor | None = None
+# With QDRANT_URL=:memory: the async client is a database of its own, separate
+# from the sync client's, so it keeps its own record of which collections exist
+_memory_registry = CollectionRegistry(COLLECTION_CACHE_TTL) if QDRANT_URL == ":memory:" else None
+metrics.track_collections(lambda name: _memory_registry is not None and name in _memory_registry)
+
+
+def get_cpu_executor() -> ThreadPoolExecutor:
+    """Executor dedicated to chunking and embedding."""
+    global _cpu_executor
+    if _cpu_executor is None:
+        _cpu_executor = ThreadPoolExecutor(max_workers=CPU_EXECUTOR_WORKERS, thread_name_prefix="docservice-cpu")
+    return _cpu_executor
+
+
+async def run_cpu(fn, *args, **kwargs):
+    loop = asyncio.get_running_loop()
+    # Copy the context so stage timings recorded in the worker reach the request
+    ctx = contextvars.copy_context()
+    return await loop.run_in_executor(get_cpu_executor(), partial(ctx.run, fn, *args, **kwargs))
+
+
+async def embed_queries(queries: list[str]) -> list:
+    """Async counterpart of ``services.embed_queries``.
+
+    With EMBED_BATCHING the cache misses are submitted to the micro-batcher
+    from the event loop. Waiting on an executor thread instead would cap a
+    batch at CPU_EXECUTOR_WORKERS concurrent queries.
+    """
+    if not services.EMBED_BATCHING:
+        return await run_cpu(services.embed_queries, queries)
+    keys, vectors = services._lookup_query_vectors(services.embedding_model.model_signature(), queries)
+    missing = [key for key, vec in vectors.items() if vec is None]
+    if missing:
+        with stage("embed"):
+            fresh = await services.get_batcher().embed_many_async([key[1] for key in missing])
+        services.remember_embedding_dim(fresh)
+        services._cache_query_vectors(vectors, missing, fresh)
+    return [vectors[key] for key in keys]
+
+
+async def embed_query_batch(pending: dict[str, list[services.BatchSlot]]) -> None:
+    """Async counterpart of ``services.embed_query_batch``."""
+    slots = [slot for group in pending.values() for slot in group]
+    for slot, vec in zip(slots, await embed_queries([slot.query for slot in slots])):
+        slot.vector = vec
+    hybrid = [slot for slot in slots if slot.hybrid]
+    if hybrid:
+        sparse = await run_cpu(services.embed_sparse_queries, [slot.query for slot in hybrid])
+        for slot, vec in zip(hybrid, sparse):
+            slot.sparse_vector = vec
+
+
+async def probe_embedding_dim() -> None:
+    """Learn the embedder's output dimension before ``check_embedder``, loading the model off the loop."""
+    if services.embedding_dim() is None:
+        await run_cpu(services.probe_embedding_dim)
+
+
+async def _check_connectivity(client) -> None:
+    """Retry a lightweight call with backoff, mirroring ``services.get_client``."""
+    try:
+        from qdrant_client.http.exceptions import ResponseHandlingException
+    except Exception:
+        ResponseHandlingException = Exception
+
+    if os.getenv("QDRANT_SKIP_CONNECT_CHECK", "0") == "1":
+        logger.info("Skipping Qdrant connectivity check because QDRANT_SKIP_CONNECT_CHECK=1")
+        return
+    max_retries = QDRANT_CONNECT_RETRIES
+    delay = 1.0
+    for attempt in range(1, max_retries + 1):
+        try:
+            await client.get_collections()
+            return
+        except Exception as e:
+            logger.warning("Attempt %d: failed to contact Qdrant at %s: %s", attempt, QDRANT_URL, e)
+            if attempt < max_retries:
+                await asyncio.sleep(delay)
+                delay *= 2
+            else:
+                logger.exception(
+                    f"Failed to connect to Qdrant at {QDRANT_URL} after {max_retries} attempts. "
+                    "Check network connectivity, DNS, firewall, and that Qdrant is running and accessible from this host."
+                )
+                raise ResponseHandlingException(e)
+
+
+async def get_async_client():
+    global _async_client, _client_lock
+    if _async_client is not None:
+        return _async_client
+    if _client_lock is None:
+        _client_lock = asyncio.Lock()
+    async with _client_lock:
+        if _async_client is None:
+            from qdrant_client import AsyncQdrantClient
+            if QDRANT_URL == ":memory:":
+                client = AsyncQdrantClient(location=QDRANT_URL)
+            else:
+                # Same transport, pool and timeout settings as the sync client
+                client = AsyncQdrantClient(url=QDRANT_URL, **services.qdrant_client_kwargs())
+                await _check_connectivity(client)
+            _async_client = client
+    return _async_client
+
+
+def get_collection_registry() -> CollectionRegistry:
+    """Registry of the collections the async client sees."""
+    return _memory_registry if _memory_registry is not None else services.get_collection_registry()
+
+
+async def qdrant_search(fn, **kwargs):
+    """Await a Qdrant search with QDRANT_SEARCH_TIMEOUT on both the server and
+    the client side, so a slow node fails the request fast with QdrantTimeout."""
+    try:
+        with services.forget_if_missing(kwargs["collection_name"], get_collection_registry()):
+            return await asyncio.wait_for(fn(timeout=QDRANT_SEARCH_TIMEOUT, **kwargs), QDRANT_SEARCH_TIMEOUT)
+    except Exception as e:
+        if services.is_timeout(e):
+            raise services.QdrantTimeout(f"Qdrant did not answer the search within {QDRANT_SEARCH_TIMEOUT}s.") from e
+        raise
+
+
+async def collection_info(collection_name: str):
+    """Async counterpart of ``services.collection_info`` sharing its registry (except in memory mode)."""
+    registry = get_collection_registry()
+    info = registry.get(collection_name)
+    if info is not None:
+        return info
+    client = await get_async_client()
+    try:
+        with stage("collection_check"):
+            if not await client.collection_exists(collection_name):
+                return None
+            info = services.info_from_response(collection_name, await client.get_collection(collection_name))
+    except Exception:
+        return None
+    return registry.put(info)
+
+
+async def collection_exists(collection_name: str) -> bool:
+    return await collection_info(collection_name) is not None
+
+
+async def _create_collection(
+    collection_name: str, dim: int, distance=None, hybrid: bool | None = None, options=None
+) -> None:
+    client = await get_async_client()
+    kwargs, info = services.collection_schema(collection_name, dim, distance, hybrid, options)
+    if not services.supports_collection_metadata(client):
+        kwargs.pop("metadata")
+    await client.create_collection(collection_name=collection_name, **kwargs)
+    for field_name, schema in services.payload_indexes(options):
+        await client.create_payload_index(collection_name=collection_name, field_name=field_name, field_schema=schema)
+    get_collection_registry().put(info)
+
+
+async def setup_collection(collection_name: str, dim: int) -> None:
+    info = await collection_info(collection_name)
+    if info is not None:
+        services.check_dimension(info, dim)
+        return
+    logger.info(f"Creating Qdrant collection '{collection_name}' (dim={dim})")
+    await _create_collection(collection_name, dim)
+
+
+async def ensure_collection(
+    collection_name: str, dim: int, distance=None, hybrid: bool | None = None, options=None
+) -> bool:
+    """Async counterpart of ``services.ensure_collection``."""
+    if await collection_exists(collection_name):
+        return True
+    try:
+        await _create_collection(collection_name, dim, distance, hybrid, options)
+        return True
+    except Exception as e:
+        logger.exception("Failed to create collection: %s", e)
+        return False
+
+
+async def list_collections() -> list[str]:
+    client = await get_async_client()
+    try:
+        return [c.name for c in (await client.get_collections()).collections]
+    except Exception:
+        return []
+
+
+async def delete_collection(collection_name: str):
+    client = await get_async_client()
+    try:
+        return await client.delete_collection(collection_name=collection_name)
+    except Exception:
+        logger.exception("Failed to delete collection %s", collection_name)
+        return False
+    finally:
+        get_collection_registry().invalidate(collection_name)
+        services.invalidate_collection_cache(collection_name)
+
+
+async def existing_point_ids(collection_name: str, doc_id: str) -> set[str]:
+    client = await get_async_client()
+    ids: set[str] = set()
+    offset = None
+    with stage("existing_ids"), services.forget_if_missing(collection_name, get_collection_registry()):
+        while True:
+            points, offset = await client.scroll(
+                collection_name=collection_name,
+                scroll_filter=services._doc_filter(doc_id),
+                limit=1024,
+                offset=offset,
+                with_payload=False,
+                with_vectors=False,
+            )
+            ids.update(str(p.id) for p in points)
+            if offset is None:
+                return ids
+
+
+async def ingest_document(doc_id: str, text: str, collection: str | None = None) -> IngestResult:
+    """Async counterpart of ``services.ingest_document``."""
+    from qdrant_client import models as qmodels
+    target = services.resolve_collection(collection)
+    texts = await run_cpu(services.chunk_text, text)
+    plan = services.IngestPlan.build(doc_id, target, texts)
+    if not plan.texts:
+        return plan.result()
+    info = await collection_info(target)
+    plan.apply_schema(info)
+    if info is not None:
+        await probe_embedding_dim()
+        services.check_embedder(info)
+        try:
+            plan.mark_existing(await existing_point_ids(target, doc_id))
+        except Exception as e:
+            if not services.is_not_found(e):
+                raise
+            # Deleted outside this service: setup_collection creates it again
+            plan.apply_schema(None)
+
+    client = await get_async_client()
+    if plan.pending:
+        await run_cpu(services.embed_ingest, plan)
+        await setup_collection(target, plan.embeddings[0].shape[0])
+        with stage("upload"), services.forget_if_missing(target, get_collection_registry()):
+            await upload_plan_async(client, plan)
+    if plan.stale:
+        with stage("delete"):
+            await client.delete(
+                collection_name=target,
+                points_selector=qmodels.PointIdsList(points=list(plan.stale)),
+            )
+
+    result = plan.result()
+    if result.new or result.deleted:
+        services.invalidate_collection_cache(target)
+    services.record_ingest(plan, result)
+    return result
+
+
+async def query_text(
+    query: str,
+    top_k: int = 5,
+    collection: str | None = None,
+    hybrid: bool | None = None,
+    hnsw_ef: int | None = None,
+    rescore: bool | None = None,
+    oversampling: float | None = None,
+    post: services.PostProcess | None = None,
+) -> list[SearchResult]:
+    """Async counterpart of ``services.query_text``."""
+    target = services.resolve_collection(collection)
+    info = await collection_info(target)
+    if info is not None:
+        await probe_embedding_dim()
+    services.check_embedder(info)
+    hybrid = services.use_hybrid(info, target, hybrid)
+    search = services.resolve_search(hnsw_ef, rescore, oversampling)
+    post = post or services.resolve_postprocess()
+    result_key = services.result_cache_key(query, top_k, target, hybrid, search, post)
+    cached = services.cached_results(result_key)
+    if cached is not None:
+        metrics.QUERIES_TOTAL.inc(collection=metrics.collection_label(target), cache="hit")
+        return cached
+    metrics.QUERIES_TOTAL.inc(collection=metrics.collection_label(target), cache="miss")
+
+    generation = services.cache_generation(target)
+    q_vec = (await embed_queries([query]))[0]
+    client = await get_async_client()
+    if hybrid:
+        sparse_vec = (await run_cpu(services.embed_sparse_queries, [query]))[0]
+        request = services.hybrid_request(info, q_vec, sparse_vec, top_k, search, post)
+    else:
+        request = services.dense_request(info, q_vec, top_k, search, post)
+    with stage("search"):
+        hits = (await qdrant_search(client.query_batch_points, collection_name=target, requests=[request]))[0].points
+    vector_name = info.vector_name if info else None
+    if post.reorders:
+        # Reranking and MMR are CPU work; keep them off the event loop
+        results = await run_cpu(services.postprocess.apply, query, q_vec, hits, top_k, post, vector_name)
+    else:
+        results = services.postprocess.apply(query, q_vec, hits, top_k, post, vector_name)
+    services.store_results(result_key, results, generation)
+    logger.info(f"Query '{query}' returned {len(results)} hits.")
+    return results
+
+
+async def query_batch(queries) -> list[list[SearchResult]]:
+    """Async counterpart of ``services.query_batch``; collections are searched concurrently."""
+    targets = {services.resolve_collection(q.collection) for q in queries}
+    infos = dict(zip(targets, await asyncio.gather(*(collection_info(t) for t in targets))))
+    if any(info is not None for info in infos.values()):
+        await probe_embedding_dim()
+    results, pending = services.plan_query_batch(queries, infos)
+    if pending:
+        await embed_query_batch(pending)
+        client = await get_async_client()
+
+        async def fill(slots, responses):
+            if any(slot.post.reorders for slot in slots):
+                await run_cpu(services.fill_batch_results, results, slots, responses)
+            else:
+                services.fill_batch_results(results, slots, responses)
+
+        async def search_collection(target, slots):
+            with stage("search"):
+                responses = await qdrant_search(
+                    client.query_batch_points, collection_name=target, requests=services.query_requests(slots)
+                )
+            await fill(slots, [r.points for r in responses])
+
+        await asyncio.gather(*(search_collection(t, slots) for t, slots in pending.items()))
+    logger.info(f"Batch of {len(queries)} queries answered ({sum(len(g) for g in pending.values())} searched).")
+    return results
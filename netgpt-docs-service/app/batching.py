@@ -0,0 +1,153 @@
+"""Micro-batching scheduler for embedding requests.
+
+Concurrent callers (e.g. several /query requests handled on different worker
+threads) submit texts to a shared queue. A single background thread gathers
+pending texts for up to ``max_wait_ms`` (or until ``max_batch_size`` texts are
+waiting), runs one embedding call for the whole batch and resolves each
+caller's future with its own vector. This amortizes the per-call ONNX overhead
+and avoids callers serializing on the shared embedder.
+"""
+from __future__ import annotations
+
+import asyncio
+import logging
+import queue
+import threading
+import time
+from collections import deque
+from concurrent.futures import Future
+from typing import Callable, Iterable, Sequence
+
+logger = logging.getLogger("docservice")
+
+# Number of recent observations kept for percentile reporting
+_STATS_WINDOW = 2048
+
+
+def _percentile(values: Sequence[float], pct: float) -> float:
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    idx = min(len(ordered) - 1, max(0, int(round(pct / 100.0 * (len(ordered) - 1)))))
+    return ordered[idx]
+
+
+class EmbeddingBatcher:
+    """Collects texts from concurrent callers and embeds them in batches.
+
+    ``embed_fn`` receives a list of texts and must return an iterable of
+    vectors in the same order.
+    """
+
+    def __init__(self, embed_fn: Callable[[list[str]], Iterable], max_batch_size: int = 32, max_wait_ms: float = 5.0):
+        self._embed_fn = embed_fn
+        self.max_batch_size = max(1, int(max_batch_size))
+        self.max_wait = max(0.0, float(max_wait_ms)) / 1000.0
+        self._queue: queue.Queue = queue.Queue()
+        self._thread: threading.Thread | None = None
+        self._start_lock = threading.Lock()
+        self._stats_lock = threading.Lock()
+        self._batches = 0
+        self._items = 0
+        self._errors = 0
+        self._max_batch_seen = 0
+        self._batch_sizes: deque = deque(maxlen=_STATS_WINDOW)
+        self._queue_waits_ms: deque = deque(maxlen=_STATS_WINDOW)
+        self._embed_ms: deque = deque(maxlen=_STATS_WINDOW)
+
+    def _ensure_started(self):
+        if self._thread is not None and self._thread.is_alive():
+            return
+        with self._start_lock:
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(target=self._run, name="embedding-batcher", daemon=True)
+                self._thread.start()
+
+    def submit(self, text: str) -> Future:
+        """Queue a single text and return a future resolving to its vector."""
+        self._ensure_started()
+        fut: Future = Future()
+        self._queue.put((text, fut, time.perf_counter()))
+        return fut
+
+    def embed(self, text: str):
+        """Embed one text through the shared batch queue (blocking)."""
+        return self.submit(text).result()
+
+    def embed_many(self, texts: Sequence[str]) -> list:
+        """Embed several texts; they may be split across or merged into batches."""
+        futures = [self.submit(t) for t in texts]
+        return [f.result() for f in futures]
+
+    async def embed_many_async(self, texts: Sequence[str]) -> list:
+        """Like ``embed_many``, but awaits the futures instead of blocking a thread."""
+        return list(await asyncio.gather(*(asyncio.wrap_future(self.submit(t)) for t in texts)))
+
+    def _collect(self) -> list:
+        first = self._queue.get()
+        batch = [first]
+        deadline = first[2] + self.max_wait
+        while len(batch) < self.max_batch_size:
+            remaining = deadline - time.perf_counter()
+            try:
+                if remaining <= 0:
+                    batch.append(self._queue.get_nowait())
+                else:
+                    batch.append(self._queue.get(timeout=remaining))
+            except queue.Empty:
+                break
+        return batch
+
+    def _run(self):
+        while True:
+            batch = self._collect()
+            started = time.perf_counter()
+            texts = [item[0] for item in batch]
+            try:
+                vectors = list(self._embed_fn(texts))
+                if len(vectors) != len(batch):
+                    raise RuntimeError(f"Embedder returned {len(vectors)} vectors for {len(batch)} texts")
+            except Exception as e:
+                logger.exception("Embedding batch of %d texts failed", len(batch))
+                with self._stats_lock:
+                    self._errors += 1
+                for _, fut, _ in batch:
+                    if not fut.cancelled():
+                        fut.set_exception(e)
+                continue
+            finished = time.perf_counter()
+            for (_, fut, _), vec in zip(batch, vectors):
+                if not fut.cancelled():
+                    fut.set_result(vec)
+            with self._stats_lock:
+                self._batches += 1
+                self._items += len(batch)
+                self._max_batch_seen = max(self._max_batch_seen, len(batch))
+                self._batch_sizes.append(len(batch))
+                self._embed_ms.append((finished - started) * 1000.0)
+                for _, _, enqueued in batch:
+                    self._queue_waits_ms.append((started - enqueued) * 1000.0)
+
+    def stats(self) -> dict:
+        """Return batch-size, queue-wait and embed-time metrics."""
+        with self._stats_lock:
+            sizes = list(self._batch_sizes)
+            waits = list(self._queue_waits_ms)
+            embeds = list(self._embed_ms)
+            return {
+                "max_batch_size": self.max_batch_size,
+                "max_wait_ms": self.max_wait * 1000.0,
+                "queue_depth": self._queue.qsize(),
+                "batches": self._batches,
+                "items": self._items,
+                "errors": self._errors,
+                "avg_batch_size": (self._items / self._batches) if self._batches else 0.0,
+                "max_batch_size_seen": self._max_batch_seen,
+                "batch_size_p50": _percentile(sizes, 50),
+                "batch_size_p99": _percentile(sizes, 99),
+                "queue_wait_ms_p50": _percentile(waits, 50),
+                "queue_wait_ms_p99": _percentile(waits, 99),
+                "queue_wait_ms_max": max(waits) if waits else 0.0,
+                "embed_ms_p50": _percentile(embeds, 50),
+                "embed_ms_p99": _percentile(embeds, 99),
+            }
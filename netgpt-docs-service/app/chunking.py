@@ -0,0 +1,133 @@
+"""Chunker reuse and parallel chunking of large documents.
+
+Building a chonkie chunker loads its tokenizer, so instances are created once
+per (chunk size, tokenizer, overlap) and shared across requests. The
+tokenizer can be the embedding model's own (``CHUNK_TOKENIZER=embedding``),
+so chunk sizes are counted in the same tokens the embedder truncates at.
+
+Very large documents can be split at paragraph breaks into segments that are
+chunked on a small process pool. Chunk boundaries then restart at each
+segment, which only differs from sequential chunking where a chunk would
+have spanned a segment cut.
+"""
+from __future__ import annotations
+
+import atexit
+import logging
+import multiprocessing
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from itertools import repeat
+
+from chonkie import RecursiveChunker, TokenChunker
+
+try:
+    from app.config import CHUNK_SIZE, CHUNK_TOKENIZER, CHUNK_OVERLAP, EMBEDDING_MODEL
+    from app.config import CHUNK_PARALLEL_WORKERS, CHUNK_PARALLEL_MIN_CHARS
+except ImportError:
+    from config import CHUNK_SIZE, CHUNK_TOKENIZER, CHUNK_OVERLAP, EMBEDDING_MODEL
+    from config import CHUNK_PARALLEL_WORKERS, CHUNK_PARALLEL_MIN_CHARS
+
+logger = logging.getLogger("docservice")
+
+_chunkers: dict[tuple[int, str, int], object] = {}
+_chunkers_lock = threading.Lock()
+_pool: ProcessPoolExecutor | None = None
+_pool_lock = threading.Lock()
+
+# Preferred places to cut a document into parallel segments, best first
+_SEGMENT_BREAKS = ("\n\n", "\n", ". ")
+
+
+def _load_tokenizer(name: str):
+    """Resolve a tokenizer name; "embedding" loads EMBEDDING_MODEL's tokenizer."""
+    if name != "embedding":
+        return name
+    from tokenizers import Tokenizer
+    tokenizer = Tokenizer.from_pretrained(EMBEDDING_MODEL)
+    # The embedder truncates at its max length; the chunker has to count every token
+    tokenizer.no_truncation()
+    tokenizer.no_padding()
+    return tokenizer
+
+
+def get_chunker(chunk_size: int = CHUNK_SIZE, tokenizer: str = CHUNK_TOKENIZER, overlap: int = CHUNK_OVERLAP):
+    """Shared chunker for (chunk_size, tokenizer, overlap), built on first use."""
+    key = (chunk_size, tokenizer, overlap)
+    chunker = _chunkers.get(key)
+    if chunker is None:
+        with _chunkers_lock:
+            chunker = _chunkers.get(key)
+            if chunker is None:
+                tok = _load_tokenizer(tokenizer)
+                if overlap > 0:
+                    chunker = TokenChunker(tokenizer=tok, chunk_size=chunk_size, chunk_overlap=overlap)
+                else:
+                    chunker = RecursiveChunker(chunk_size=chunk_size, tokenizer=tok)
+                _chunkers[key] = chunker
+    return chunker
+
+
+def chunk_segment(text: str, chunk_size: int, tokenizer: str, overlap: int) -> list[str]:
+    return [chunk.text for chunk in get_chunker(chunk_size, tokenizer, overlap)(text)]
+
+
+def split_segments(text: str, parts: int) -> list[str]:
+    """Cut ``text`` into about ``parts`` segments, preferring paragraph breaks."""
+    target = max(1, len(text) // max(1, parts))
+    segments: list[str] = []
+    start = 0
+    while len(text) - start > target:
+        window_end = start + 2 * target
+        cut = -1
+        for sep in _SEGMENT_BREAKS:
+            cut = text.find(sep, start + target, window_end)
+            if cut != -1:
+                cut += len(sep)
+                break
+        if cut == -1:
+            break
+        segments.append(text[start:cut])
+        start = cut
+    segments.append(text[start:])
+    return segments
+
+
+def get_pool() -> ProcessPoolExecutor:
+    global _pool
+    if _pool is None:
+        with _pool_lock:
+            if _pool is None:
+                logger.info("Starting chunking pool with %d workers", CHUNK_PARALLEL_WORKERS)
+                _pool = ProcessPoolExecutor(
+                    max_workers=CHUNK_PARALLEL_WORKERS,
+                    mp_context=multiprocessing.get_context("spawn"),
+                )
+                atexit.register(shutdown)
+    return _pool
+
+
+def shutdown() -> None:
+    global _pool
+    if _pool is not None:
+        _pool.shutdown(wait=False, cancel_futures=True)
+        _pool = None
+
+
+def chunk_document(text: str, parallel: bool | None = None) -> list[str]:
+    """Chunk ``text`` with the configured chunker.
+
+    ``parallel`` defaults to chunking on the process pool when it is enabled
+    and the document is at least CHUNK_PARALLEL_MIN_CHARS long.
+    """
+    if parallel is None:
+        parallel = CHUNK_PARALLEL_WORKERS > 0 and len(text) >= CHUNK_PARALLEL_MIN_CHARS
+    if not parallel:
+        return chunk_segment(text, CHUNK_SIZE, CHUNK_TOKENIZER, CHUNK_OVERLAP)
+    segments = split_segments(text, CHUNK_PARALLEL_WORKERS * 2)
+    if len(segments) == 1:
+        return chunk_segment(text, CHUNK_SIZE, CHUNK_TOKENIZER, CHUNK_OVERLAP)
+    results = get_pool().map(
+        chunk_segment, segments, repeat(CHUNK_SIZE), repeat(CHUNK_TOKENIZER), repeat(CHUNK_OVERLAP)
+    )
+    return [chunk for chunks in results for chunk in chunks]
@@ -3,9 +3,179 @@ import os
 QDRANT_URL = os.getenv("QDRANT_URL", "https://qdrant.pc-tips.se")
 QDRANT_API_KEY = os.getenv("QDRANT_API_KEY")
 
-EMBEDDING_MODEL = os.getenv("EMBEDDING_MODEL", "BAAI/bge-m3")
+EMBEDDING_MODEL = os.getenv("EMBEDDING_MODEL", "BAAI/bge-small-en-v1.5")
+# Model variant. EMBEDDING_ONNX_FILE loads another ONNX file of the model,
+# e.g. the int8 "onnx/model_quantized.onnx", from EMBEDDING_ONNX_REPO
+# (default EMBEDDING_MODEL); fastembed needs its EMBEDDING_POOLING ("cls" or
+# "mean") and EMBEDDING_NATIVE_DIM. EMBEDDING_DIM > 0 keeps only the first N
+# dimensions of every vector (Matryoshka-trained models only).
+EMBEDDING_ONNX_FILE = os.getenv("EMBEDDING_ONNX_FILE", "")
+EMBEDDING_ONNX_REPO = os.getenv("EMBEDDING_ONNX_REPO", "") or EMBEDDING_MODEL
+EMBEDDING_POOLING = os.getenv("EMBEDDING_POOLING", "cls")
+EMBEDDING_NATIVE_DIM = int(os.getenv("EMBEDDING_NATIVE_DIM", 0))
+EMBEDDING_DIM = int(os.getenv("EMBEDDING_DIM", 0))
 
 _col = os.getenv("COLLECTION_NAME", "")
 COLLECTION_NAME = _col if _col != "" else None
 
 CHUNK_SIZE = int(os.getenv("CHUNK_SIZE", 512))
+# Tokenizer that CHUNK_SIZE is counted in: "gpt2", any Hugging Face tokenizer
+# id, or "embedding" for EMBEDDING_MODEL's own tokenizer. CHUNK_OVERLAP > 0
+# switches to fixed-size token windows overlapping by that many tokens.
+CHUNK_TOKENIZER = os.getenv("CHUNK_TOKENIZER", "gpt2")
+CHUNK_OVERLAP = int(os.getenv("CHUNK_OVERLAP", 0))
+# Documents of at least CHUNK_PARALLEL_MIN_CHARS characters are split at
+# paragraph breaks and chunked on CHUNK_PARALLEL_WORKERS processes (0 = off).
+CHUNK_PARALLEL_WORKERS = int(os.getenv("CHUNK_PARALLEL_WORKERS", 0))
+CHUNK_PARALLEL_MIN_CHARS = int(os.getenv("CHUNK_PARALLEL_MIN_CHARS", 200_000))
+
+# Micro-batching of embedding calls across concurrent requests. When enabled,
+# query and ingest texts are queued and embedded together in batches of up to
+# EMBED_BATCH_MAX_SIZE texts, waiting at most EMBED_BATCH_MAX_WAIT_MS for the
+# batch to fill.
+EMBED_BATCHING = os.getenv("EMBED_BATCHING", "0") == "1"
+EMBED_BATCH_MAX_SIZE = int(os.getenv("EMBED_BATCH_MAX_SIZE", 32))
+EMBED_BATCH_MAX_WAIT_MS = float(os.getenv("EMBED_BATCH_MAX_WAIT_MS", 5))
+
+# In-process LRU caches on the query path. A size of 0 disables a cache and a
+# TTL of 0 keeps entries until they are evicted. The result cache is off by
+# default; it is invalidated per collection on ingest and delete.
+QUERY_CACHE_SIZE = int(os.getenv("QUERY_CACHE_SIZE", 1024))
+QUERY_CACHE_TTL = float(os.getenv("QUERY_CACHE_TTL", 0))
+RESULT_CACHE_SIZE = int(os.getenv("RESULT_CACHE_SIZE", 0))
+RESULT_CACHE_TTL = float(os.getenv("RESULT_CACHE_TTL", 60))
+
+# Bulk NDJSON ingest: bounded queue length between pipeline stages and the
+# maximum number of chunks merged into one embedding call.
+BULK_QUEUE_SIZE = int(os.getenv("BULK_QUEUE_SIZE", 64))
+BULK_EMBED_BATCH = int(os.getenv("BULK_EMBED_BATCH", 256))
+
+# Threads dedicated to CPU-bound chunking and embedding for the async
+# endpoints, kept separate from Starlette's request threadpool.
+CPU_EXECUTOR_WORKERS = int(os.getenv("CPU_EXECUTOR_WORKERS", min(4, os.cpu_count() or 1)))
+
+# Multi-process embedding pool. With EMBED_POOL_WORKERS > 0, embeddings are
+# computed by that many spawned processes, each holding one model copy with
+# EMBED_POOL_THREADS intra-op threads. Work is split into sub-batches of
+# EMBED_POOL_SUB_BATCH texts.
+EMBED_POOL_WORKERS = int(os.getenv("EMBED_POOL_WORKERS", 0))
+EMBED_POOL_THREADS = int(os.getenv("EMBED_POOL_THREADS", 1))
+EMBED_POOL_SUB_BATCH = int(os.getenv("EMBED_POOL_SUB_BATCH", 64))
+
+# Persistent on-disk chunk-embedding store (empty path disables it). Vectors
+# are memory-mapped as EMBED_STORE_DTYPE ("float32" or "float16"); the least
+# recently used entries are evicted beyond EMBED_STORE_MAX_ENTRIES.
+EMBED_STORE_PATH = os.getenv("EMBED_STORE_PATH", "")
+EMBED_STORE_DTYPE = os.getenv("EMBED_STORE_DTYPE", "float32")
+EMBED_STORE_MAX_ENTRIES = int(os.getenv("EMBED_STORE_MAX_ENTRIES", 1_000_000))
+
+# Preload the embedder, run a dummy inference and open the Qdrant clients in
+# the background at startup; /ready returns 503 until this has finished.
+WARMUP_ON_STARTUP = os.getenv("WARMUP_ON_STARTUP", "0") == "1"
+
+# Seconds a cached collection existence/dimension entry stays valid before it
+# is re-read from Qdrant (0 = until invalidated by this service).
+COLLECTION_CACHE_TTL = float(os.getenv("COLLECTION_CACHE_TTL", 300))
+
+# Observability: add a Server-Timing header with per-stage durations to every
+# response, and profile a sample of requests with cProfile, saving a profile
+# for any sampled request slower than PROFILE_SLOW_MS (0 disables profiling).
+SERVER_TIMING = os.getenv("SERVER_TIMING", "0") == "1"
+PROFILE_SLOW_MS = float(os.getenv("PROFILE_SLOW_MS", 0))
+PROFILE_SAMPLE_RATE = float(os.getenv("PROFILE_SAMPLE_RATE", 0.05))
+PROFILE_DIR = os.getenv("PROFILE_DIR", "profiles")
+
+# Maximum number of queries accepted by POST /query/batch
+QUERY_BATCH_MAX = int(os.getenv("QUERY_BATCH_MAX", 64))
+
+# Hybrid dense + sparse retrieval. With HYBRID_SEARCH=1, new collections get a
+# named dense vector plus a sparse vector computed with SPARSE_MODEL (BM25 or
+# SPLADE via fastembed), and queries against such collections fuse both
+# server-side. Each branch prefetches HYBRID_PREFETCH_LIMIT candidates (at
+# least top_k) before fusion with HYBRID_FUSION ("rrf" or "dbsf").
+HYBRID_SEARCH = os.getenv("HYBRID_SEARCH", "0") == "1"
+SPARSE_MODEL = os.getenv("SPARSE_MODEL", "Qdrant/bm25")
+DENSE_VECTOR_NAME = os.getenv("DENSE_VECTOR_NAME", "dense")
+SPARSE_VECTOR_NAME = os.getenv("SPARSE_VECTOR_NAME", "sparse")
+HYBRID_PREFETCH_LIMIT = int(os.getenv("HYBRID_PREFETCH_LIMIT", 50))
+HYBRID_FUSION = os.getenv("HYBRID_FUSION", "rrf")
+
+# Storage and index settings for newly created collections: keep original
+# vectors on disk, quantize them (QUANTIZATION = "scalar", "binary" or
+# "product"; empty disables) with the quantized copy pinned in RAM, HNSW graph
+# parameters (empty = server default) and a keyword payload index on doc_id.
+VECTORS_ON_DISK = os.getenv("VECTORS_ON_DISK", "0") == "1"
+QUANTIZATION = os.getenv("QUANTIZATION", "").lower()
+QUANTIZATION_ALWAYS_RAM = os.getenv("QUANTIZATION_ALWAYS_RAM", "1") == "1"
+PQ_COMPRESSION = os.getenv("PQ_COMPRESSION", "x16")
+_hnsw_m = os.getenv("HNSW_M", "")
+HNSW_M = int(_hnsw_m) if _hnsw_m != "" else None
+_hnsw_ef_construct = os.getenv("HNSW_EF_CONSTRUCT", "")
+HNSW_EF_CONSTRUCT = int(_hnsw_ef_construct) if _hnsw_ef_construct != "" else None
+PAYLOAD_INDEX_DOC_ID = os.getenv("PAYLOAD_INDEX_DOC_ID", "1") == "1"
+# Storage type of dense vectors in new collections: "float32" or "float16"
+# (half the memory and disk; scores change only in the last digits).
+VECTOR_DATATYPE = os.getenv("VECTOR_DATATYPE", "float32")
+
+# Default search-time parameters, overridable per query: HNSW ef (0 = server
+# default) and, for quantized collections, the oversampling factor (0 = server
+# default) and whether to rescore candidates with the original vectors.
+SEARCH_HNSW_EF = int(os.getenv("SEARCH_HNSW_EF", 0))
+QUANTIZATION_OVERSAMPLING = float(os.getenv("QUANTIZATION_OVERSAMPLING", 0))
+QUANTIZATION_RESCORE = os.getenv("QUANTIZATION_RESCORE", "1") == "1"
+
+# Ingest upload: points per upsert, slices in flight at once, and retries
+# (with exponential backoff starting at UPLOAD_RETRY_BACKOFF seconds) before
+# a failed slice fails the ingest.
+UPLOAD_BATCH_SIZE = int(os.getenv("UPLOAD_BATCH_SIZE", 256))
+UPLOAD_PARALLEL = int(os.getenv("UPLOAD_PARALLEL", 2))
+UPLOAD_MAX_RETRIES = int(os.getenv("UPLOAD_MAX_RETRIES", 3))
+UPLOAD_RETRY_BACKOFF = float(os.getenv("UPLOAD_RETRY_BACKOFF", 0.5))
+
+# Background ingest jobs. With INGEST_BACKGROUND=1, /ingest queues documents
+# and returns a job id (override per request with ?background=). Jobs are
+# persisted in INGEST_JOBS_DB and run by INGEST_JOB_WORKERS threads; at most
+# INGEST_JOB_MAX_QUEUED may wait, and finished jobs are kept for
+# INGEST_JOB_RETENTION seconds (0 = forever). ?priority= is limited to
+# 0..INGEST_JOB_MAX_PRIORITY.
+INGEST_BACKGROUND = os.getenv("INGEST_BACKGROUND", "0") == "1"
+INGEST_JOBS_DB = os.getenv("INGEST_JOBS_DB", "ingest_jobs/jobs.sqlite")
+INGEST_JOB_WORKERS = int(os.getenv("INGEST_JOB_WORKERS", 2))
+INGEST_JOB_MAX_QUEUED = int(os.getenv("INGEST_JOB_MAX_QUEUED", 10_000))
+INGEST_JOB_RETENTION = float(os.getenv("INGEST_JOB_RETENTION", 7 * 24 * 3600))
+INGEST_JOB_MAX_PRIORITY = int(os.getenv("INGEST_JOB_MAX_PRIORITY", 10))
+
+# Qdrant transport. QDRANT_PREFER_GRPC=1 sends points and queries over gRPC
+# (QDRANT_GRPC_PORT) instead of JSON. REST connections are pooled, up to
+# QDRANT_POOL_CONNECTIONS kept alive for QDRANT_KEEPALIVE_SECONDS.
+# QDRANT_TIMEOUT (seconds) bounds every call; searches are additionally
+# limited to QDRANT_SEARCH_TIMEOUT so a slow node fails the query with 504
+# instead of holding a worker. Sync handlers share QDRANT_CLIENT_POOL_SIZE
+# clients, and the startup connectivity check tries QDRANT_CONNECT_RETRIES times.
+QDRANT_PREFER_GRPC = os.getenv("QDRANT_PREFER_GRPC", "0") == "1"
+QDRANT_GRPC_PORT = int(os.getenv("QDRANT_GRPC_PORT", 6334))
+QDRANT_POOL_CONNECTIONS = int(os.getenv("QDRANT_POOL_CONNECTIONS", 32))
+QDRANT_KEEPALIVE_SECONDS = float(os.getenv("QDRANT_KEEPALIVE_SECONDS", 30))
+QDRANT_TIMEOUT = int(os.getenv("QDRANT_TIMEOUT", 30))
+QDRANT_SEARCH_TIMEOUT = int(os.getenv("QDRANT_SEARCH_TIMEOUT", 5))
+QDRANT_CLIENT_POOL_SIZE = int(os.getenv("QDRANT_CLIENT_POOL_SIZE", 2))
+QDRANT_CONNECT_RETRIES = int(os.getenv("QDRANT_CONNECT_RETRIES", 3))
+
+# Result post-processing defaults; each step can be switched per query.
+# Collapsing by doc_id, reranking and MMR fetch top_k *
+# POSTPROCESS_CANDIDATES_FACTOR candidates (at least RERANK_CANDIDATES when
+# reranking) and cut back to top_k. MMR_LAMBDA weighs relevance (1.0) against
+# diversity (0.0). RERANK_MODEL is a fastembed cross-encoder run on the CPU in
+# batches of RERANK_BATCH_SIZE pairs; its scores are cached per (query, chunk).
+# SNIPPET_CHARS > 0 returns at most that many characters of each chunk.
+POSTPROCESS_COLLAPSE = os.getenv("POSTPROCESS_COLLAPSE", "0") == "1"
+POSTPROCESS_CANDIDATES_FACTOR = int(os.getenv("POSTPROCESS_CANDIDATES_FACTOR", 4))
+SNIPPET_CHARS = int(os.getenv("SNIPPET_CHARS", 0))
+MMR_ENABLED = os.getenv("MMR_ENABLED", "0") == "1"
+MMR_LAMBDA = float(os.getenv("MMR_LAMBDA", 0.5))
+RERANK_ENABLED = os.getenv("RERANK_ENABLED", "0") == "1"
+RERANK_MODEL = os.getenv("RERANK_MODEL", "Xenova/ms-marco-MiniLM-L-6-v2")
+RERANK_CANDIDATES = int(os.getenv("RERANK_CANDIDATES", 30))
+RERANK_BATCH_SIZE = int(os.getenv("RERANK_BATCH_SIZE", 32))
+RERANK_CACHE_SIZE = int(os.getenv("RERANK_CACHE_SIZE", 10_000))
+RERANK_CACHE_TTL = float(os.getenv("RERANK_CACHE_TTL", 0))
@@ -0,0 +1,124 @@
+"""Multi-process embedding worker pool.
+
+``preconfig`` pins the native thread pools to a single thread, so in-process
+embedding uses one core. This pool starts N spawned processes that each hold
+one copy of the model with a configurable intra-op thread count. The web tier
+stays a single process, and ingest throughput scales with cores.
+
+Texts are split into sub-batches that are embedded in parallel. Each worker
+writes its vectors straight into a shared-memory output buffer owned by the
+caller, so vectors are never pickled back through the result pipe.
+"""
+from __future__ import annotations
+
+import atexit
+import logging
+import multiprocessing
+import os
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import shared_memory
+
+import numpy as np
+
+try:
+    from app import embedding_model
+except ImportError:
+    import embedding_model
+
+logger = logging.getLogger("docservice")
+
+# Per-process model instance, created by the pool initializer
+_worker_embedder = None
+
+
+def _init_worker(threads: int) -> None:
+    global _worker_embedder
+    # Raise the native thread limits for this process only, before onnxruntime loads
+    for var in ("OMP_NUM_THREADS", "MKL_NUM_THREADS", "OPENBLAS_NUM_THREADS", "NUMEXPR_NUM_THREADS"):
+        os.environ[var] = str(threads)
+    # Workers read the same model/variant settings from the inherited environment
+    _worker_embedder = embedding_model.load_text_embedding(threads=threads)
+
+
+def _probe_dim() -> int:
+    return int(next(embedding_model.embed(_worker_embedder, ["dimension probe"])).shape[0])
+
+
+def _embed_into(texts: list[str], shm_name: str, total_rows: int, dim: int, row_offset: int) -> int:
+    shm = shared_memory.SharedMemory(name=shm_name)
+    try:
+        out = np.ndarray((total_rows, dim), dtype=np.float32, buffer=shm.buf)
+        for i, vec in enumerate(embedding_model.embed(_worker_embedder, texts)):
+            out[row_offset + i] = vec
+        del out
+    finally:
+        shm.close()
+    return len(texts)
+
+
+class EmbeddingProcessPool:
+    """Fan embedding work out to model-holding worker processes."""
+
+    def __init__(self, model_name: str, workers: int, threads: int = 1, sub_batch: int = 64):
+        self.model_name = model_name
+        self.workers = max(1, workers)
+        self.threads = max(1, threads)
+        self.sub_batch = max(1, sub_batch)
+        self._executor: ProcessPoolExecutor | None = None
+        self._dim: int | None = None
+        self._lock = threading.Lock()
+
+    def _ensure_started(self) -> ProcessPoolExecutor:
+        if self._executor is None:
+            with self._lock:
+                if self._executor is None:
+                    logger.info(
+                        "Starting embedding pool: %d workers x %d threads (%s)",
+                        self.workers, self.threads, self.model_name,
+                    )
+                    executor = ProcessPoolExecutor(
+                        max_workers=self.workers,
+                        mp_context=multiprocessing.get_context("spawn"),
+                        initializer=_init_worker,
+                        initargs=(self.threads,),
+                    )
+                    self._dim = executor.submit(_probe_dim).result()
+                    self._executor = executor
+                    atexit.register(self.shutdown)
+        return self._executor
+
+    @property
+    def known_dim(self) -> int | None:
+        """Output dimension if the pool has started, without starting it."""
+        return self._dim
+
+    @property
+    def dim(self) -> int:
+        self._ensure_started()
+        return self._dim
+
+    def embed(self, texts: list[str]) -> list[np.ndarray]:
+        """Embed texts across the pool; returns one float32 row per text."""
+        if not texts:
+            return []
+        executor = self._ensure_started()
+        rows, dim = len(texts), self._dim
+        shm = shared_memory.SharedMemory(create=True, size=rows * dim * np.dtype(np.float32).itemsize)
+        try:
+            futures = [
+                executor.submit(_embed_into, texts[start:start + self.sub_batch], shm.name, rows, dim, start)
+                for start in range(0, rows, self.sub_batch)
+            ]
+            for f in futures:
+                f.result()
+            out = np.ndarray((rows, dim), dtype=np.float32, buffer=shm.buf).copy()
+        finally:
+            shm.close()
+            shm.unlink()
+        return list(out)
+
+    def shutdown(self) -> None:
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
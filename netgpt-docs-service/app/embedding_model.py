@@ -0,0 +1,93 @@
+"""Embedding model loading, variants and output dimensions.
+
+By default fastembed loads the ONNX file it ships for EMBEDDING_MODEL. On
+CPU-only nodes a reduced-precision variant of the same weights (for example
+the int8 ``onnx/model_quantized.onnx`` published in many model repos) embeds
+several times faster. EMBEDDING_ONNX_FILE selects such a file; it is
+registered with fastembed as a custom model, which needs the pooling and
+native dimension that fastembed would otherwise know from its model list.
+
+EMBEDDING_DIM truncates every vector to its first N dimensions and
+re-normalizes it. This only preserves quality for Matryoshka-trained models
+(nomic-embed-text-v1.5, mxbai-embed-large-v1, jina-embeddings-v3, ...), but
+it shrinks storage and search cost proportionally.
+
+Truncation happens wherever a model embeds, in-process or on the worker
+pool, so every cache and store downstream only ever sees final vectors.
+``model_signature`` names the model, variant and size for those caches.
+"""
+from __future__ import annotations
+
+import threading
+
+try:
+    from app.config import EMBEDDING_MODEL, EMBEDDING_ONNX_FILE, EMBEDDING_ONNX_REPO
+    from app.config import EMBEDDING_POOLING, EMBEDDING_NATIVE_DIM, EMBEDDING_DIM
+except ImportError:
+    from config import EMBEDDING_MODEL, EMBEDDING_ONNX_FILE, EMBEDDING_ONNX_REPO
+    from config import EMBEDDING_POOLING, EMBEDDING_NATIVE_DIM, EMBEDDING_DIM
+
+_register_lock = threading.Lock()
+_registered = False
+
+
+def variant() -> str | None:
+    """The ONNX file in use when it is not fastembed's default, e.g. "onnx/model_quantized.onnx"."""
+    return f"{EMBEDDING_ONNX_REPO}/{EMBEDDING_ONNX_FILE}" if EMBEDDING_ONNX_FILE else None
+
+
+def model_signature() -> str:
+    """Identifies the vectors this configuration produces (model, variant, dimensions)."""
+    signature = EMBEDDING_MODEL
+    if EMBEDDING_ONNX_FILE:
+        signature += f"[{variant()}]"
+    if EMBEDDING_DIM > 0:
+        signature += f"@{EMBEDDING_DIM}"
+    return signature
+
+
+def _register_variant() -> str:
+    """Register EMBEDDING_ONNX_FILE with fastembed once; returns the model name to load."""
+    global _registered
+    name = variant()
+    with _register_lock:
+        if _registered:
+            return name
+        if EMBEDDING_NATIVE_DIM <= 0:
+            raise ValueError("EMBEDDING_ONNX_FILE requires EMBEDDING_NATIVE_DIM (the model's full output size).")
+        from fastembed import TextEmbedding
+        from fastembed.common.model_description import ModelSource, PoolingType
+        TextEmbedding.add_custom_model(
+            model=name,
+            pooling=PoolingType[EMBEDDING_POOLING.upper()],
+            normalization=True,
+            sources=ModelSource(hf=EMBEDDING_ONNX_REPO),
+            dim=EMBEDDING_NATIVE_DIM,
+            model_file=EMBEDDING_ONNX_FILE,
+        )
+        _registered = True
+    return name
+
+
+def load_text_embedding(threads: int | None = None):
+    """Create the fastembed model for the configured EMBEDDING_MODEL and variant."""
+    from fastembed import TextEmbedding
+    name = _register_variant() if EMBEDDING_ONNX_FILE else EMBEDDING_MODEL
+    return TextEmbedding(model_name=name, threads=threads)
+
+
+def truncate(vector):
+    """Keep the first EMBEDDING_DIM dimensions and restore unit length."""
+    if EMBEDDING_DIM <= 0:
+        return vector
+    if vector.shape[0] < EMBEDDING_DIM:
+        raise ValueError(f"EMBEDDING_DIM={EMBEDDING_DIM} exceeds the model's {vector.shape[0]} dimensions.")
+    head = vector[:EMBEDDING_DIM]
+    norm = float(head @ head) ** 0.5
+    return head / norm if norm > 0 else head.copy()
+
+
+def embed(model, texts: list[str]):
+    """Embed texts with a loaded model, yielding vectors of the configured size."""
+    for vector in model.embed(texts):
+        yield truncate(vector)
@@ -0,0 +1,302 @@
+"""Persistent on-disk cache of chunk embeddings.
+
+Vectors live in a memory-mapped float32/float16 matrix. A small SQLite index
+maps each chunk's content hash to its row ("slot") and records when the slot
+was last used. Lookups copy the rows out of the mapping while holding the
+store lock, because a concurrent ``put_many`` may evict and reuse a slot
+right afterwards. When the store reaches ``max_entries``, the least recently
+used slots are freed and reused. Use ``compact`` to shrink the vectors file
+afterwards; every open store holds a shared lock on the directory, and
+``compact`` refuses to run while another process (e.g. the server) has it open.
+
+Each model gets its own sub-directory, so the key is effectively
+(model name, chunk text hash). The store is meant to be written by a single
+process; use the embedding worker pool rather than several uvicorn workers
+when sharing one store directory.
+
+CLI::
+
+    python -m app.embedding_store stats
+    python -m app.embedding_store warm docs.ndjson
+    python -m app.embedding_store compact
+"""
+from __future__ import annotations
+
+import logging
+import os
+import re
+import sqlite3
+import threading
+import time
+from contextlib import contextmanager
+from pathlib import Path
+
+import numpy as np
+
+try:
+    import fcntl
+except ImportError:  # not available on Windows; stores are then not locked
+    fcntl = None
+
+logger = logging.getLogger("docservice")
+
+_INITIAL_CAPACITY = 1024
+
+
+def _slug(model_name: str) -> str:
+    return re.sub(r"[^A-Za-z0-9_.-]+", "_", model_name)
+
+
+class EmbeddingStore:
+    """Memory-mapped embedding cache keyed by chunk content hash."""
+
+    def __init__(self, root: str | os.PathLike, model_name: str, dtype: str = "float32", max_entries: int = 1_000_000):
+        self.dir = Path(root) / _slug(model_name)
+        self.dir.mkdir(parents=True, exist_ok=True)
+        self.model_name = model_name
+        self.dtype = np.dtype(dtype)
+        self.max_entries = max(1, int(max_entries))
+        self._lock = threading.RLock()
+        self._lock_file = open(self.dir / "lock", "a+b")
+        if fcntl is not None:
+            fcntl.flock(self._lock_file, fcntl.LOCK_SH)
+        self._db = sqlite3.connect(self.dir / "index.sqlite", check_same_thread=False)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute("CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT)")
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS slots (digest BLOB PRIMARY KEY, slot INTEGER NOT NULL, last_used REAL NOT NULL)"
+        )
+        self._db.execute("CREATE INDEX IF NOT EXISTS slots_last_used ON slots (last_used)")
+        self._db.commit()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+        meta = dict(self._db.execute("SELECT key, value FROM meta"))
+        if meta.get("dtype") and meta["dtype"] != self.dtype.name:
+            raise ValueError(f"Embedding store at {self.dir} uses {meta['dtype']}, not {self.dtype.name}")
+        self.dim: int | None = int(meta["dim"]) if "dim" in meta else None
+        self.capacity = int(meta.get("capacity", 0))
+        self._vectors: np.memmap | None = None
+        self._free: list[int] = []
+        if self.dim is not None and self.capacity > 0:
+            self._map()
+            used = {row[0] for row in self._db.execute("SELECT slot FROM slots")}
+            self._free = sorted(set(range(self.capacity)) - used, reverse=True)
+
+    @property
+    def _path(self) -> Path:
+        return self.dir / f"vectors.{self.dtype.name}"
+
+    def _map(self) -> None:
+        self._vectors = np.memmap(self._path, dtype=self.dtype, mode="r+", shape=(self.capacity, self.dim))
+
+    def _set_meta(self, **values) -> None:
+        self._db.executemany(
+            "INSERT OR REPLACE INTO meta (key, value) VALUES (?, ?)", [(k, str(v)) for k, v in values.items()]
+        )
+
+    def _grow(self, needed: int) -> None:
+        new_capacity = max(self.capacity * 2, self.capacity + needed, _INITIAL_CAPACITY)
+        new_capacity = min(new_capacity, max(self.max_entries, self.capacity + needed))
+        if self._vectors is not None:
+            self._vectors.flush()
+        with open(self._path, "ab") as f:
+            f.truncate(new_capacity * self.dim * self.dtype.itemsize)
+        self._free.extend(range(new_capacity - 1, self.capacity - 1, -1))
+        self.capacity = new_capacity
+        self._set_meta(capacity=new_capacity)
+        self._map()
+
+    def _evict(self, count: int, keep: dict[str, int] | None = None) -> None:
+        keep = {bytes.fromhex(d) for d in keep or ()}
+        rows = self._db.execute(
+            "SELECT digest, slot FROM slots ORDER BY last_used LIMIT ?", (count + len(keep),)
+        ).fetchall()
+        rows = [r for r in rows if r[0] not in keep][:count]
+        self._db.executemany("DELETE FROM slots WHERE digest = ?", [(r[0],) for r in rows])
+        self._free.extend(r[1] for r in rows)
+        self.evictions += len(rows)
+
+    def _slots_of(self, digests: list[str]) -> dict[str, int]:
+        """{digest: slot} for the digests that are already stored."""
+        keys = [bytes.fromhex(d) for d in digests]
+        slots: dict[str, int] = {}
+        # SQLite limits the number of bound parameters per statement
+        for start in range(0, len(keys), 500):
+            part = keys[start:start + 500]
+            marks = ",".join("?" * len(part))
+            for digest, slot in self._db.execute(f"SELECT digest, slot FROM slots WHERE digest IN ({marks})", part):
+                slots[digest.hex()] = slot
+        return slots
+
+    def __len__(self) -> int:
+        return self._db.execute("SELECT COUNT(*) FROM slots").fetchone()[0]
+
+    def get_many(self, digests: list[str]) -> dict[str, np.ndarray]:
+        """Return {digest: vector} for every digest present in the store (copies, not views)."""
+        if self._vectors is None or not digests:
+            self.misses += len(digests)
+            return {}
+        with self._lock:
+            found = {digest: np.array(self._vectors[slot]) for digest, slot in self._slots_of(digests).items()}
+            if found:
+                now = time.time()
+                self._db.executemany(
+                    "UPDATE slots SET last_used = ? WHERE digest = ?", [(now, bytes.fromhex(d)) for d in found]
+                )
+                self._db.commit()
+            self.hits += len(found)
+            self.misses += len(digests) - len(found)
+            return found
+
+    def put_many(self, digests: list[str], vectors: list) -> None:
+        """Store vectors for the given digests, evicting LRU entries if full."""
+        if not digests:
+            return
+        with self._lock:
+            if self.dim is None:
+                self.dim = int(np.asarray(vectors[0]).shape[0])
+                self._set_meta(dim=self.dim, dtype=self.dtype.name, model=self.model_name)
+            items = dict(zip(digests, vectors))
+            # Digests already stored keep their slot; only new ones take a free slot
+            existing = self._slots_of(list(items))
+            new = [d for d in items if d not in existing]
+            overflow = len(self) + len(new) - self.max_entries
+            if overflow > 0:
+                self._evict(overflow, keep=existing)
+            if len(self._free) < len(new):
+                self._grow(len(new) - len(self._free))
+            now = time.time()
+            rows = []
+            for digest, vec in items.items():
+                slot = existing[digest] if digest in existing else self._free.pop()
+                self._vectors[slot] = vec
+                rows.append((bytes.fromhex(digest), slot, now))
+            self._vectors.flush()
+            self._db.executemany("INSERT OR REPLACE INTO slots (digest, slot, last_used) VALUES (?, ?, ?)", rows)
+            self._db.commit()
+
+    def compact(self) -> int:
+        """Pack live vectors into the lowest slots and truncate the file.
+
+        Returns the number of rows reclaimed. Raises RuntimeError if another
+        process has the store open, since truncating a file it has mapped is unsafe.
+        """
+        with self._lock, self._exclusive():
+            if self._vectors is None:
+                return 0
+            rows = self._db.execute("SELECT digest, slot FROM slots ORDER BY slot").fetchall()
+            updates = []
+            for new_slot, (digest, slot) in enumerate(rows):
+                if slot != new_slot:
+                    self._vectors[new_slot] = self._vectors[slot]
+                    updates.append((new_slot, digest))
+            self._db.executemany("UPDATE slots SET slot = ? WHERE digest = ?", updates)
+            reclaimed = self.capacity - len(rows)
+            self._vectors.flush()
+            self._vectors = None
+            self.capacity = max(len(rows), 1)
+            with open(self._path, "r+b") as f:
+                f.truncate(self.capacity * self.dim * self.dtype.itemsize)
+            self._set_meta(capacity=self.capacity)
+            self._db.commit()
+            self._db.execute("VACUUM")
+            self._free = list(range(self.capacity - 1, len(rows) - 1, -1))
+            self._map()
+            return reclaimed
+
+    @contextmanager
+    def _exclusive(self):
+        """Hold the directory lock exclusively, failing if another process shares it."""
+        if fcntl is None:
+            yield
+            return
+        try:
+            fcntl.flock(self._lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except BlockingIOError:
+            raise RuntimeError(f"Embedding store at {self.dir} is open in another process; stop it before compacting.")
+        try:
+            yield
+        finally:
+            fcntl.flock(self._lock_file, fcntl.LOCK_SH)
+
+    def close(self) -> None:
+        with self._lock:
+            if self._vectors is not None:
+                self._vectors.flush()
+                self._vectors = None
+            self._db.close()
+            self._lock_file.close()
+
+    def stats(self) -> dict:
+        with self._lock:
+            size_bytes = self._path.stat().st_size if self._path.exists() else 0
+            return {
+                "path": str(self.dir),
+                "model": self.model_name,
+                "dtype": self.dtype.name,
+                "dim": self.dim,
+                "entries": len(self),
+                "capacity": self.capacity,
+                "max_entries": self.max_entries,
+                "file_bytes": size_bytes,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+            }
+
+
+def main(argv: list[str] | None = None) -> None:
+    import argparse
+    import json
+
+    try:
+        from app import services
+        from app.models import DocumentIn
+    except ImportError:
+        import services
+        from models import DocumentIn
+
+    parser = argparse.ArgumentParser(description="Manage the persistent chunk-embedding store")
+    sub = parser.add_subparsers(dest="command", required=True)
+    sub.add_parser("stats", help="print store statistics")
+    sub.add_parser("compact", help="pack live vectors and truncate the vectors file")
+    warm = sub.add_parser("warm", help="chunk and embed documents from an NDJSON file into the store")
+    warm.add_argument("path", help="NDJSON file with one DocumentIn object per line ('-' for stdin)")
+    warm.add_argument("--batch", type=int, default=256, help="chunks per embedding call")
+    args = parser.parse_args(argv)
+
+    store = services.get_embedding_store()
+    if store is None:
+        parser.error("EMBED_STORE_PATH is not set")
+
+    if args.command == "compact":
+        try:
+            reclaimed = store.compact()
+        except RuntimeError as e:
+            parser.exit(1, f"{e}\n")
+        print(json.dumps({"reclaimed_rows": reclaimed, **store.stats()}, indent=2))
+        return
+    if args.command == "warm":
+        import sys
+        fh = sys.stdin if args.path == "-" else open(args.path, encoding="utf-8")
+        texts, digests = [], []
+        with fh:
+            for line in fh:
+                if not line.strip():
+                    continue
+                doc = DocumentIn.model_validate_json(line)
+                for text in services.chunk_text(doc.text):
+                    texts.append(text)
+                    digests.append(services.content_hash(text))
+                if len(texts) >= args.batch:
+                    services.embed_chunks(texts, digests)
+                    texts, digests = [], []
+        if texts:
+            services.embed_chunks(texts, digests)
+    print(json.dumps(store.stats(), indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,300 @@
+"""Persistent background ingest jobs.
+
+With background ingest, ``/ingest`` stores the document as a job in a local
+SQLite queue and returns its id immediately. A fixed pool of worker threads,
+separate from the request threadpool and the CPU executor used by
+``/query``, runs the jobs through the sync service layer and records
+progress (chunking, embedding, uploading). Clients poll ``/ingest/jobs/{id}``.
+
+Jobs are picked by priority first. Among collections with equally urgent
+work, the one served least recently goes next, so one busy collection cannot
+starve the others. Jobs that were running when the process stopped are
+queued again at startup, and ingest is idempotent, so re-running them is
+safe. The queue is meant to be owned by a single process.
+"""
+from __future__ import annotations
+
+import json
+import logging
+import sqlite3
+import threading
+import time
+import uuid
+from pathlib import Path
+
+try:
+    from app.config import INGEST_JOBS_DB, INGEST_JOB_WORKERS, INGEST_JOB_MAX_QUEUED, INGEST_JOB_RETENTION
+    from app import services, metrics
+except ImportError:
+    from config import INGEST_JOBS_DB, INGEST_JOB_WORKERS, INGEST_JOB_MAX_QUEUED, INGEST_JOB_RETENTION
+    import services
+    import metrics
+
+logger = logging.getLogger("docservice")
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS jobs (
+    seq INTEGER PRIMARY KEY AUTOINCREMENT,
+    id TEXT UNIQUE NOT NULL,
+    doc_id TEXT NOT NULL,
+    collection TEXT NOT NULL,
+    priority INTEGER NOT NULL DEFAULT 0,
+    status TEXT NOT NULL,
+    progress TEXT,
+    text TEXT,
+    chars INTEGER NOT NULL,
+    chunks INTEGER,
+    result TEXT,
+    error TEXT,
+    created_at REAL NOT NULL,
+    started_at REAL,
+    finished_at REAL
+);
+CREATE INDEX IF NOT EXISTS jobs_queue ON jobs (status, collection, priority, seq);
+"""
+
+_COLUMNS = (
+    "id, doc_id, collection, priority, status, progress, chars, chunks, result, error, "
+    "created_at, started_at, finished_at"
+)
+
+STATUSES = ("queued", "running", "done", "failed")
+
+
+class JobStore:
+    """SQLite table of ingest jobs; all access is serialized by one lock.
+
+    With ``read_only`` an existing database is opened for lookups only.
+    """
+
+    def __init__(self, path: str, read_only: bool = False):
+        self._lock = threading.Lock()
+        if read_only:
+            self._db = sqlite3.connect(f"{Path(path).resolve().as_uri()}?mode=ro", uri=True, check_same_thread=False)
+            return
+        Path(path).parent.mkdir(parents=True, exist_ok=True)
+        self._db = sqlite3.connect(path, check_same_thread=False)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.executescript(_SCHEMA)
+        self._db.commit()
+
+    def close(self) -> None:
+        with self._lock:
+            self._db.close()
+
+    def enqueue(self, doc_id: str, collection: str, text: str, priority: int = 0) -> str:
+        job_id = uuid.uuid4().hex
+        with self._lock:
+            self._db.execute(
+                "INSERT INTO jobs (id, doc_id, collection, priority, status, progress, text, chars, created_at) "
+                "VALUES (?, ?, ?, ?, 'queued', 'queued', ?, ?, ?)",
+                (job_id, doc_id, collection, priority, text, len(text), time.time()),
+            )
+            self._db.commit()
+        return job_id
+
+    def claim_next(self, last_served: dict[str, float]) -> tuple[str, str, str, str] | None:
+        """Mark the next job running and return (id, doc_id, collection, text)."""
+        with self._lock:
+            heads = self._db.execute(
+                "SELECT collection, MAX(priority) FROM jobs WHERE status = 'queued' GROUP BY collection"
+            ).fetchall()
+            if not heads:
+                return None
+            # Highest priority first, then the collection that waited longest for a worker
+            collection = max(heads, key=lambda h: (h[1], -last_served.get(h[0], 0.0)))[0]
+            row = self._db.execute(
+                "SELECT id, doc_id, collection, text FROM jobs WHERE status = 'queued' AND collection = ? "
+                "ORDER BY priority DESC, seq LIMIT 1",
+                (collection,),
+            ).fetchone()
+            self._db.execute(
+                "UPDATE jobs SET status = 'running', progress = 'chunking', started_at = ? WHERE id = ?",
+                (time.time(), row[0]),
+            )
+            self._db.commit()
+            return row
+
+    def update(self, job_id: str, **fields) -> None:
+        names = ", ".join(f"{name} = ?" for name in fields)
+        with self._lock:
+            self._db.execute(f"UPDATE jobs SET {names} WHERE id = ?", (*fields.values(), job_id))
+            self._db.commit()
+
+    def get(self, job_id: str) -> dict | None:
+        with self._lock:
+            row = self._db.execute(f"SELECT {_COLUMNS}, seq FROM jobs WHERE id = ?", (job_id,)).fetchone()
+            if row is None:
+                return None
+            job = dict(zip(_COLUMNS.split(", "), row[:-1]))
+            if job["status"] == "queued":
+                job["queued_ahead"] = self._db.execute(
+                    "SELECT COUNT(*) FROM jobs WHERE status = 'queued' AND (priority > ? OR (priority = ? AND seq < ?))",
+                    (job["priority"], job["priority"], row[-1]),
+                ).fetchone()[0]
+        job["result"] = json.loads(job["result"]) if job["result"] else None
+        return job
+
+    def counts(self) -> dict[str, int]:
+        with self._lock:
+            found = dict(self._db.execute("SELECT status, COUNT(*) FROM jobs GROUP BY status").fetchall())
+        return {status: found.get(status, 0) for status in STATUSES}
+
+    def requeue_running(self) -> int:
+        """Queue again any job left running by a previous process."""
+        with self._lock:
+            cur = self._db.execute(
+                "UPDATE jobs SET status = 'queued', progress = 'queued', started_at = NULL WHERE status = 'running'"
+            )
+            self._db.commit()
+            return cur.rowcount
+
+    def purge(self, older_than_seconds: float) -> int:
+        """Delete finished jobs older than the retention period."""
+        with self._lock:
+            cur = self._db.execute(
+                "DELETE FROM jobs WHERE status IN ('done', 'failed') AND finished_at < ?",
+                (time.time() - older_than_seconds,),
+            )
+            self._db.commit()
+            return cur.rowcount
+
+
+class IngestJobQueue:
+    """Worker threads draining a JobStore through the sync ingest stages."""
+
+    def __init__(self, store: JobStore, workers: int = 2, max_queued: int = 10_000, retention_seconds: float = 0):
+        self.store = store
+        self.workers = max(1, workers)
+        self.max_queued = max_queued
+        self.retention_seconds = retention_seconds
+        self._wakeup = threading.Condition()
+        self._stopping = threading.Event()
+        self._threads: list[threading.Thread] = []
+        self._last_served: dict[str, float] = {}
+
+    def start(self) -> "IngestJobQueue":
+        if self._threads:
+            return self
+        requeued = self.store.requeue_running()
+        if requeued:
+            logger.info("Re-queued %d ingest jobs interrupted by the previous shutdown", requeued)
+        if self.retention_seconds > 0:
+            self.store.purge(self.retention_seconds)
+        self._stopping.clear()
+        for i in range(self.workers):
+            thread = threading.Thread(target=self._work, name=f"docservice-ingest-job-{i}", daemon=True)
+            thread.start()
+            self._threads.append(thread)
+        return self
+
+    def stop(self) -> None:
+        self._stopping.set()
+        with self._wakeup:
+            self._wakeup.notify_all()
+        self._threads = []
+
+    def submit(self, doc_id: str, text: str, collection: str | None = None, priority: int = 0) -> dict:
+        """Queue a document; raises ValueError without a target collection."""
+        target = services.resolve_collection(collection)
+        if self.max_queued and self.store.counts()["queued"] >= self.max_queued:
+            raise OverflowError(f"Ingest queue is full ({self.max_queued} jobs waiting).")
+        job_id = self.store.enqueue(doc_id, target, text, priority)
+        with self._wakeup:
+            self._wakeup.notify()
+        return self.store.get(job_id)
+
+    def _work(self) -> None:
+        while not self._stopping.is_set():
+            with self._wakeup:
+                job = self.store.claim_next(self._last_served)
+                if job is not None:
+                    self._last_served[job[2]] = time.monotonic()
+                else:
+                    self._wakeup.wait(timeout=1.0)
+                    continue
+            self._run(*job)
+
+    def _run(self, job_id: str, doc_id: str, collection: str, text: str) -> None:
+        try:
+            plan = services.prepare_ingest(doc_id, text, collection)
+            self.store.update(job_id, progress="embedding", chunks=len(plan.texts))
+            services.embed_ingest(plan)
+            self.store.update(job_id, progress="uploading")
+            result = services.commit_ingest(plan)
+        except Exception as e:
+            logger.exception("Ingest job %s for document '%s' failed", job_id, doc_id)
+            metrics.ERRORS_TOTAL.inc(operation="ingest_job")
+            self.store.update(job_id, status="failed", progress="failed", error=str(e), text=None, finished_at=time.time())
+            return
+        status, error = ("done", None) if result.chunks else ("failed", "No content to ingest.")
+        self.store.update(
+            job_id,
+            status=status,
+            progress=status,
+            error=error,
+            result=result.model_dump_json(),
+            text=None,
+            finished_at=time.time(),
+        )
+
+    def stats(self) -> dict:
+        # "started" rather than "running", which is also one of the job statuses
+        return {"workers": self.workers, "started": bool(self._threads), **self.store.counts()}
+
+
+_queue: IngestJobQueue | None = None
+_queue_lock = threading.Lock()
+
+
+def get_job_queue() -> IngestJobQueue:
+    """Return the process-wide job queue, opening its database and starting workers."""
+    global _queue
+    if _queue is None:
+        with _queue_lock:
+            if _queue is None:
+                _queue = IngestJobQueue(
+                    JobStore(INGEST_JOBS_DB),
+                    workers=INGEST_JOB_WORKERS,
+                    max_queued=INGEST_JOB_MAX_QUEUED,
+                    retention_seconds=INGEST_JOB_RETENTION,
+                ).start()
+    return _queue
+
+
+def resume_pending() -> IngestJobQueue | None:
+    """Start the workers at startup if a job database from an earlier run exists."""
+    return get_job_queue() if Path(INGEST_JOBS_DB).exists() else None
+
+
+def get_job(job_id: str) -> dict | None:
+    """Look up a job without opening the queue or starting its workers."""
+    if _queue is not None:
+        return _queue.store.get(job_id)
+    if not Path(INGEST_JOBS_DB).exists():
+        return None
+    store = JobStore(INGEST_JOBS_DB, read_only=True)
+    try:
+        return store.get(job_id)
+    finally:
+        store.close()
+
+
+def shutdown() -> None:
+    if _queue is not None:
+        _queue.stop()
+
+
+def job_stats() -> dict:
+    if _queue is None:
+        return {"workers": INGEST_JOB_WORKERS, "started": False}
+    return _queue.stats()
+
+
+def _job_gauges():
+    if _queue is not None:
+        for status, count in _queue.store.counts().items():
+            yield ("docservice_ingest_jobs", "Ingest jobs by status.", {"status": status}, count)
+
+
+metrics.REGISTRY.register_collector(_job_gauges)
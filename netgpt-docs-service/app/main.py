@@ -5,7 +5,12 @@ try:
 except Exception:
     # Fallback to local import when running as a script from inside the app folder
     from preconfig import configure_from_env  # side-effect: sets env vars
-from fastapi import FastAPI, HTTPException
+import asyncio
+import time
+from contextlib import asynccontextmanager
+from fastapi import FastAPI, HTTPException, Query, Request
+from fastapi.concurrency import iterate_in_threadpool, run_in_threadpool
+from fastapi.responses import JSONResponse, PlainTextResponse, StreamingResponse
 import sys
 from pathlib import Path
 
@@ -22,61 +27,259 @@ if str(project_root) not in sys.path:
 # sys.path as above. Try the package imports first, then fall back to
 # local imports if necessary.
 try:
-    from app.models import DocumentIn, QueryIn, SearchResult
-    from app.services import ingest_document, query_text
+    from app.models import DocumentIn, QueryIn, BatchQueryIn, SearchResult, CollectionOptions
+    # Endpoints use the async service layer (AsyncQdrantClient + CPU executor)
+    from app.async_services import ingest_document, query_text, query_batch
     # Admin helpers
-    from app.services import ensure_collection, list_collections, delete_collection, get_raw_client
+    from app.async_services import ensure_collection, list_collections, delete_collection
+    from app.services import get_raw_client, QdrantTimeout, resolve_postprocess
+    from app.services import embedding_batcher_stats, cache_stats, embedding_store_stats
+    from app.pipeline import IngestPipeline
+    from app.config import BULK_QUEUE_SIZE, BULK_EMBED_BATCH, WARMUP_ON_STARTUP
+    from app.warmup import WarmupState, run_warmup
+    from app.config import SERVER_TIMING, PROFILE_SLOW_MS, PROFILE_SAMPLE_RATE, PROFILE_DIR, QUERY_BATCH_MAX
+    from app.config import INGEST_BACKGROUND, INGEST_JOB_MAX_PRIORITY, QDRANT_PREFER_GRPC, QDRANT_CLIENT_POOL_SIZE
+    from app import jobs
+    from app import metrics
+    from app.timing import record_stages
+    from app.profiling import SlowRequestProfiler
 except ImportError:
     # Fallback for script execution where the current directory is the package folder
-    from models import DocumentIn, QueryIn, SearchResult
-    from services import ingest_document, query_text
-    from services import ensure_collection, list_collections, delete_collection, get_raw_client
+    from models import DocumentIn, QueryIn, BatchQueryIn, SearchResult, CollectionOptions
+    from async_services import ingest_document, query_text, query_batch
+    from async_services import ensure_collection, list_collections, delete_collection
+    from services import get_raw_client, QdrantTimeout, resolve_postprocess
+    from services import embedding_batcher_stats, cache_stats, embedding_store_stats
+    from pipeline import IngestPipeline
+    from config import BULK_QUEUE_SIZE, BULK_EMBED_BATCH, WARMUP_ON_STARTUP
+    from warmup import WarmupState, run_warmup
+    from config import SERVER_TIMING, PROFILE_SLOW_MS, PROFILE_SAMPLE_RATE, PROFILE_DIR, QUERY_BATCH_MAX
+    from config import INGEST_BACKGROUND, INGEST_JOB_MAX_PRIORITY, QDRANT_PREFER_GRPC, QDRANT_CLIENT_POOL_SIZE
+    import jobs
+    import metrics
+    from timing import record_stages
+    from profiling import SlowRequestProfiler
+
+warmup_state = WarmupState(enabled=WARMUP_ON_STARTUP)
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Warm up in the background so /health answers immediately; /ready waits.
+    task = asyncio.create_task(run_warmup(warmup_state)) if warmup_state.enabled else None
+    # Pick up background ingest jobs left over from a previous run
+    await run_in_threadpool(jobs.resume_pending)
+    yield
+    jobs.shutdown()
+    if task is not None and not task.done():
+        task.cancel()
+
 
 app = FastAPI(
     title="NetGPT Document Ingestion Service",
-    description="Ingest text docs, chunk and embed with FastEmbed, store in Qdrant, and query by semantic similarity."
+    description="Ingest text docs, chunk and embed with FastEmbed, store in Qdrant, and query by semantic similarity.",
+    lifespan=lifespan,
 )
 
+profiler = SlowRequestProfiler(PROFILE_SLOW_MS, PROFILE_SAMPLE_RATE, PROFILE_DIR)
+
+
+@app.exception_handler(QdrantTimeout)
+async def qdrant_timeout_handler(request: Request, exc: QdrantTimeout):
+    """Fail fast with 504 when Qdrant is too slow instead of holding the worker."""
+    return JSONResponse({"detail": str(exc)}, status_code=504)
+
+
+@app.middleware("http")
+async def instrument_requests(request: Request, call_next):
+    """Record request latency/status metrics, Server-Timing and slow-request profiles."""
+    profile = profiler.start()
+    started = time.perf_counter()
+    status = 500
+    with record_stages() as stages:
+        try:
+            response = await call_next(request)
+            status = response.status_code
+        finally:
+            elapsed = time.perf_counter() - started
+            route = getattr(request.scope.get("route"), "path", "unmatched")
+            metrics.REQUEST_SECONDS.observe(elapsed, method=request.method, route=route)
+            metrics.REQUESTS_TOTAL.inc(method=request.method, route=route, status=str(status))
+            if status >= 500:
+                metrics.ERRORS_TOTAL.inc(operation=f"{request.method} {route}")
+            profiler.finish(profile, f"{request.method} {route}", elapsed)
+    if SERVER_TIMING:
+        entries = [f"{name};dur={seconds * 1000:.2f}" for name, seconds in stages.items()]
+        entries.append(f"total;dur={elapsed * 1000:.2f}")
+        response.headers["Server-Timing"] = ", ".join(entries)
+    return response
+
+
 @app.post("/ingest")
-def ingest_endpoint(doc: DocumentIn):
+async def ingest_endpoint(
+    doc: DocumentIn, background: bool | None = None, priority: int = Query(0, ge=0, le=INGEST_JOB_MAX_PRIORITY)
+):
+    """Ingest a document inline, or queue it as a background job (202 + job id)."""
+    if INGEST_BACKGROUND if background is None else background:
+        try:
+            job = await run_in_threadpool(jobs.get_job_queue().submit, doc.doc_id, doc.text, doc.collection, priority)
+        except ValueError as e:
+            raise HTTPException(status_code=400, detail=str(e))
+        except OverflowError as e:
+            raise HTTPException(status_code=429, detail=str(e))
+        return JSONResponse({"status": "queued", "job_id": job["id"], "job": job}, status_code=202)
     try:
-        count = ingest_document(doc.doc_id, doc.text, collection=doc.collection)
+        result = await ingest_document(doc.doc_id, doc.text, collection=doc.collection)
     except ValueError as e:
         raise HTTPException(status_code=400, detail=str(e))
-    if count == 0:
+    if result.chunks == 0:
         raise HTTPException(status_code=400, detail="No content to ingest.")
-    return {"status": "success", "chunks_ingested": count}
+    return {
+        "status": "success",
+        "chunks_ingested": result.chunks,
+        "chunks_new": result.new,
+        "chunks_unchanged": result.unchanged,
+        "chunks_deleted": result.deleted,
+    }
+
+@app.get("/ingest/jobs")
+def ingest_jobs():
+    """Background ingest worker count and jobs per status."""
+    return jobs.job_stats()
+
+
+@app.get("/ingest/jobs/{job_id}")
+def ingest_job(job_id: str):
+    """Status and progress (queued, chunking, embedding, uploading, done, failed) of a job."""
+    job = jobs.get_job(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Unknown job id")
+    return job
+
+class _DuplexStreamingResponse(StreamingResponse):
+    """StreamingResponse that leaves ``receive`` to the handler.
+
+    StreamingResponse normally watches ``receive`` for a client disconnect,
+    which would swallow request body chunks still being read; here the body
+    reader notices a disconnect itself.
+    """
+
+    async def __call__(self, scope, receive, send):
+        await self.stream_response(send)
+
+
+@app.post("/ingest/bulk")
+async def ingest_bulk_endpoint(request: Request, collection: str | None = None):
+    """Ingest an NDJSON stream of documents (one DocumentIn object per line).
 
-@app.post("/query", response_model=list[SearchResult])
-def query_endpoint(query: QueryIn):
+    Documents are chunked, embedded and uploaded by concurrent pipeline
+    stages while the body is still being received, and result lines are
+    streamed back as documents finish; bounded queues between the stages
+    throttle the reader. One NDJSON result line is returned per input
+    document, in input order. ``collection`` is used for documents that do not
+    name their own.
+    """
+    pipeline = IngestPipeline(collection=collection, queue_size=BULK_QUEUE_SIZE, embed_batch=BULK_EMBED_BATCH).start()
+
+    async def feed():
+        buffer = b""
+        line_no = 0
+        try:
+            async for data in request.stream():
+                buffer += data
+                *lines, buffer = buffer.split(b"\n")
+                for raw in lines:
+                    line_no += 1
+                    if not raw.strip():
+                        continue
+                    if not pipeline.try_submit_line(line_no, raw):
+                        await run_in_threadpool(pipeline.submit_line, line_no, raw)
+            if buffer.strip():
+                await run_in_threadpool(pipeline.submit_line, line_no + 1, buffer)
+        finally:
+            await run_in_threadpool(pipeline.close)
+
+    async def results():
+        feeder = asyncio.create_task(feed())
+        try:
+            async for line in iterate_in_threadpool(pipeline.iter_results()):
+                yield line
+            await feeder
+        finally:
+            if not feeder.done():
+                # Client went away mid-response: stop reading, let the stages run dry
+                pipeline.discard()
+                feeder.cancel()
+
+    return _DuplexStreamingResponse(results(), media_type="application/x-ndjson")
+
+@app.post("/query", response_model=list[SearchResult], response_model_exclude_none=True)
+async def query_endpoint(query: QueryIn):
     try:
-        results = query_text(query.query, top_k=5, collection=query.collection)
+        results = await query_text(
+            query.query,
+            top_k=query.top_k,
+            collection=query.collection,
+            hybrid=query.hybrid,
+            hnsw_ef=query.hnsw_ef,
+            rescore=query.rescore,
+            oversampling=query.oversampling,
+            post=resolve_postprocess(
+                query.fields, query.snippet, query.collapse, query.mmr, query.mmr_lambda, query.rerank
+            ),
+        )
     except ValueError as e:
         raise HTTPException(status_code=400, detail=str(e))
     return results
 
+@app.post("/query/batch", response_model=list[list[SearchResult]], response_model_exclude_none=True)
+async def query_batch_endpoint(batch: BatchQueryIn):
+    """Run many queries with one embedding call and one batched search per collection."""
+    if len(batch.queries) > QUERY_BATCH_MAX:
+        raise HTTPException(status_code=400, detail=f"At most {QUERY_BATCH_MAX} queries per batch.")
+    try:
+        return await query_batch(batch.queries)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
 @app.get("/health")
-def health():
+async def health():
     return {"status": "healthy"}
 
 
+@app.get("/metrics", response_class=PlainTextResponse)
+async def metrics_endpoint():
+    """Prometheus text-format metrics: per-stage histograms, counters and cache gauges."""
+    return PlainTextResponse(metrics.render(), media_type="text/plain; version=0.0.4")
+
+
+@app.get("/ready")
+async def ready():
+    """Readiness probe: 200 once the startup warm-up has completed."""
+    body = warmup_state.as_dict()
+    return JSONResponse(body, status_code=200 if warmup_state.ready else 503)
+
+
 @app.post("/admin/ensure-collection")
-def admin_ensure_collection(name: str, dim: int = 384):
-    ok = ensure_collection(name, dim)
+async def admin_ensure_collection(
+    name: str, dim: int = 384, hybrid: bool | None = None, options: CollectionOptions | None = None
+):
+    """Create a collection; the optional JSON body overrides storage/index settings."""
+    ok = await ensure_collection(name, dim, hybrid=hybrid, options=options)
     if not ok:
         raise HTTPException(status_code=500, detail="Failed to ensure collection")
     return {"status": "ok", "collection": name}
 
 
 @app.get("/admin/collections")
-def admin_list_collections():
-    cols = list_collections()
+async def admin_list_collections():
+    cols = await list_collections()
     return {"collections": cols}
 
 
 @app.delete("/admin/collections/{name}")
-def admin_delete_collection(name: str):
-    ok = delete_collection(name)
+async def admin_delete_collection(name: str):
+    ok = await delete_collection(name)
     if not ok:
         raise HTTPException(status_code=500, detail="Failed to delete collection")
     return {"status": "deleted", "collection": name}
@@ -85,7 +288,11 @@ def admin_delete_collection(name: str):
 @app.get("/admin/client-info")
 def admin_client_info():
     client = get_raw_client()
-    info = {"type": client.__class__.__name__}
+    info = {
+        "type": client.__class__.__name__,
+        "transport": "grpc" if QDRANT_PREFER_GRPC else "rest",
+        "client_pool_size": QDRANT_CLIENT_POOL_SIZE,
+    }
     # Avoid leaking credentials; include only safe metadata
     try:
         if hasattr(client, "url"):
@@ -95,6 +302,24 @@ def admin_client_info():
     return info
 
 
+@app.get("/admin/embedding-batcher")
+def admin_embedding_batcher():
+    """Batch-size and queue-wait metrics for the embedding micro-batcher."""
+    return embedding_batcher_stats()
+
+
+@app.get("/admin/cache-stats")
+def admin_cache_stats():
+    """Hit, miss and eviction counters for the query caches and the reranker score cache."""
+    return cache_stats()
+
+
+@app.get("/admin/embedding-store")
+def admin_embedding_store():
+    """Size and hit counters for the persistent chunk-embedding store."""
+    return embedding_store_stats()
+
+
 if __name__ == "__main__":
     # Allow quick local testing with: python main.py
     try:
@@ -0,0 +1,185 @@
+"""Minimal Prometheus-compatible metrics (text exposition format 0.0.4).
+
+Only counters and histograms with labels are needed on the hot path, so they
+are implemented here instead of pulling in ``prometheus_client``. Point-in-time
+values (cache sizes, batcher counters, ...) are added at scrape time through
+``register_collector``.
+"""
+from __future__ import annotations
+
+import math
+import threading
+from typing import Callable, Iterable
+
+DEFAULT_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+
+def _escape(value) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _labels(names: tuple[str, ...], values: tuple, extra: str = "") -> str:
+    parts = [f'{n}="{_escape(v)}"' for n, v in zip(names, values)]
+    if extra:
+        parts.append(extra)
+    return "{" + ",".join(parts) + "}" if parts else ""
+
+
+def _fmt(value: float) -> str:
+    if math.isinf(value):
+        return "+Inf" if value > 0 else "-Inf"
+    return repr(float(value))
+
+
+class _Metric:
+    type = ""
+
+    def __init__(self, name: str, documentation: str, labelnames: Iterable[str] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._lock = threading.Lock()
+        REGISTRY.register(self)
+
+    def _key(self, labels: dict) -> tuple:
+        return tuple(str(labels.get(n, "")) for n in self.labelnames)
+
+    def header(self) -> list[str]:
+        return [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.type}"]
+
+
+class Counter(_Metric):
+    type = "counter"
+
+    def __init__(self, name: str, documentation: str, labelnames: Iterable[str] = ()):
+        super().__init__(name, documentation, labelnames)
+        self._values: dict[tuple, float] = {}
+
+    def inc(self, amount: float = 1.0, **labels) -> None:
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0.0) + amount
+
+    def render(self) -> list[str]:
+        with self._lock:
+            items = sorted(self._values.items())
+        return self.header() + [f"{self.name}{_labels(self.labelnames, k)} {_fmt(v)}" for k, v in items]
+
+
+class Histogram(_Metric):
+    type = "histogram"
+
+    def __init__(self, name: str, documentation: str, labelnames: Iterable[str] = (), buckets=DEFAULT_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets))
+        # key -> [bucket counts..., sum, count]
+        self._values: dict[tuple, list[float]] = {}
+
+    def observe(self, value: float, **labels) -> None:
+        key = self._key(labels)
+        with self._lock:
+            row = self._values.get(key)
+            if row is None:
+                row = self._values[key] = [0.0] * (len(self.buckets) + 2)
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    row[i] += 1
+            row[-2] += value
+            row[-1] += 1
+
+    def render(self) -> list[str]:
+        with self._lock:
+            items = sorted((k, list(v)) for k, v in self._values.items())
+        lines = self.header()
+        for key, row in items:
+            for bound, count in zip(self.buckets, row):
+                le = 'le="%s"' % _fmt(bound)
+                lines.append(f"{self.name}_bucket{_labels(self.labelnames, key, le)} {_fmt(count)}")
+            le = 'le="+Inf"'
+            lines.append(f"{self.name}_bucket{_labels(self.labelnames, key, le)} {_fmt(row[-1])}")
+            lines.append(f"{self.name}_sum{_labels(self.labelnames, key)} {_fmt(row[-2])}")
+            lines.append(f"{self.name}_count{_labels(self.labelnames, key)} {_fmt(row[-1])}")
+        return lines
+
+
+class Registry:
+    def __init__(self):
+        self._metrics: list[_Metric] = []
+        self._collectors: list[Callable[[], Iterable[tuple[str, str, dict, float]]]] = []
+
+    def register(self, metric: _Metric) -> None:
+        self._metrics.append(metric)
+
+    def register_collector(self, fn: Callable[[], Iterable[tuple[str, str, dict, float]]]) -> None:
+        """``fn`` yields (name, help, labels, value) gauge samples at scrape time."""
+        self._collectors.append(fn)
+
+    def render(self) -> str:
+        lines: list[str] = []
+        for metric in self._metrics:
+            lines.extend(metric.render())
+        seen: set[str] = set()
+        for collector in self._collectors:
+            try:
+                samples = list(collector())
+            except Exception:
+                continue
+            for name, documentation, labels, value in samples:
+                if name not in seen:
+                    lines += [f"# HELP {name} {documentation}", f"# TYPE {name} gauge"]
+                    seen.add(name)
+                names = tuple(labels)
+                lines.append(f"{name}{_labels(names, tuple(labels[n] for n in names))} {_fmt(float(value))}")
+        return "\n".join(lines) + "\n"
+
+
+REGISTRY = Registry()
+
+STAGE_SECONDS = Histogram(
+    "docservice_stage_seconds", "Time spent in each ingest/query stage.", ("stage", "collection")
+)
+REQUEST_SECONDS = Histogram(
+    "docservice_http_request_seconds", "HTTP request latency by route.", ("method", "route")
+)
+REQUESTS_TOTAL = Counter(
+    "docservice_http_requests_total", "HTTP requests by route and status code.", ("method", "route", "status")
+)
+INGEST_DOCUMENTS_TOTAL = Counter(
+    "docservice_ingest_documents_total", "Documents ingested.", ("collection",)
+)
+INGEST_CHUNKS_TOTAL = Counter(
+    "docservice_ingest_chunks_total", "Chunks processed by ingest, by outcome.", ("collection", "outcome")
+)
+INGEST_BYTES_TOTAL = Counter(
+    "docservice_ingest_bytes_total", "UTF-8 bytes of chunk text processed by ingest.", ("collection",)
+)
+QUERIES_TOTAL = Counter(
+    "docservice_queries_total", "Queries served, by result-cache outcome.", ("collection", "cache")
+)
+UPLOAD_RETRIES_TOTAL = Counter(
+    "docservice_upload_retries_total", "Failed upload batch attempts (retried or final).", ("collection",)
+)
+ERRORS_TOTAL = Counter(
+    "docservice_errors_total", "Failed operations.", ("operation",)
+)
+
+
+# Collection names come from requests. Only names a collection registry knows
+# become label values; anything else is counted as "other", so clients cannot
+# create an unbounded number of series.
+_collection_filters: list[Callable[[str], bool]] = []
+
+
+def track_collections(known: Callable[[str], bool]) -> None:
+    """Accept collection label values for which ``known`` returns True."""
+    _collection_filters.append(known)
+
+
+def collection_label(name: str) -> str:
+    if not name or any(known(name) for known in _collection_filters):
+        return name
+    return "other"
+
+
+def render() -> str:
+    return REGISTRY.render()
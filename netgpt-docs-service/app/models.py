@@ -1,4 +1,6 @@
-from pydantic import BaseModel
+from typing import Literal
+
+from pydantic import BaseModel, Field
 
 class DocumentIn(BaseModel):
     doc_id: str
@@ -13,8 +15,59 @@ class QueryIn(BaseModel):
     # Optional collection to query against. If not provided, default COLLECTION_NAME
     # is used if present.
     collection: str | None = None
+    # Number of hits to return
+    top_k: int = Field(5, ge=1, le=100)
+    # Dense + sparse fusion. None uses hybrid search whenever the collection
+    # has sparse vectors; False forces dense-only, True requires sparse vectors.
+    hybrid: bool | None = None
+    # Recall/latency trade-offs for this query; None uses the configured defaults
+    hnsw_ef: int | None = Field(None, ge=1)
+    rescore: bool | None = None
+    oversampling: float | None = Field(None, ge=1.0)
+    # Result post-processing; None uses the configured defaults.
+    # Payload fields to return (doc_id always included); None returns doc_id and chunk
+    fields: list[str] | None = None
+    # Return at most this many characters of each chunk (0 = whole chunk)
+    snippet: int | None = Field(None, ge=0)
+    # Keep only the best hit per doc_id
+    collapse: bool | None = None
+    # Diversify with maximal marginal relevance; mmr_lambda 1.0 = pure relevance
+    mmr: bool | None = None
+    mmr_lambda: float | None = Field(None, ge=0.0, le=1.0)
+    # Re-score a larger candidate set with the cross-encoder reranker
+    rerank: bool | None = None
+
+class BatchQueryIn(BaseModel):
+    # Queries may target different collections; results come back in the same order
+    queries: list[QueryIn] = Field(..., min_length=1)
 
 class SearchResult(BaseModel):
     doc_id: str
-    chunk: str
+    # None when the query selected payload fields without "chunk"
+    chunk: str | None = None
     score: float
+    # Other payload fields selected with QueryIn.fields
+    payload: dict | None = None
+    # Cross-encoder score when the query was reranked (results are ordered by it)
+    rerank_score: float | None = None
+
+class IngestResult(BaseModel):
+    doc_id: str
+    collection: str
+    # Total chunks produced for the document
+    chunks: int
+    # Chunks embedded and uploaded by this call
+    new: int = 0
+    # Chunks whose point already existed with identical content (skipped)
+    unchanged: int = 0
+    # Stale points for this doc_id removed from the collection
+    deleted: int = 0
+
+class CollectionOptions(BaseModel):
+    # Storage and index settings for a new collection; None falls back to config
+    quantization: Literal["none", "scalar", "binary", "product"] | None = None
+    on_disk: bool | None = None
+    datatype: Literal["float32", "float16"] | None = None
+    hnsw_m: int | None = Field(None, ge=0)
+    hnsw_ef_construct: int | None = Field(None, ge=4)
+    payload_index: bool | None = None
@@ -0,0 +1,235 @@
+"""Pipelined bulk ingest: chunk -> embed -> upload as concurrent stages.
+
+Each stage runs on its own thread and hands work to the next through a
+bounded queue, so a slow stage applies backpressure all the way back to the
+request body reader instead of buffering the whole upload in memory. The
+results queue is bounded too, so a client that reads the response slowly
+throttles the pipeline in the same way. The embed stage merges the pending chunks of several queued documents into one
+embedding call. Per-document results are emitted in submission order.
+
+Which chunks of a document are new or stale is decided against the points
+already stored for its doc_id, so a doc_id that appears again in the same
+stream is only planned once its earlier version has been committed.
+"""
+from __future__ import annotations
+
+import json
+import logging
+import queue
+import threading
+
+from pydantic import ValidationError
+
+try:
+    from app.models import DocumentIn
+    from app.services import prepare_ingest, commit_ingest, embed_chunks, embed_sparse, resolve_collection
+    from app.timing import bind_collection
+    from app.metrics import ERRORS_TOTAL
+except ImportError:
+    from models import DocumentIn
+    from services import prepare_ingest, commit_ingest, embed_chunks, embed_sparse, resolve_collection
+    from timing import bind_collection
+    from metrics import ERRORS_TOTAL
+
+logger = logging.getLogger("docservice")
+
+_DONE = object()
+
+
+class _Failed:
+    """A document that failed in an earlier stage; passed through unchanged."""
+
+    def __init__(self, line: int, doc_id: str | None, detail: str):
+        self.line = line
+        self.doc_id = doc_id
+        self.detail = detail
+
+    def as_dict(self) -> dict:
+        ERRORS_TOTAL.inc(operation="bulk_ingest")
+        return {"line": self.line, "doc_id": self.doc_id, "status": "error", "detail": self.detail}
+
+
+class IngestPipeline:
+    """Three-stage ingest pipeline with bounded queues between stages."""
+
+    def __init__(self, collection: str | None = None, queue_size: int = 64, embed_batch: int = 256):
+        self.collection = collection
+        self.embed_batch = max(1, embed_batch)
+        self._chunk_q: queue.Queue = queue.Queue(maxsize=queue_size)
+        self._embed_q: queue.Queue = queue.Queue(maxsize=queue_size)
+        self._upload_q: queue.Queue = queue.Queue(maxsize=queue_size)
+        self._results: queue.Queue = queue.Queue(maxsize=queue_size)
+        # (collection, doc_id) of documents planned but not yet committed
+        self._in_flight: set[tuple[str, str]] = set()
+        self._in_flight_done = threading.Condition()
+        self._threads = [
+            threading.Thread(target=self._chunk_stage, name="bulk-chunk", daemon=True),
+            threading.Thread(target=self._embed_stage, name="bulk-embed", daemon=True),
+            threading.Thread(target=self._upload_stage, name="bulk-upload", daemon=True),
+        ]
+
+    def start(self) -> "IngestPipeline":
+        for t in self._threads:
+            t.start()
+        return self
+
+    def try_submit_line(self, line_no: int, raw: bytes) -> bool:
+        """Queue one NDJSON line without blocking; False if the queue is full."""
+        try:
+            self._chunk_q.put_nowait((line_no, raw))
+            return True
+        except queue.Full:
+            return False
+
+    def submit_line(self, line_no: int, raw: bytes) -> None:
+        """Queue one NDJSON line, blocking while the pipeline is saturated."""
+        self._chunk_q.put((line_no, raw))
+
+    def close(self) -> None:
+        """Signal that no more documents will be submitted."""
+        self._chunk_q.put(_DONE)
+
+    def iter_results(self):
+        """Yield one NDJSON-encoded result line per submitted document."""
+        while True:
+            item = self._results.get()
+            if item is _DONE:
+                # Leave the sentinel for any other reader (see discard)
+                self._results.put(_DONE)
+                return
+            yield json.dumps(item) + "\n"
+
+    def discard(self) -> None:
+        """Drop remaining results in the background once nobody reads them.
+
+        Without a reader the stages would block on the bounded results queue
+        forever; the caller must still ``close`` the pipeline.
+        """
+        threading.Thread(target=self._drain, name="bulk-discard", daemon=True).start()
+
+    def _drain(self):
+        for _ in self.iter_results():
+            pass
+
+    def _parse(self, line_no: int, raw: bytes) -> DocumentIn | _Failed:
+        try:
+            return DocumentIn.model_validate_json(raw)
+        except ValidationError as e:
+            return _Failed(line_no, None, f"Invalid document: {e.errors(include_url=False)}")
+
+    def _chunk_stage(self):
+        while True:
+            item = self._chunk_q.get()
+            if item is _DONE:
+                self._embed_q.put(_DONE)
+                return
+            line_no, raw = item
+            doc = self._parse(line_no, raw)
+            if not isinstance(doc, _Failed):
+                doc = self._plan(line_no, doc)
+            self._embed_q.put(doc)
+
+    def _plan(self, line_no: int, doc: DocumentIn):
+        """Plan a document once no earlier version of its doc_id is still in flight."""
+        try:
+            key = (resolve_collection(doc.collection or self.collection), doc.doc_id)
+        except ValueError as e:
+            return _Failed(line_no, doc.doc_id, str(e))
+        with self._in_flight_done:
+            self._in_flight_done.wait_for(lambda: key not in self._in_flight)
+            self._in_flight.add(key)
+        try:
+            return line_no, prepare_ingest(doc.doc_id, doc.text, collection=key[0])
+        except Exception as e:
+            self._release(key)
+            return _Failed(line_no, doc.doc_id, str(e))
+
+    def _release(self, key: tuple[str, str]) -> None:
+        with self._in_flight_done:
+            self._in_flight.discard(key)
+            self._in_flight_done.notify_all()
+
+    def _embed_stage(self):
+        finished = False
+        while not finished:
+            batch = [self._embed_q.get()]
+            # Greedily merge already-queued documents into one embedding call
+            pending = self._pending_count(batch[0])
+            while pending < self.embed_batch:
+                try:
+                    nxt = self._embed_q.get_nowait()
+                except queue.Empty:
+                    break
+                batch.append(nxt)
+                pending += self._pending_count(nxt)
+            if batch[-1] is _DONE:
+                batch.pop()
+                finished = True
+            for item in self._embed_many(batch):
+                self._upload_q.put(item)
+        self._upload_q.put(_DONE)
+
+    @staticmethod
+    def _pending_count(item) -> int:
+        if item is _DONE or isinstance(item, _Failed):
+            return 0
+        return len(item[1].pending)
+
+    def _embed_many(self, batch: list) -> list:
+        plans = [item[1] for item in batch if not isinstance(item, _Failed)]
+        texts = [plan.texts[i] for plan in plans for i in plan.pending]
+        digests = [plan.digests[i] for plan in plans for i in plan.pending]
+        if not texts:
+            return batch
+        collections = {plan.collection for plan in plans}
+        bind_collection(collections.pop() if len(collections) == 1 else "")
+        hybrid = [plan for plan in plans if plan.sparse_name and plan.pending]
+        try:
+            vectors = embed_chunks(texts, digests)
+            sparse = embed_sparse([plan.texts[i] for plan in hybrid for i in plan.pending]) if hybrid else []
+        except Exception as e:
+            logger.exception("Bulk embedding of %d chunks failed", len(texts))
+            for plan in plans:
+                self._release((plan.collection, plan.doc_id))
+            return [item if isinstance(item, _Failed) else _Failed(item[0], item[1].doc_id, str(e)) for item in batch]
+        offset = 0
+        for plan in plans:
+            plan.embeddings = vectors[offset:offset + len(plan.pending)]
+            offset += len(plan.pending)
+        offset = 0
+        for plan in hybrid:
+            plan.sparse_embeddings = sparse[offset:offset + len(plan.pending)]
+            offset += len(plan.pending)
+        return batch
+
+    def _upload_stage(self):
+        while True:
+            item = self._upload_q.get()
+            if item is _DONE:
+                self._results.put(_DONE)
+                return
+            if isinstance(item, _Failed):
+                self._results.put(item.as_dict())
+                continue
+            line_no, plan = item
+            try:
+                result = commit_ingest(plan)
+            except Exception as e:
+                logger.exception("Bulk upload for document '%s' failed", plan.doc_id)
+                self._results.put(_Failed(line_no, plan.doc_id, str(e)).as_dict())
+                continue
+            finally:
+                self._release((plan.collection, plan.doc_id))
+            if result.chunks == 0:
+                self._results.put(_Failed(line_no, plan.doc_id, "No content to ingest.").as_dict())
+                continue
+            self._results.put({
+                "line": line_no,
+                "doc_id": result.doc_id,
+                "status": "success",
+                "collection": result.collection,
+                "chunks_ingested": result.chunks,
+                "chunks_new": result.new,
+                "chunks_unchanged": result.unchanged,
+                "chunks_deleted": result.deleted,
+            })
@@ -0,0 +1,289 @@
+"""Post-processing of search hits before they are returned.
+
+Nearest-neighbour search often fills the top k with near-identical chunks of
+one document. The steps below run on the hits Qdrant returns, in this order,
+each switchable per query (``QueryIn``) and timed as its own stage:
+
+- ``collapse``: keep only the best hit per doc_id
+- ``rerank``: re-score the candidates with a CPU cross-encoder (RERANK_MODEL)
+- ``mmr``: maximal marginal relevance over the vectors Qdrant returned with
+  the hits, trading relevance (lambda 1.0) against diversity (lambda 0.0)
+- ``snippet``: cut each chunk down to a window around the first query term
+
+Collapse, rerank and MMR need more candidates than they return, so Qdrant is
+asked for ``fetch_limit(top_k)`` hits and the result is cut back to top_k.
+``fields`` limits the payload Qdrant sends back in the first place.
+"""
+from __future__ import annotations
+
+import logging
+import threading
+from dataclasses import dataclass
+
+try:
+    from app.config import POSTPROCESS_COLLAPSE, POSTPROCESS_CANDIDATES_FACTOR, SNIPPET_CHARS
+    from app.config import MMR_ENABLED, MMR_LAMBDA, RERANK_ENABLED, RERANK_MODEL, RERANK_CANDIDATES
+    from app.config import RERANK_BATCH_SIZE, RERANK_CACHE_SIZE, RERANK_CACHE_TTL
+    from app.models import SearchResult
+    from app.cache import LRUCache, normalize_query
+    from app.timing import stage
+except ImportError:
+    from config import POSTPROCESS_COLLAPSE, POSTPROCESS_CANDIDATES_FACTOR, SNIPPET_CHARS
+    from config import MMR_ENABLED, MMR_LAMBDA, RERANK_ENABLED, RERANK_MODEL, RERANK_CANDIDATES
+    from config import RERANK_BATCH_SIZE, RERANK_CACHE_SIZE, RERANK_CACHE_TTL
+    from models import SearchResult
+    from cache import LRUCache, normalize_query
+    from timing import stage
+
+logger = logging.getLogger("docservice")
+
+
+@dataclass(frozen=True)
+class PostProcess:
+    """Resolved post-processing options of one query (hashable, part of the result cache key)."""
+    # Payload fields to return; None returns doc_id and chunk as before
+    fields: tuple[str, ...] | None = None
+    snippet: int = 0
+    collapse: bool = False
+    rerank: bool = False
+    # MMR lambda; None disables MMR
+    mmr: float | None = None
+
+    @property
+    def reorders(self) -> bool:
+        return self.collapse or self.rerank or self.mmr is not None
+
+    def fetch_limit(self, top_k: int) -> int:
+        """Number of candidates to request from Qdrant for ``top_k`` results."""
+        if not self.reorders:
+            return top_k
+        limit = top_k * max(1, POSTPROCESS_CANDIDATES_FACTOR)
+        return max(limit, RERANK_CANDIDATES) if self.rerank else limit
+
+    def with_payload(self):
+        """Payload selector for Qdrant: everything, or only the fields this query uses."""
+        if self.fields is None:
+            return True
+        needed = {"doc_id", *self.fields}
+        if self.rerank or self.snippet:
+            needed.update(("chunk", "content_hash"))
+        return sorted(needed)
+
+    def with_vector(self, vector_name: str | None = None):
+        """Vector selector for Qdrant; vectors are only fetched for MMR."""
+        if self.mmr is None:
+            return False
+        return [vector_name] if vector_name else True
+
+
+def resolve_postprocess(
+    fields: list[str] | None = None,
+    snippet: int | None = None,
+    collapse: bool | None = None,
+    mmr: bool | None = None,
+    mmr_lambda: float | None = None,
+    rerank: bool | None = None,
+) -> PostProcess:
+    """Per-query post-processing options with config defaults applied."""
+    use_mmr = MMR_ENABLED if mmr is None else mmr
+    return PostProcess(
+        fields=tuple(fields) if fields is not None else None,
+        snippet=SNIPPET_CHARS if snippet is None else snippet,
+        collapse=POSTPROCESS_COLLAPSE if collapse is None else collapse,
+        rerank=RERANK_ENABLED if rerank is None else rerank,
+        mmr=(MMR_LAMBDA if mmr_lambda is None else mmr_lambda) if use_mmr else None,
+    )
+
+
+class CrossEncoderReranker:
+    """Scores (query, chunk) pairs with a fastembed cross-encoder.
+
+    Pairs are scored in batches of ``batch_size``; scores are cached per
+    (query, chunk content hash), so repeated queries only score new chunks.
+    """
+
+    def __init__(self, model_name: str, batch_size: int = 32, cache_size: int = 10_000, cache_ttl: float = 0.0):
+        self.model_name = model_name
+        self.batch_size = max(1, batch_size)
+        self.cache = LRUCache(cache_size, cache_ttl)
+        self._model = None
+        self._lock = threading.Lock()
+
+    def _get_model(self):
+        if self._model is None:
+            with self._lock:
+                if self._model is None:
+                    from fastembed.rerank.cross_encoder import TextCrossEncoder
+                    self._model = TextCrossEncoder(model_name=self.model_name)
+        return self._model
+
+    def score_pairs(self, pairs: list[tuple[str, str, str]]) -> list[float]:
+        """Scores for (query, text, key) triples, scoring only uncached pairs in one pass."""
+        keys = [(normalize_query(query), key) for query, _, key in pairs]
+        scores = {k: self.cache.get(k) for k in keys}
+        missing = {k: (query, text) for k, (query, text, _) in zip(keys, pairs) if scores[k] is None}
+        if missing:
+            fresh = self._get_model().rerank_pairs(list(missing.values()), batch_size=self.batch_size)
+            for k, score in zip(missing, fresh):
+                scores[k] = float(score)
+                self.cache.put(k, scores[k])
+        return [scores[k] for k in keys]
+
+    def stats(self) -> dict:
+        return {"model": self.model_name, "loaded": self._model is not None, **self.cache.stats()}
+
+
+_reranker: CrossEncoderReranker | None = None
+_reranker_lock = threading.Lock()
+
+
+def get_reranker() -> CrossEncoderReranker:
+    global _reranker
+    if _reranker is None:
+        with _reranker_lock:
+            if _reranker is None:
+                _reranker = CrossEncoderReranker(
+                    RERANK_MODEL, batch_size=RERANK_BATCH_SIZE, cache_size=RERANK_CACHE_SIZE, cache_ttl=RERANK_CACHE_TTL
+                )
+    return _reranker
+
+
+def preload_reranker() -> None:
+    get_reranker()._get_model()
+
+
+def reranker_stats() -> dict:
+    return _reranker.stats() if _reranker is not None else {"enabled": RERANK_ENABLED, "loaded": False}
+
+
+def collapse_by_doc(hits: list) -> list:
+    """Keep the first (best) hit of every doc_id."""
+    seen, kept = set(), []
+    for hit in hits:
+        doc_id = (hit.payload or {}).get("doc_id")
+        if doc_id not in seen:
+            seen.add(doc_id)
+            kept.append(hit)
+    return kept
+
+
+def _hit_text(hit) -> str:
+    return str((hit.payload or {}).get("chunk", ""))
+
+
+def _hit_vector(hit, vector_name: str | None):
+    vector = hit.vector
+    if isinstance(vector, dict):
+        vector = vector.get(vector_name or "")
+    return vector
+
+
+def mmr_order(query_vector, vectors: list, k: int, lam: float, relevance=None) -> list[int]:
+    """Indices of ``k`` vectors picked greedily by maximal marginal relevance.
+
+    ``relevance`` defaults to the cosine similarity with ``query_vector``.
+    """
+    import numpy as np
+    docs = np.asarray(vectors, dtype=np.float32)
+    docs = docs / np.maximum(np.linalg.norm(docs, axis=1, keepdims=True), 1e-12)
+    if relevance is None:
+        query = np.asarray(query_vector, dtype=np.float32)
+        relevance = docs @ (query / max(float(np.linalg.norm(query)), 1e-12))
+    relevance = np.asarray(relevance, dtype=np.float32)
+    similarity = docs @ docs.T
+    redundancy = np.zeros(len(docs), dtype=np.float32)
+    available = np.ones(len(docs), dtype=bool)
+    order: list[int] = []
+    for _ in range(min(k, len(docs))):
+        scores = np.where(available, lam * relevance - (1.0 - lam) * redundancy, -np.inf)
+        best = int(np.argmax(scores))
+        order.append(best)
+        available[best] = False
+        redundancy = similarity[best] if len(order) == 1 else np.maximum(redundancy, similarity[best])
+    return order
+
+
+def make_snippet(text: str, query: str, size: int) -> str:
+    """At most ``size`` characters of ``text`` around the first query term it contains."""
+    if len(text) <= size:
+        return text
+    lowered = text.lower()
+    found = [p for p in (lowered.find(term) for term in query.lower().split() if len(term) > 2) if p >= 0]
+    start = max(0, min(min(found, default=0) - size // 4, len(text) - size))
+    end = start + size
+    return ("..." if start > 0 else "") + text[start:end] + ("..." if end < len(text) else "")
+
+
+def to_result(hit, post: PostProcess, rerank_score: float | None = None) -> SearchResult:
+    payload = hit.payload or {}
+    chunk = payload.get("chunk", "")
+    extra = None
+    if post.fields is not None:
+        if "chunk" not in post.fields:
+            chunk = None
+        extra = {name: payload[name] for name in post.fields if name not in ("doc_id", "chunk") and name in payload}
+    return SearchResult(
+        doc_id=str(payload.get("doc_id", "")),
+        chunk=str(chunk) if chunk is not None else None,
+        score=hit.score or 0.0,
+        payload=extra or None,
+        rerank_score=rerank_score,
+    )
+
+
+def apply_many(items: list[tuple]) -> list[list[SearchResult]]:
+    """Post-process several queries' hits; reranking is one batched pass over all of them.
+
+    ``items`` holds (query, query_vector, hits, top_k, post, vector_name) tuples.
+    """
+    candidates = []
+    for query, vector, hits, top_k, post, vector_name in items:
+        hits = list(hits)
+        if post.collapse:
+            with stage("collapse"):
+                hits = collapse_by_doc(hits)
+        candidates.append([hits, None])
+
+    reranked = [i for i, item in enumerate(items) if item[4].rerank and candidates[i][0]]
+    if reranked:
+        with stage("rerank"):
+            pairs = [
+                (items[i][0], _hit_text(hit), str((hit.payload or {}).get("content_hash") or _hit_text(hit)))
+                for i in reranked for hit in candidates[i][0]
+            ]
+            scores = iter(get_reranker().score_pairs(pairs))
+            for i in reranked:
+                scored = sorted(((next(scores), hit) for hit in candidates[i][0]), key=lambda s: s[0], reverse=True)
+                candidates[i] = [[hit for _, hit in scored], [score for score, _ in scored]]
+
+    results = []
+    for (query, vector, _, top_k, post, vector_name), (hits, scores) in zip(items, candidates):
+        if post.mmr is not None and len(hits) > 1:
+            vectors = [_hit_vector(hit, vector_name) for hit in hits]
+            if any(v is None for v in vectors):
+                logger.warning("Qdrant returned no vectors for MMR; keeping the original order.")
+            else:
+                with stage("mmr"):
+                    relevance = None
+                    if scores is not None:
+                        # Cross-encoder scores are logits; squash them to (0, 1) like cosine relevance
+                        import numpy as np
+                        relevance = 1.0 / (1.0 + np.exp(-np.asarray(scores, dtype=np.float32)))
+                    order = mmr_order(vector, vectors, top_k, post.mmr, relevance)
+                    hits = [hits[j] for j in order]
+                    scores = [scores[j] for j in order] if scores is not None else None
+        hits = hits[:top_k]
+        with stage("convert"):
+            out = [to_result(hit, post, scores[j] if scores is not None else None) for j, hit in enumerate(hits)]
+        if post.snippet:
+            with stage("snippet"):
+                for result in out:
+                    if result.chunk:
+                        result.chunk = make_snippet(result.chunk, query, post.snippet)
+        results.append(out)
+    return results
+
+
+def apply(query: str, query_vector, hits, top_k: int, post: PostProcess, vector_name: str | None = None) -> list[SearchResult]:
+    """Post-process the hits of one query."""
+    return apply_many([(query, query_vector, hits, top_k, post, vector_name)])[0]
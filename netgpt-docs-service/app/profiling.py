@@ -0,0 +1,67 @@
+"""Sampled cProfile capture for slow requests.
+
+A fraction (PROFILE_SAMPLE_RATE) of requests run under cProfile. If such a
+request takes longer than PROFILE_SLOW_MS, its profile is written to
+PROFILE_DIR as a ``.prof`` file (open it with ``python -m pstats`` or
+snakeviz), and the top functions are logged. Only one request is profiled at
+a time, because cProfile cannot be nested. The profile covers the event-loop
+thread, so concurrent requests on that loop can show up in it too.
+"""
+from __future__ import annotations
+
+import cProfile
+import io
+import logging
+import pstats
+import random
+import re
+import threading
+import time
+from pathlib import Path
+
+logger = logging.getLogger("docservice")
+
+_active = threading.Lock()
+
+
+class SlowRequestProfiler:
+    def __init__(self, slow_ms: float, sample_rate: float, out_dir: str):
+        self.slow_s = slow_ms / 1000.0
+        self.sample_rate = sample_rate
+        self.out_dir = Path(out_dir)
+
+    @property
+    def enabled(self) -> bool:
+        return self.slow_s > 0 and self.sample_rate > 0
+
+    def start(self) -> cProfile.Profile | None:
+        """Begin profiling this request if it is sampled and no profile is running."""
+        if not self.enabled or random.random() >= self.sample_rate:
+            return None
+        if not _active.acquire(blocking=False):
+            return None
+        profile = cProfile.Profile()
+        try:
+            profile.enable()
+        except ValueError:
+            # Another profiler (e.g. a debugger) is already active
+            _active.release()
+            return None
+        return profile
+
+    def finish(self, profile: cProfile.Profile | None, label: str, elapsed_s: float) -> None:
+        if profile is None:
+            return
+        try:
+            profile.disable()
+            if elapsed_s < self.slow_s:
+                return
+            self.out_dir.mkdir(parents=True, exist_ok=True)
+            name = re.sub(r"[^A-Za-z0-9_.-]+", "_", label).strip("_") or "request"
+            path = self.out_dir / f"{time.strftime('%Y%m%d-%H%M%S')}-{name}-{int(elapsed_s * 1000)}ms.prof"
+            profile.dump_stats(path)
+            summary = io.StringIO()
+            pstats.Stats(profile, stream=summary).sort_stats("cumulative").print_stats(15)
+            logger.warning("Slow request %s took %.0f ms; profile saved to %s\n%s", label, elapsed_s * 1000, path, summary.getvalue())
+        finally:
+            _active.release()
@@ -0,0 +1,128 @@
+"""Process-wide cache of Qdrant collection metadata.
+
+Checking whether a collection exists before every ingest costs a Qdrant
+round-trip per document. The registry remembers collections known to exist,
+together with their vector size and distance. The admin create and delete
+paths update it directly. Entries expire after ``ttl_seconds`` (0 = never) so
+that changes made outside this process are eventually picked up. Only
+positive results are cached; a missing collection is re-checked on the next
+call, because it may be created at any time. A collection deleted outside
+this process is dropped as soon as Qdrant answers a search or upload with
+"not found" (see ``is_not_found``), instead of waiting for the TTL.
+"""
+from __future__ import annotations
+
+import threading
+import time
+from dataclasses import dataclass, field
+
+
+@dataclass
+class CollectionInfo:
+    name: str
+    size: int | None = None
+    distance: str | None = None
+    # Name of the dense vector (None for a single unnamed vector)
+    vector_name: str | None = None
+    # Name of the sparse vector used for hybrid search, if any
+    sparse_name: str | None = None
+    # Embedding model/variant recorded in the collection metadata at creation
+    # (None for collections created before it was recorded)
+    embedding_model: str | None = None
+    embedding_variant: str | None = None
+    cached_at: float = field(default_factory=time.monotonic)
+
+    def as_dict(self) -> dict:
+        return {
+            "size": self.size,
+            "distance": self.distance,
+            "vector_name": self.vector_name,
+            "sparse_name": self.sparse_name,
+            "embedding_model": self.embedding_model,
+            "embedding_variant": self.embedding_variant,
+        }
+
+
+def info_from_response(name: str, response) -> CollectionInfo:
+    """Build a CollectionInfo from a qdrant-client ``get_collection`` response."""
+    params = response.config.params
+    vectors = params.vectors
+    vector_name = None
+    if isinstance(vectors, dict):
+        # Named vectors: use the unnamed/default entry if present, else the first
+        vector_name = "" if "" in vectors else next(iter(vectors), None)
+        vectors = vectors.get(vector_name) if vector_name is not None else None
+    sparse = getattr(params, "sparse_vectors", None) or {}
+    size = getattr(vectors, "size", None)
+    distance = getattr(vectors, "distance", None)
+    metadata = getattr(response.config, "metadata", None) or {}
+    return CollectionInfo(
+        name=name,
+        size=int(size) if size is not None else None,
+        distance=getattr(distance, "value", None) or (str(distance) if distance is not None else None),
+        vector_name=vector_name or None,
+        sparse_name=next(iter(sparse), None),
+        embedding_model=metadata.get("embedding_model"),
+        embedding_variant=metadata.get("embedding_variant"),
+    )
+
+
+def is_not_found(exc: BaseException) -> bool:
+    """True if Qdrant answered that the collection does not exist (REST 404 or gRPC NOT_FOUND)."""
+    seen = set()
+    while exc is not None and id(exc) not in seen:
+        seen.add(id(exc))
+        if getattr(exc, "status_code", None) == 404:
+            return True
+        code = getattr(exc, "code", None)
+        if callable(code) and getattr(code(), "name", "") == "NOT_FOUND":
+            return True
+        exc = exc.__cause__ or exc.__context__
+    return False
+
+
+class CollectionRegistry:
+    def __init__(self, ttl_seconds: float = 0.0):
+        self.ttl = float(ttl_seconds)
+        self._entries: dict[str, CollectionInfo] = {}
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def __contains__(self, name: str) -> bool:
+        """Whether ``name`` has an entry; unlike ``get`` this counts no hit or miss."""
+        with self._lock:
+            return name in self._entries
+
+    def get(self, name: str) -> CollectionInfo | None:
+        with self._lock:
+            info = self._entries.get(name)
+            if info is not None and self.ttl > 0 and time.monotonic() - info.cached_at > self.ttl:
+                del self._entries[name]
+                info = None
+            if info is None:
+                self.misses += 1
+            else:
+                self.hits += 1
+            return info
+
+    def put(self, info: CollectionInfo) -> CollectionInfo:
+        with self._lock:
+            self._entries[info.name] = info
+        return info
+
+    def invalidate(self, name: str) -> None:
+        with self._lock:
+            self._entries.pop(name, None)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+
+    def snapshot(self) -> dict[str, dict]:
+        with self._lock:
+            return {name: info.as_dict() for name, info in self._entries.items()}
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {"entries": len(self._entries), "hits": self.hits, "misses": self.misses, "ttl_seconds": self.ttl}
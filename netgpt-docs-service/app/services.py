@@ -1,155 +1,638 @@
+import functools
+import hashlib
+import inspect
 import logging
-from chonkie import RecursiveChunker
+import threading
+import uuid
+from contextlib import contextmanager
+from dataclasses import dataclass, field
 # Heavy native libs are imported lazily inside initializer functions below
 VectorParams = None
 Distance = None
 PointStruct = None
 # Resilient imports so the package can be executed as a module or as a script
 try:
-    from app.config import QDRANT_URL, QDRANT_API_KEY, COLLECTION_NAME, CHUNK_SIZE, EMBEDDING_MODEL
+    from app.config import QDRANT_URL, QDRANT_API_KEY, COLLECTION_NAME, EMBEDDING_MODEL
+    from app.config import EMBED_BATCHING, EMBED_BATCH_MAX_SIZE, EMBED_BATCH_MAX_WAIT_MS
+    from app.config import QUERY_CACHE_SIZE, QUERY_CACHE_TTL, RESULT_CACHE_SIZE, RESULT_CACHE_TTL
+    from app.config import EMBED_POOL_WORKERS, EMBED_POOL_THREADS, EMBED_POOL_SUB_BATCH
+    from app.config import EMBED_STORE_PATH, EMBED_STORE_DTYPE, EMBED_STORE_MAX_ENTRIES
+    from app.config import COLLECTION_CACHE_TTL
+    from app.config import HYBRID_SEARCH, SPARSE_MODEL, DENSE_VECTOR_NAME, SPARSE_VECTOR_NAME
+    from app.config import HYBRID_PREFETCH_LIMIT, HYBRID_FUSION
+    from app.config import VECTORS_ON_DISK, QUANTIZATION, QUANTIZATION_ALWAYS_RAM, PQ_COMPRESSION
+    from app.config import HNSW_M, HNSW_EF_CONSTRUCT, PAYLOAD_INDEX_DOC_ID, VECTOR_DATATYPE, EMBEDDING_DIM
+    from app.config import SEARCH_HNSW_EF, QUANTIZATION_OVERSAMPLING, QUANTIZATION_RESCORE
+    from app.config import QDRANT_PREFER_GRPC, QDRANT_GRPC_PORT, QDRANT_POOL_CONNECTIONS, QDRANT_KEEPALIVE_SECONDS
+    from app.config import QDRANT_TIMEOUT, QDRANT_SEARCH_TIMEOUT, QDRANT_CLIENT_POOL_SIZE, QDRANT_CONNECT_RETRIES
 except ImportError:
-    from config import QDRANT_URL, QDRANT_API_KEY, COLLECTION_NAME, CHUNK_SIZE, EMBEDDING_MODEL
+    from config import QDRANT_URL, QDRANT_API_KEY, COLLECTION_NAME, EMBEDDING_MODEL
+    from config import EMBED_BATCHING, EMBED_BATCH_MAX_SIZE, EMBED_BATCH_MAX_WAIT_MS
+    from config import QUERY_CACHE_SIZE, QUERY_CACHE_TTL, RESULT_CACHE_SIZE, RESULT_CACHE_TTL
+    from config import EMBED_POOL_WORKERS, EMBED_POOL_THREADS, EMBED_POOL_SUB_BATCH
+    from config import EMBED_STORE_PATH, EMBED_STORE_DTYPE, EMBED_STORE_MAX_ENTRIES
+    from config import COLLECTION_CACHE_TTL
+    from config import HYBRID_SEARCH, SPARSE_MODEL, DENSE_VECTOR_NAME, SPARSE_VECTOR_NAME
+    from config import HYBRID_PREFETCH_LIMIT, HYBRID_FUSION
+    from config import VECTORS_ON_DISK, QUANTIZATION, QUANTIZATION_ALWAYS_RAM, PQ_COMPRESSION
+    from config import HNSW_M, HNSW_EF_CONSTRUCT, PAYLOAD_INDEX_DOC_ID, VECTOR_DATATYPE, EMBEDDING_DIM
+    from config import SEARCH_HNSW_EF, QUANTIZATION_OVERSAMPLING, QUANTIZATION_RESCORE
+    from config import QDRANT_PREFER_GRPC, QDRANT_GRPC_PORT, QDRANT_POOL_CONNECTIONS, QDRANT_KEEPALIVE_SECONDS
+    from config import QDRANT_TIMEOUT, QDRANT_SEARCH_TIMEOUT, QDRANT_CLIENT_POOL_SIZE, QDRANT_CONNECT_RETRIES
 
 try:
-    from app.models import SearchResult
+    from app.models import SearchResult, IngestResult, QueryIn, CollectionOptions
+    from app.batching import EmbeddingBatcher
+    from app.cache import LRUCache, normalize_query
+    from app.registry import CollectionInfo, CollectionRegistry, info_from_response, is_not_found
+    from app.timing import stage, bind_collection
+    from app.chunking import chunk_document
+    from app.upload import upload_plan
+    from app import embedding_model
+    from app import postprocess
+    from app.postprocess import PostProcess, resolve_postprocess
+    from app import metrics
 except ImportError:
-    from models import SearchResult
+    from models import SearchResult, IngestResult, QueryIn, CollectionOptions
+    from batching import EmbeddingBatcher
+    from cache import LRUCache, normalize_query
+    from registry import CollectionInfo, CollectionRegistry, info_from_response, is_not_found
+    from timing import stage, bind_collection
+    from chunking import chunk_document
+    from upload import upload_plan
+    import embedding_model
+    import postprocess
+    from postprocess import PostProcess, resolve_postprocess
+    import metrics
 
 logger = logging.getLogger("docservice")
 logging.basicConfig(level=logging.INFO)
 
 # Lazy-initialized clients to avoid importing heavy native libs at module import
 _client = None
+# Sync client pool and the client assigned to each thread
+_clients: list = []
+_clients_lock = threading.Lock()
+_next_client = 0
+_thread_clients = threading.local()
+# Clients whose transport gives up after QDRANT_SEARCH_TIMEOUT, used for searches
+_search_clients: list = []
+# Set once the startup connectivity check has passed; later clients skip it
+_connected = False
 _embedder = None
+_sparse_embedder = None
+_batcher = None
+_embed_pool = None
+_embedding_store = None
+# Output dimension of the in-process embedder, learned from the first call
+_embedding_dim = None
 
-def get_client():
-    global _client
-    if _client is None:
-        # import qdrant_client when first needed
-        from qdrant_client import QdrantClient
-        from qdrant_client.models import VectorParams as _VectorParams, Distance as _Distance, PointStruct as _PointStruct
-        # expose model classes locally for use in setup_collection
-        globals()["VectorParams"] = _VectorParams
-        globals()["Distance"] = _Distance
-        globals()["PointStruct"] = _PointStruct
-
-        # QdrantClient will accept api_key for cloud; pass it if present.
-        kwargs = {}
-        if QDRANT_API_KEY:
-            kwargs["api_key"] = QDRANT_API_KEY
-        # Create the client, with compatibility for older qdrant-client signatures
+# Query-vector cache keyed by (model, normalized query) and an optional result
+# cache keyed by (collection, model, top_k, normalized query). The result cache
+# is invalidated per collection whenever that collection changes.
+_query_vector_cache = LRUCache(QUERY_CACHE_SIZE, QUERY_CACHE_TTL)
+_result_cache = LRUCache(RESULT_CACHE_SIZE, RESULT_CACHE_TTL)
+# Bumped on every invalidation of a collection's results. A query reads it
+# before searching and caches its results only if it has not changed, so a
+# search that overlapped an ingest cannot store pre-ingest results.
+_cache_generations: dict[str, int] = {}
+_cache_generations_lock = threading.Lock()
+# Known collections with their vector size/distance (saves a round-trip per ingest)
+_collections = CollectionRegistry(COLLECTION_CACHE_TTL)
+# Collections already warned about being built with another model variant
+_variant_warned: set[str] = set()
+
+def qdrant_client_kwargs(timeout: int = QDRANT_TIMEOUT) -> dict:
+    """Transport settings shared by the sync and async Qdrant clients."""
+    kwargs = {"timeout": timeout}
+    if QDRANT_API_KEY:
+        kwargs["api_key"] = QDRANT_API_KEY
+    if QDRANT_PREFER_GRPC:
+        kwargs["prefer_grpc"] = True
+        kwargs["grpc_port"] = QDRANT_GRPC_PORT
+    try:
+        import httpx
+        # Passed through to the REST transport's httpx client
+        kwargs["limits"] = httpx.Limits(
+            max_connections=QDRANT_POOL_CONNECTIONS,
+            max_keepalive_connections=QDRANT_POOL_CONNECTIONS,
+            keepalive_expiry=QDRANT_KEEPALIVE_SECONDS,
+        )
+    except ImportError:
+        pass
+    return kwargs
+
+class _SerializedClient:
+    """Runs one call at a time on a wrapped client.
+
+    qdrant-client's local mode is not thread-safe: concurrent ingests, upload
+    slices and queries would read and resize the same in-memory arrays.
+    """
+
+    def __init__(self, client):
+        self._wrapped = client
+        self._lock = threading.RLock()
+
+    def __getattr__(self, name):
+        attr = getattr(self._wrapped, name)
+        if not callable(attr):
+            return attr
+
+        @functools.wraps(attr)
+        def call(*args, **kwargs):
+            with self._lock:
+                return attr(*args, **kwargs)
+        return call
+
+def _new_client(timeout: int = QDRANT_TIMEOUT):
+    from qdrant_client import QdrantClient
+    if QDRANT_URL == ":memory:":
+        # qdrant-client local mode (benchmarks, offline experiments)
+        return _SerializedClient(QdrantClient(location=QDRANT_URL))
+    # Create the client, with compatibility for older qdrant-client signatures
+    try:
+        client = QdrantClient(url=QDRANT_URL, **qdrant_client_kwargs(timeout))
+    except TypeError:
+        # Older client versions may not accept api_key or url keyword; try url-only
+        client = QdrantClient(QDRANT_URL)
+    return client
+
+def _connect():
+    """Create a client, checking connectivity (with retries) only for the process's first one."""
+    global _connected
+    client = _new_client()
+    if not _connected and QDRANT_URL != ":memory:":
+        _check_connectivity(client)
+        _connected = True
+    return client
+
+def _check_connectivity(client) -> None:
+    """Quick connectivity check: request collections to ensure the host is reachable.
+
+    This can be skipped by setting QDRANT_SKIP_CONNECT_CHECK=1 in the environment.
+    """
+    import time
+    import os
+    try:
+        from qdrant_client.http.exceptions import ResponseHandlingException
+    except Exception:
+        ResponseHandlingException = Exception
+
+    if os.getenv("QDRANT_SKIP_CONNECT_CHECK", "0") == "1":
+        logger.info("Skipping Qdrant connectivity check because QDRANT_SKIP_CONNECT_CHECK=1")
+        return
+    # Retry a few times with backoff to handle transient network issues.
+    max_retries = QDRANT_CONNECT_RETRIES
+    delay = 1.0
+    last_exc = None
+    for attempt in range(1, max_retries + 1):
         try:
-            _client = QdrantClient(url=QDRANT_URL, **kwargs)
-        except TypeError:
-            # Older client versions may not accept api_key or url keyword; try url-only
-            _client = QdrantClient(QDRANT_URL)
-
-        # Quick connectivity check: request collections to ensure the host is reachable.
-            # Quick connectivity check: request collections to ensure the host is reachable.
-            # This can be skipped by setting QDRANT_SKIP_CONNECT_CHECK=1 in the environment
-            import time
-            import os
-            try:
-                from qdrant_client.http.exceptions import ResponseHandlingException
-            except Exception:
-                ResponseHandlingException = Exception
-
-            if os.getenv("QDRANT_SKIP_CONNECT_CHECK", "0") == "1":
-                logger.info("Skipping Qdrant connectivity check because QDRANT_SKIP_CONNECT_CHECK=1")
+            # Use a lightweight endpoint to validate the connection
+            if getattr(client, "get_collections", None):
+                client.get_collections()
+            else:
+                # Older clients may expose collections differently; try a simple call
+                client._client.request("GET", "/collections")
+            # If we reach here, the client is reachable
+            return
+        except Exception as e:
+            last_exc = e
+            logger.warning("Attempt %d: failed to contact Qdrant at %s: %s", attempt, QDRANT_URL, e)
+            if attempt < max_retries:
+                time.sleep(delay)
+                delay *= 2
             else:
-                # Retry a few times with backoff to handle transient network issues.
-                max_retries = 3
-                delay = 1.0
-                last_exc = None
-                for attempt in range(1, max_retries + 1):
-                    try:
-                        # Use a lightweight endpoint to validate the connection
-                        if getattr(_client, "get_collections", None):
-                            _client.get_collections()
-                        else:
-                            # Older clients may expose collections differently; try a simple call
-                            _client._client.request("GET", "/collections")
-                        # If we reach here, the client is reachable
-                        break
-                    except Exception as e:
-                        last_exc = e
-                        logger.warning("Attempt %d: failed to contact Qdrant at %s: %s", attempt, QDRANT_URL, e)
-                        if attempt < max_retries:
-                            time.sleep(delay)
-                            delay *= 2
-                        else:
-                            # Raise a clear error indicating the target and hint possible causes
-                            msg = (
-                                f"Failed to connect to Qdrant at {QDRANT_URL} after {max_retries} attempts. "
-                                "Check network connectivity, DNS, firewall, and that Qdrant is running and accessible from this host."
-                            )
-                            logger.exception(msg)
-                            # Re-raise a ResponseHandlingException for callers expecting qdrant-client exceptions
-                            raise ResponseHandlingException(last_exc)
-    return _client
+                # Raise a clear error indicating the target and hint possible causes
+                msg = (
+                    f"Failed to connect to Qdrant at {QDRANT_URL} after {max_retries} attempts. "
+                    "Check network connectivity, DNS, firewall, and that Qdrant is running and accessible from this host."
+                )
+                logger.exception(msg)
+                # Re-raise a ResponseHandlingException for callers expecting qdrant-client exceptions
+                raise ResponseHandlingException(last_exc)
+
+class QdrantTimeout(TimeoutError):
+    """A Qdrant call did not finish within its deadline."""
+
+
+def is_timeout(exc: BaseException) -> bool:
+    """True for client-side timeouts from httpx, gRPC or asyncio, however wrapped."""
+    seen = set()
+    while exc is not None and id(exc) not in seen:
+        seen.add(id(exc))
+        if isinstance(exc, TimeoutError) or type(exc).__name__ in ("ReadTimeout", "WriteTimeout", "PoolTimeout", "ConnectTimeout"):
+            return True
+        code = getattr(exc, "code", None)
+        if callable(code) and getattr(code(), "name", "") == "DEADLINE_EXCEEDED":
+            return True
+        # ResponseHandlingException keeps the transport error in .source
+        exc = getattr(exc, "source", None) or exc.__cause__ or exc.__context__
+    return False
+
+
+def qdrant_search(fn, **kwargs):
+    """Call a Qdrant search method with QDRANT_SEARCH_TIMEOUT; raise QdrantTimeout on expiry."""
+    try:
+        with forget_if_missing(kwargs["collection_name"]):
+            return fn(timeout=QDRANT_SEARCH_TIMEOUT, **kwargs)
+    except Exception as e:
+        if is_timeout(e):
+            raise QdrantTimeout(f"Qdrant did not answer the search within {QDRANT_SEARCH_TIMEOUT}s.") from e
+        raise
+
+
+@contextmanager
+def forget_if_missing(collection_name: str, registry: CollectionRegistry | None = None):
+    """Drop cached info and results of a collection Qdrant reports as not found.
+
+    The collection was deleted outside this process; without this the
+    registry would keep serving its stale entry until COLLECTION_CACHE_TTL.
+    """
+    try:
+        yield
+    except Exception as e:
+        if is_not_found(e):
+            logger.warning("Collection '%s' no longer exists in Qdrant; dropping cached info", collection_name)
+            (registry if registry is not None else _collections).invalidate(collection_name)
+            invalidate_collection_cache(collection_name)
+        raise
+
+
+def get_client():
+    """Return a sync Qdrant client for the calling thread.
+
+    QDRANT_CLIENT_POOL_SIZE clients are created on first use and assigned to
+    threads round-robin, so handler threads do not all share one connection
+    pool or gRPC channel. Local ``:memory:`` mode always uses one client.
+    """
+    client = getattr(_thread_clients, "client", None)
+    if client is not None:
+        return client
+    global _client, _next_client
+    # The connectivity check may back off for seconds; run it before taking the lock
+    first = _connect() if not _clients else None
+    with _clients_lock:
+        if not _clients:
+            # expose model classes locally for use in setup_collection
+            from qdrant_client.models import VectorParams as _VectorParams, Distance as _Distance, PointStruct as _PointStruct
+            globals()["VectorParams"] = _VectorParams
+            globals()["Distance"] = _Distance
+            globals()["PointStruct"] = _PointStruct
+            size = 1 if QDRANT_URL == ":memory:" else max(1, QDRANT_CLIENT_POOL_SIZE)
+            _clients.append(first or _new_client())
+            _clients.extend(_new_client() for _ in range(size - 1))
+            _client = _clients[0]
+        elif first is not None:
+            # Another thread filled the pool meanwhile
+            first.close()
+        client = _clients[_next_client % len(_clients)]
+        _next_client += 1
+    _thread_clients.client = client
+    return client
+
+def get_search_client():
+    """Return the calling thread's client for searches.
+
+    The server-side ``timeout`` of a search does not stop the REST client
+    from waiting QDRANT_TIMEOUT on a slow or unresponsive node, so searches
+    use a second pool whose transport times out after QDRANT_SEARCH_TIMEOUT.
+    """
+    if QDRANT_URL == ":memory:" or QDRANT_SEARCH_TIMEOUT >= QDRANT_TIMEOUT:
+        return get_client()
+    client = getattr(_thread_clients, "search_client", None)
+    if client is not None:
+        return client
+    get_client()  # exposes the model classes and checks connectivity once
+    global _next_client
+    with _clients_lock:
+        if not _search_clients:
+            _search_clients.extend(_new_client(QDRANT_SEARCH_TIMEOUT) for _ in range(max(1, QDRANT_CLIENT_POOL_SIZE)))
+        client = _search_clients[_next_client % len(_search_clients)]
+        _next_client += 1
+    _thread_clients.search_client = client
+    return client
 
 def get_embedder():
     global _embedder
     if _embedder is None:
-        # import fastembed (and underlying native libs) when first needed
-        from fastembed import TextEmbedding
-        _embedder = TextEmbedding(model=EMBEDDING_MODEL)
+        # imports fastembed (and underlying native libs) when first needed
+        _embedder = embedding_model.load_text_embedding()
     return _embedder
 
-def setup_collection(collection_name: str, dim: int):
+def get_sparse_embedder():
+    global _sparse_embedder
+    if _sparse_embedder is None:
+        from fastembed import SparseTextEmbedding
+        _sparse_embedder = SparseTextEmbedding(model_name=SPARSE_MODEL)
+    return _sparse_embedder
+
+def to_sparse_vector(embedding):
+    from qdrant_client import models as qmodels
+    return qmodels.SparseVector(indices=embedding.indices.tolist(), values=embedding.values.tolist())
+
+def embed_sparse(texts: list[str]) -> list:
+    """Sparse document vectors (BM25/SPLADE) for hybrid collections."""
+    with stage("embed_sparse"):
+        return [to_sparse_vector(e) for e in get_sparse_embedder().embed(texts)]
+
+def get_embed_pool():
+    """Return the multi-process embedding pool (EMBED_POOL_WORKERS > 0)."""
+    global _embed_pool
+    if _embed_pool is None:
+        try:
+            from app.embed_pool import EmbeddingProcessPool
+        except ImportError:
+            from embed_pool import EmbeddingProcessPool
+        _embed_pool = EmbeddingProcessPool(
+            embedding_model.model_signature(),
+            workers=EMBED_POOL_WORKERS,
+            threads=EMBED_POOL_THREADS,
+            sub_batch=EMBED_POOL_SUB_BATCH,
+        )
+    return _embed_pool
+
+def preload_embedder():
+    """Load the model now (in-process or on every pool worker) and learn its output dimension."""
+    if EMBED_POOL_WORKERS <= 0:
+        get_embedder()
+    return probe_embedding_dim()
+
+def _embed_direct(texts: list[str]) -> list:
+    """Embed texts in this process or, when configured, on the worker pool."""
+    if EMBED_POOL_WORKERS > 0:
+        return get_embed_pool().embed(texts)
+    return list(embedding_model.embed(get_embedder(), texts))
+
+def get_batcher():
+    """Return the shared embedding micro-batcher, creating it on first use."""
+    global _batcher
+    if _batcher is None:
+        _batcher = EmbeddingBatcher(
+            _embed_direct,
+            max_batch_size=EMBED_BATCH_MAX_SIZE,
+            max_wait_ms=EMBED_BATCH_MAX_WAIT_MS,
+        )
+    return _batcher
+
+def embed_texts(texts: list[str]) -> list:
+    """Embed texts, routing through the shared micro-batcher when enabled."""
+    if EMBED_BATCHING:
+        vectors = get_batcher().embed_many(texts)
+    else:
+        vectors = _embed_direct(texts)
+    remember_embedding_dim(vectors)
+    return vectors
+
+def remember_embedding_dim(vectors: list) -> None:
+    global _embedding_dim
+    if vectors and _embedding_dim is None:
+        _embedding_dim = int(vectors[0].shape[0])
+
+def get_embedding_store():
+    """Return the persistent chunk-embedding store, or None if not configured."""
+    global _embedding_store
+    if _embedding_store is None and EMBED_STORE_PATH:
+        try:
+            from app.embedding_store import EmbeddingStore
+        except ImportError:
+            from embedding_store import EmbeddingStore
+        _embedding_store = EmbeddingStore(
+            EMBED_STORE_PATH,
+            # Variants and truncated sizes produce different vectors, so each gets its own store
+            embedding_model.model_signature(),
+            dtype=EMBED_STORE_DTYPE,
+            max_entries=EMBED_STORE_MAX_ENTRIES,
+        )
+    return _embedding_store
+
+def embed_chunks(texts: list[str], digests: list[str]) -> list:
+    """Embed chunk texts, reusing vectors from the persistent store when possible."""
+    store = get_embedding_store()
+    if store is None:
+        with stage("embed"):
+            return embed_texts(texts)
+    with stage("embed_store_lookup"):
+        found = store.get_many(digests)
+    missing = [i for i, d in enumerate(digests) if d not in found]
+    if missing:
+        with stage("embed"):
+            fresh = embed_texts([texts[i] for i in missing])
+        with stage("embed_store_write"):
+            store.put_many([digests[i] for i in missing], fresh)
+        for i, vec in zip(missing, fresh):
+            found[digests[i]] = vec
+    return [found[d] for d in digests]
+
+def embedding_store_stats() -> dict:
+    store = get_embedding_store()
+    return store.stats() if store is not None else {"enabled": False}
+
+def embedding_batcher_stats() -> dict:
+    """Return micro-batcher metrics (empty counters when batching is disabled)."""
+    stats = {"enabled": EMBED_BATCHING}
+    if _batcher is not None:
+        stats.update(_batcher.stats())
+    return stats
+
+def embedding_dim() -> int | None:
+    """Output dimension of the embedder, if already known without embedding."""
+    if EMBEDDING_DIM > 0:
+        return EMBEDDING_DIM
+    if _embed_pool is not None and EMBED_POOL_WORKERS > 0:
+        return _embed_pool.known_dim
+    return _embedding_dim
+
+def probe_embedding_dim() -> int:
+    """Output dimension of the embedder, loading the model and embedding a probe text if needed."""
+    global _embedding_dim
+    dim = embedding_dim()
+    if dim is None:
+        if EMBED_POOL_WORKERS > 0:
+            return get_embed_pool().dim
+        dim = _embedding_dim = int(next(embedding_model.embed(get_embedder(), ["dimension probe"])).shape[0])
+    return dim
+
+def get_collection_registry() -> CollectionRegistry:
+    return _collections
+
+def _fetch_collection_info(collection_name: str) -> CollectionInfo | None:
     client = get_client()
     # Defensive check for existence of collection
     try:
-        if getattr(client, "collection_exists", None):
-            exists = client.collection_exists(collection_name)
-        else:
-            exists = collection_name in [c.name for c in client.get_collections().collections]
+        if getattr(client, "collection_exists", None) and not client.collection_exists(collection_name):
+            return None
+        return info_from_response(collection_name, client.get_collection(collection_name))
     except Exception:
-        exists = False
+        return None
 
-    if not exists:
-        logger.info(f"Creating Qdrant collection '{collection_name}' (dim={dim})")
-        client.create_collection(
-            collection_name=collection_name,
-            vectors_config=VectorParams(size=dim, distance=Distance.COSINE)
+def collection_info(collection_name: str) -> CollectionInfo | None:
+    """Cached existence, vector size and distance of a collection (None if missing)."""
+    info = _collections.get(collection_name)
+    if info is None:
+        with stage("collection_check"):
+            info = _fetch_collection_info(collection_name)
+        if info is not None:
+            _collections.put(info)
+    return info
+
+def collection_exists(collection_name: str) -> bool:
+    return collection_info(collection_name) is not None
+
+def check_dimension(info: CollectionInfo, dim: int | None) -> None:
+    """Raise ValueError if the collection's vector size differs from ``dim``."""
+    if info.size is not None and dim is not None and info.size != dim:
+        raise ValueError(
+            f"Collection '{info.name}' stores {info.size}-dimensional vectors but "
+            f"embedding model '{embedding_model.model_signature()}' produces {dim}-dimensional vectors."
+        )
+
+def check_embedder(info: CollectionInfo | None) -> None:
+    """Raise ValueError if the collection was built with another embedding model or size.
+
+    Another variant of the same model (e.g. its int8 ONNX file) is accepted
+    with a warning, since its vectors are close to but not equal to the originals.
+    """
+    if info is None:
+        return
+    if info.embedding_model and info.embedding_model != EMBEDDING_MODEL:
+        raise ValueError(
+            f"Collection '{info.name}' was built with embedding model '{info.embedding_model}', "
+            f"but this service embeds with '{EMBEDDING_MODEL}'."
+        )
+    if info.embedding_model and info.embedding_variant != embedding_model.variant() and info.name not in _variant_warned:
+        _variant_warned.add(info.name)
+        logger.warning(
+            "Collection '%s' was built with variant %s of '%s'; embedding with %s.",
+            info.name, info.embedding_variant or "default", EMBEDDING_MODEL, embedding_model.variant() or "default",
         )
+    check_dimension(info, probe_embedding_dim())
+
+def quantization_config(kind: str):
+    """Qdrant quantization config for "scalar", "binary" or "product" (None for off)."""
+    from qdrant_client import models as qmodels
+    kind = (kind or "none").lower()
+    if kind == "none":
+        return None
+    if kind == "scalar":
+        return qmodels.ScalarQuantization(scalar=qmodels.ScalarQuantizationConfig(
+            type=qmodels.ScalarType.INT8, quantile=0.99, always_ram=QUANTIZATION_ALWAYS_RAM,
+        ))
+    if kind == "binary":
+        return qmodels.BinaryQuantization(binary=qmodels.BinaryQuantizationConfig(always_ram=QUANTIZATION_ALWAYS_RAM))
+    if kind == "product":
+        return qmodels.ProductQuantization(product=qmodels.ProductQuantizationConfig(
+            compression=qmodels.CompressionRatio(PQ_COMPRESSION), always_ram=QUANTIZATION_ALWAYS_RAM,
+        ))
+    raise ValueError(f"Unknown quantization '{kind}'; expected scalar, binary, product or none.")
+
+def collection_schema(
+    collection_name: str, dim: int, distance=None, hybrid: bool | None = None, options: CollectionOptions | None = None
+) -> tuple[dict, CollectionInfo]:
+    """Return ``create_collection`` kwargs and the matching registry entry.
+
+    Hybrid collections store the dense embedding as a named vector next to a
+    sparse vector; BM25-style models get Qdrant's IDF modifier. Quantization,
+    on-disk storage and HNSW settings come from ``options`` or the config.
+    """
+    from qdrant_client import models as qmodels
+    options = options or CollectionOptions()
+    vec_distance = resolve_distance(distance)
+    on_disk = VECTORS_ON_DISK if options.on_disk is None else options.on_disk
+    datatype = (options.datatype or VECTOR_DATATYPE).lower()
+    dense = qmodels.VectorParams(
+        size=dim,
+        distance=vec_distance,
+        on_disk=on_disk or None,
+        datatype=qmodels.Datatype.FLOAT16 if datatype == "float16" else None,
+    )
+    info = CollectionInfo(
+        name=collection_name,
+        size=dim,
+        distance=vec_distance.value,
+        embedding_model=EMBEDDING_MODEL,
+        embedding_variant=embedding_model.variant(),
+    )
+    # Recorded so queries can refuse an embedder the collection was not built with
+    metadata = {"embedding_model": EMBEDDING_MODEL, "embedding_variant": embedding_model.variant(), "embedding_dim": dim}
+    kwargs = {"vectors_config": dense, "metadata": metadata}
+    quantization = quantization_config(options.quantization or QUANTIZATION)
+    if quantization is not None:
+        kwargs["quantization_config"] = quantization
+    m = HNSW_M if options.hnsw_m is None else options.hnsw_m
+    ef_construct = HNSW_EF_CONSTRUCT if options.hnsw_ef_construct is None else options.hnsw_ef_construct
+    if m is not None or ef_construct is not None:
+        kwargs["hnsw_config"] = qmodels.HnswConfigDiff(m=m, ef_construct=ef_construct)
+    if not (HYBRID_SEARCH if hybrid is None else hybrid):
+        return kwargs, info
+    modifier = qmodels.Modifier.IDF if any(name in SPARSE_MODEL.lower() for name in ("bm25", "bm42")) else None
+    info.vector_name, info.sparse_name = DENSE_VECTOR_NAME, SPARSE_VECTOR_NAME
+    kwargs["vectors_config"] = {DENSE_VECTOR_NAME: dense}
+    kwargs["sparse_vectors_config"] = {SPARSE_VECTOR_NAME: qmodels.SparseVectorParams(modifier=modifier)}
+    return kwargs, info
+
+def payload_indexes(options: CollectionOptions | None = None) -> list[tuple[str, object]]:
+    """(field, schema) pairs to index after creating a collection."""
+    from qdrant_client import models as qmodels
+    enabled = PAYLOAD_INDEX_DOC_ID if options is None or options.payload_index is None else options.payload_index
+    return [("doc_id", qmodels.PayloadSchemaType.KEYWORD)] if enabled else []
+
+def supports_collection_metadata(client) -> bool:
+    """True if the client's create_collection takes ``metadata`` (qdrant-client >= 1.16).
+
+    Older clients reject the unknown keyword; their collections are then
+    checked by vector size only.
+    """
+    try:
+        return "metadata" in inspect.signature(client.create_collection).parameters
+    except (TypeError, ValueError):
+        return False
+
+def create_collection(collection_name: str, dim: int, distance=None, hybrid: bool | None = None, options: CollectionOptions | None = None):
+    client = get_client()
+    kwargs, info = collection_schema(collection_name, dim, distance, hybrid, options)
+    if not supports_collection_metadata(client):
+        kwargs.pop("metadata")
+    client.create_collection(collection_name=collection_name, **kwargs)
+    for field_name, schema in payload_indexes(options):
+        client.create_payload_index(collection_name=collection_name, field_name=field_name, field_schema=schema)
+    return _collections.put(info)
+
+def setup_collection(collection_name: str, dim: int):
+    info = collection_info(collection_name)
+    if info is not None:
+        check_dimension(info, dim)
+        return
+    logger.info(f"Creating Qdrant collection '{collection_name}' (dim={dim}, hybrid={HYBRID_SEARCH})")
+    create_collection(collection_name, dim)
 
 
-def ensure_collection(collection_name: str, dim: int, distance=None):
+def resolve_distance(distance=None):
+    """Accept either a Distance enum or a string like "COSINE"/"EUCLID"."""
+    from qdrant_client.models import Distance
+    if distance is None:
+        return Distance.COSINE
+    if isinstance(distance, str):
+        try:
+            return getattr(Distance, distance)
+        except Exception:
+            return Distance.COSINE
+    return distance
+
+
+def ensure_collection(
+    collection_name: str, dim: int, distance=None, hybrid: bool | None = None, options: CollectionOptions | None = None
+):
     """Ensure a collection with given name exists; create if missing.
 
+    ``hybrid`` adds a sparse vector for hybrid search (default HYBRID_SEARCH)
+    and ``options`` overrides the configured storage and index settings.
     Returns True if created or already exists, False on failure.
     """
-    client = get_client()
-    try:
-        if getattr(client, "collection_exists", None):
-            if client.collection_exists(collection_name):
-                return True
-        # Fallback using get_collections
-        if getattr(client, "get_collections", None):
-            cols = client.get_collections().collections
-            if any(c.name == collection_name for c in cols):
-                return True
-    except Exception:
-        # continue to try creating
-        pass
+    if collection_exists(collection_name):
+        return True
 
     try:
-        # Accept either a Distance enum or a string like "COSINE"/"EUCLID"
-        if distance is None:
-            vec_distance = Distance.COSINE
-        else:
-            if isinstance(distance, str):
-                try:
-                    vec_distance = getattr(Distance, distance)
-                except Exception:
-                    vec_distance = Distance.COSINE
-            else:
-                vec_distance = distance
-        client.create_collection(
-            collection_name=collection_name,
-            vectors_config=VectorParams(size=dim, distance=vec_distance)
-        )
+        create_collection(collection_name, dim, distance, hybrid, options)
         return True
     except Exception as e:
         logger.exception("Failed to create collection: %s", e)
@@ -178,6 +661,92 @@ def delete_collection(collection_name: str):
     except Exception:
         logger.exception("Failed to delete collection %s", collection_name)
         return False
+    finally:
+        _collections.invalidate(collection_name)
+        invalidate_collection_cache(collection_name)
+
+
+def _cache_gauges():
+    """Scrape-time gauges for caches, the collection registry and the batcher."""
+    for cache_name, stats in (("query_vectors", _query_vector_cache.stats()), ("results", _result_cache.stats())):
+        for key in ("size", "hits", "misses", "evictions", "expirations", "invalidations"):
+            yield (f"docservice_cache_{key}", f"Query cache {key}.", {"cache": cache_name}, stats[key])
+    registry = _collections.stats()
+    for key in ("entries", "hits", "misses"):
+        yield (f"docservice_collection_registry_{key}", f"Collection registry {key}.", {}, registry[key])
+    if _batcher is not None:
+        batcher = _batcher.stats()
+        for key in ("queue_depth", "batches", "items", "errors", "avg_batch_size", "queue_wait_ms_p99"):
+            yield (f"docservice_embed_batcher_{key}", f"Embedding micro-batcher {key}.", {}, batcher[key])
+
+metrics.REGISTRY.register_collector(_cache_gauges)
+metrics.track_collections(lambda name: name in _collections)
+
+
+def invalidate_collection_cache(collection_name: str) -> int:
+    """Drop cached query results for a collection after it has changed."""
+    with _cache_generations_lock:
+        _cache_generations[collection_name] = _cache_generations.get(collection_name, 0) + 1
+        return _result_cache.invalidate_where(lambda key: key[0] == collection_name)
+
+
+def cache_generation(collection_name: str) -> int:
+    """Invalidation count of a collection; pass it to ``store_results``."""
+    return _cache_generations.get(collection_name, 0)
+
+
+def cache_stats() -> dict:
+    """Hit/miss/eviction counters for the query-vector and result caches."""
+    return {
+        "query_vectors": _query_vector_cache.stats(),
+        "results": _result_cache.stats(),
+        "collections": _collections.stats(),
+        "rerank": postprocess.reranker_stats(),
+    }
+
+
+def _lookup_query_vectors(model: str, queries: list[str]) -> tuple[list, dict]:
+    """Cache keys of the queries, and their cached vectors (None for a miss) by key."""
+    keys = [(model, normalize_query(q)) for q in queries]
+    vectors = {}
+    for key in keys:
+        if key not in vectors:
+            vectors[key] = _query_vector_cache.get(key)
+    return keys, vectors
+
+
+def _cache_query_vectors(vectors: dict, missing: list, fresh) -> None:
+    for key, vec in zip(missing, fresh):
+        vectors[key] = vec
+        _query_vector_cache.put(key, vec)
+
+
+def _cached_query_vectors(model: str, queries: list[str], stage_name: str, embed_fn) -> list:
+    """Look queries up in the query-vector cache and embed the misses in one call."""
+    keys, vectors = _lookup_query_vectors(model, queries)
+    missing = [key for key, vec in vectors.items() if vec is None]
+    if missing:
+        with stage(stage_name):
+            fresh = embed_fn([key[1] for key in missing])
+        _cache_query_vectors(vectors, missing, fresh)
+    return [vectors[key] for key in keys]
+
+
+def embed_queries(queries: list[str]) -> list:
+    """Embed query strings in one call, reusing cached vectors when available."""
+    return _cached_query_vectors(embedding_model.model_signature(), queries, "embed", embed_texts)
+
+
+def embed_sparse_queries(queries: list[str]) -> list:
+    """Sparse query vectors, cached like dense ones under the sparse model name."""
+    def embed(texts):
+        return [to_sparse_vector(e) for e in get_sparse_embedder().query_embed(texts)]
+    return _cached_query_vectors(SPARSE_MODEL, queries, "embed_sparse", embed)
+
+
+def embed_query(query: str):
+    """Embed a query string, reusing a cached vector when available."""
+    return embed_queries([query])[0]
 
 
 def get_raw_client():
@@ -185,60 +754,420 @@ def get_raw_client():
     qdrant-client API (admin, snapshots, cluster methods, etc.)."""
     return get_client()
 
-def ingest_document(doc_id: str, text: str, collection: str | None = None) -> int:
-    chunker = RecursiveChunker(chunk_size=CHUNK_SIZE, tokenizer="gpt2")
-    chunks = chunker(text)
-    texts = [chunk.text for chunk in chunks]
-    if not texts:
-        return 0
+# Namespace for deterministic point ids so re-ingesting identical content maps
+# onto the same Qdrant points instead of appending duplicates.
+_POINT_ID_NAMESPACE = uuid.UUID("6f1d7a52-3c1e-4f0b-9a57-0d6c2b1e8a44")
+
+def content_hash(text: str) -> str:
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+def chunk_point_id(doc_id: str, index: int, digest: str) -> str:
+    """Deterministic point id derived from (doc_id, chunk index, content hash)."""
+    return str(uuid.uuid5(_POINT_ID_NAMESPACE, f"{doc_id}:{index}:{digest}"))
+
+def _doc_filter(doc_id: str):
+    from qdrant_client import models as qmodels
+    return qmodels.Filter(must=[qmodels.FieldCondition(key="doc_id", match=qmodels.MatchValue(value=doc_id))])
+
+def existing_point_ids(collection_name: str, doc_id: str) -> set[str]:
+    """Return ids of all points stored for ``doc_id`` in the collection."""
+    client = get_client()
+    ids: set[str] = set()
+    offset = None
+    with stage("existing_ids"), forget_if_missing(collection_name):
+        while True:
+            points, offset = client.scroll(
+                collection_name=collection_name,
+                scroll_filter=_doc_filter(doc_id),
+                limit=1024,
+                offset=offset,
+                with_payload=False,
+                with_vectors=False,
+            )
+            ids.update(str(p.id) for p in points)
+            if offset is None:
+                return ids
+
+def delete_points(collection_name: str, point_ids) -> None:
+    from qdrant_client import models as qmodels
+    with stage("delete"):
+        get_client().delete(
+            collection_name=collection_name,
+            points_selector=qmodels.PointIdsList(points=list(point_ids)),
+        )
+
+@dataclass
+class IngestPlan:
+    """Intermediate state of one document moving through the ingest stages."""
+    doc_id: str
+    collection: str
+    texts: list[str]
+    digests: list[str] = field(default_factory=list)
+    ids: list[str] = field(default_factory=list)
+    # Indices of chunks that need embedding and upload
+    pending: list[int] = field(default_factory=list)
+    stale: set[str] = field(default_factory=set)
+    embeddings: list = field(default_factory=list)
+    # Vector names of the target collection; sparse_name is set for hybrid collections
+    vector_name: str | None = None
+    sparse_name: str | None = None
+    sparse_embeddings: list = field(default_factory=list)
 
-    embedder = get_embedder()
-    embeddings = list(embedder.embed(texts))
-    dim = embeddings[0].shape[0]
+    @classmethod
+    def build(cls, doc_id: str, collection: str, texts: list[str]) -> "IngestPlan":
+        digests = [content_hash(t) for t in texts]
+        ids = [chunk_point_id(doc_id, i, d) for i, d in enumerate(digests)]
+        return cls(doc_id=doc_id, collection=collection, texts=texts, digests=digests, ids=ids, pending=list(range(len(texts))))
+
+    def apply_schema(self, info: CollectionInfo | None) -> None:
+        """Take vector names from the collection, or the defaults for a new one."""
+        if info is not None:
+            self.vector_name, self.sparse_name = info.vector_name, info.sparse_name
+        elif HYBRID_SEARCH:
+            self.vector_name, self.sparse_name = DENSE_VECTOR_NAME, SPARSE_VECTOR_NAME
+
+    def mark_existing(self, existing: set[str]) -> None:
+        """Skip chunks whose point already exists and record stale points."""
+        self.pending = [i for i, pid in enumerate(self.ids) if pid not in existing]
+        self.stale = existing.difference(self.ids)
+
+    def upload_batches(self, batch_size: int):
+        """Yield (ids, vectors, payloads) slices of the embedded pending chunks.
+
+        Dense vectors are stacked into one float32 array per slice, keyed by
+        name for named vectors. Hybrid slices add the list of sparse vectors
+        under the sparse name, since sparse vectors have no array form.
+        """
+        import numpy as np
+        for start in range(0, len(self.pending), batch_size):
+            rows = self.pending[start:start + batch_size]
+            ids = [self.ids[i] for i in rows]
+            payloads = [
+                {"doc_id": self.doc_id, "chunk": self.texts[i], "chunk_index": i, "content_hash": self.digests[i]}
+                for i in rows
+            ]
+            dense = np.stack(self.embeddings[start:start + batch_size]).astype(np.float32, copy=False)
+            if self.sparse_name:
+                sparse = self.sparse_embeddings[start:start + batch_size]
+                vectors = {self.vector_name or "": dense, self.sparse_name: list(sparse)}
+            elif self.vector_name:
+                vectors = {self.vector_name: dense}
+            else:
+                vectors = dense
+            yield ids, vectors, payloads
+
+    def result(self) -> IngestResult:
+        return IngestResult(
+            doc_id=self.doc_id,
+            collection=self.collection,
+            chunks=len(self.texts),
+            new=len(self.pending) if self.texts else 0,
+            unchanged=len(self.texts) - len(self.pending),
+            deleted=len(self.stale),
+        )
+
+
+def resolve_collection(collection: str | None) -> str:
     # Determine target collection: request-level, then configured default, else raise
     target = collection or COLLECTION_NAME
     if not target:
         raise ValueError("No target collection provided; set COLLECTION_NAME or pass collection parameter.")
+    bind_collection(target)
+    return target
 
-    # Ensure the collection exists before uploading
-    setup_collection(target, dim)
 
-    payloads = []
-    vectors = []
-    for chunk, vector in zip(chunks, embeddings):
-        payloads.append({"doc_id": doc_id, "chunk": chunk.text})
-        vectors.append(vector.tolist())
+def chunk_text(text: str) -> list[str]:
+    with stage("chunk"):
+        return chunk_document(text)
 
-    client = get_client()
-    client.upload_collection(
-        collection_name=target,
-        vectors=vectors,
-        payload=payloads
+
+def prepare_ingest(doc_id: str, text: str, collection: str | None = None) -> IngestPlan:
+    """Chunk a document and work out which chunks are new or stale."""
+    target = resolve_collection(collection)
+    plan = IngestPlan.build(doc_id, target, chunk_text(text))
+    info = collection_info(target) if plan.texts else None
+    plan.apply_schema(info)
+    if info is not None:
+        # Fail before embedding anything if the collection cannot take our vectors
+        check_embedder(info)
+        try:
+            plan.mark_existing(existing_point_ids(target, doc_id))
+        except Exception as e:
+            if not is_not_found(e):
+                raise
+            # Deleted outside this service: commit_ingest creates it again
+            plan.apply_schema(None)
+    return plan
+
+
+def embed_ingest(plan: IngestPlan) -> IngestPlan:
+    """Embed the pending chunks of a plan."""
+    bind_collection(plan.collection)
+    if plan.pending:
+        plan.embeddings = embed_chunks(
+            [plan.texts[i] for i in plan.pending],
+            [plan.digests[i] for i in plan.pending],
+        )
+        if plan.sparse_name:
+            plan.sparse_embeddings = embed_sparse([plan.texts[i] for i in plan.pending])
+    return plan
+
+
+def record_ingest(plan: IngestPlan, result: IngestResult) -> None:
+    """Update ingest counters and log the outcome of one document."""
+    label = metrics.collection_label(result.collection)
+    metrics.INGEST_DOCUMENTS_TOTAL.inc(collection=label)
+    metrics.INGEST_CHUNKS_TOTAL.inc(result.new, collection=label, outcome="new")
+    metrics.INGEST_CHUNKS_TOTAL.inc(result.unchanged, collection=label, outcome="unchanged")
+    metrics.INGEST_CHUNKS_TOTAL.inc(result.deleted, collection=label, outcome="deleted")
+    metrics.INGEST_BYTES_TOTAL.inc(sum(len(t.encode("utf-8")) for t in plan.texts), collection=label)
+    logger.info(
+        f"Ingested document '{result.doc_id}' with {result.chunks} chunks "
+        f"(new={result.new}, unchanged={result.unchanged}, deleted={result.deleted})."
     )
 
-    logger.info(f"Ingested document '{doc_id}' with {len(chunks)} chunks.")
-    return len(chunks)
 
-def query_text(query: str, top_k: int = 5, collection: str | None = None):
-    embedder = get_embedder()
-    q_vec = next(embedder.embed([query]))
-    client = get_client()
-    target = collection or COLLECTION_NAME
-    if not target:
-        raise ValueError("No target collection provided; set COLLECTION_NAME or pass collection parameter.")
+def commit_ingest(plan: IngestPlan) -> IngestResult:
+    """Upload embedded chunks and delete stale points for the plan's doc_id."""
+    target = plan.collection
+    bind_collection(target)
+    if not plan.texts:
+        return plan.result()
+
+    if plan.pending:
+        dim = plan.embeddings[0].shape[0]
+        # Ensure the collection exists before uploading
+        setup_collection(target, dim)
+
+        with stage("upload"), forget_if_missing(target):
+            upload_plan(get_client(), plan)
+
+    if plan.stale:
+        delete_points(target, plan.stale)
 
-    hits = client.search(
-        collection_name=target,
-        query_vector=q_vec.tolist(),
-        limit=top_k
+    result = plan.result()
+    if result.new or result.deleted:
+        invalidate_collection_cache(target)
+    record_ingest(plan, result)
+    return result
+
+
+def ingest_document(doc_id: str, text: str, collection: str | None = None) -> IngestResult:
+    """Chunk, embed and upsert a document idempotently.
+
+    Chunks whose point id (derived from doc_id, index and content hash)
+    already exists are skipped without embedding; points for the doc_id that
+    are no longer produced by the chunker are deleted.
+    """
+    plan = prepare_ingest(doc_id, text, collection)
+    return commit_ingest(embed_ingest(plan))
+
+def result_cache_key(
+    query: str, top_k: int, target: str, hybrid: bool = False, search: tuple = (), post: PostProcess = PostProcess()
+) -> tuple:
+    return (target, embedding_model.model_signature(), top_k, hybrid, search, post, normalize_query(query))
+
+def cached_results(key: tuple) -> list[SearchResult] | None:
+    if not _result_cache.enabled:
+        return None
+    cached = _result_cache.get(key)
+    return list(cached) if cached is not None else None
+
+def store_results(key: tuple, results: list[SearchResult], generation: int) -> None:
+    """Cache results unless their collection was invalidated since ``generation`` was read."""
+    with _cache_generations_lock:
+        if _cache_generations.get(key[0], 0) == generation:
+            _result_cache.put(key, tuple(results))
+
+def use_hybrid(info: CollectionInfo | None, target: str, hybrid: bool | None) -> bool:
+    """Decide whether a query runs as dense + sparse fusion against ``target``."""
+    has_sparse = info is not None and info.sparse_name is not None
+    if hybrid and not has_sparse:
+        raise ValueError(f"Collection '{target}' has no sparse vectors; hybrid search is not available.")
+    return has_sparse if hybrid is None else hybrid
+
+def resolve_search(hnsw_ef: int | None = None, rescore: bool | None = None, oversampling: float | None = None) -> tuple:
+    """Per-query (hnsw_ef, rescore, oversampling) with config defaults applied."""
+    return (
+        hnsw_ef or SEARCH_HNSW_EF or None,
+        QUANTIZATION_RESCORE if rescore is None else rescore,
+        oversampling or QUANTIZATION_OVERSAMPLING or None,
     )
-    results = []
-    for hit in hits:
-        payload = hit.payload or {}
-        results.append(SearchResult(
-            doc_id=str(payload.get("doc_id", "")),
-            chunk=str(payload.get("chunk", "")),
-            score=hit.score or 0.0
-        ))
+
+def search_params(search: tuple):
+    """SearchParams for a tuple from ``resolve_search``; quantization settings
+    are ignored by Qdrant for collections that are not quantized."""
+    from qdrant_client import models as qmodels
+    hnsw_ef, rescore, oversampling = search or resolve_search()
+    return qmodels.SearchParams(
+        hnsw_ef=hnsw_ef,
+        quantization=qmodels.QuantizationSearchParams(rescore=rescore, oversampling=oversampling),
+    )
+
+def dense_request(
+    info: CollectionInfo | None, vector, top_k: int, search: tuple = (), post: PostProcess = PostProcess()
+):
+    """Nearest-neighbour request on the dense vector (named when the collection uses named vectors)."""
+    from qdrant_client import models as qmodels
+    vector_name = info.vector_name if info is not None else None
+    return qmodels.QueryRequest(
+        query=vector.tolist(),
+        using=vector_name,
+        limit=post.fetch_limit(top_k),
+        params=search_params(search),
+        with_payload=post.with_payload(),
+        with_vector=post.with_vector(vector_name),
+    )
+
+def hybrid_request(
+    info: CollectionInfo, vector, sparse_vector, top_k: int, search: tuple = (), post: PostProcess = PostProcess()
+):
+    """Prefetch dense and sparse candidates and fuse them server-side in one request."""
+    from qdrant_client import models as qmodels
+    fetch = post.fetch_limit(top_k)
+    limit = max(HYBRID_PREFETCH_LIMIT, fetch)
+    return qmodels.QueryRequest(
+        prefetch=[
+            qmodels.Prefetch(query=vector.tolist(), using=info.vector_name, limit=limit, params=search_params(search)),
+            qmodels.Prefetch(query=sparse_vector, using=info.sparse_name, limit=limit),
+        ],
+        query=qmodels.FusionQuery(fusion=qmodels.Fusion(HYBRID_FUSION.lower())),
+        limit=fetch,
+        with_payload=post.with_payload(),
+        with_vector=post.with_vector(info.vector_name),
+    )
+
+def query_text(
+    query: str,
+    top_k: int = 5,
+    collection: str | None = None,
+    hybrid: bool | None = None,
+    hnsw_ef: int | None = None,
+    rescore: bool | None = None,
+    oversampling: float | None = None,
+    post: PostProcess | None = None,
+):
+    """Search ``collection`` for ``query``; ``post`` selects the result post-processing."""
+    target = resolve_collection(collection)
+    info = collection_info(target)
+    check_embedder(info)
+    hybrid = use_hybrid(info, target, hybrid)
+    search = resolve_search(hnsw_ef, rescore, oversampling)
+    post = post or resolve_postprocess()
+
+    result_key = result_cache_key(query, top_k, target, hybrid, search, post)
+    cached = cached_results(result_key)
+    if cached is not None:
+        metrics.QUERIES_TOTAL.inc(collection=metrics.collection_label(target), cache="hit")
+        return cached
+
+    metrics.QUERIES_TOTAL.inc(collection=metrics.collection_label(target), cache="miss")
+    generation = cache_generation(target)
+    q_vec = embed_query(query)
+    client = get_search_client()
+    if hybrid:
+        request = hybrid_request(info, q_vec, embed_sparse_queries([query])[0], top_k, search, post)
+    else:
+        request = dense_request(info, q_vec, top_k, search, post)
+    with stage("search"):
+        hits = qdrant_search(client.query_batch_points, collection_name=target, requests=[request])[0].points
+    results = postprocess.apply(query, q_vec, hits, top_k, post, info.vector_name if info else None)
+    store_results(result_key, results, generation)
     logger.info(f"Query '{query}' returned {len(results)} hits.")
     return results
+
+
+@dataclass
+class BatchSlot:
+    """One query of a batch that was not answered from the result cache."""
+    index: int
+    query: str
+    top_k: int
+    collection: str
+    cache_key: tuple
+    info: CollectionInfo | None = None
+    hybrid: bool = False
+    search: tuple = ()
+    post: PostProcess = PostProcess()
+    vector: object = None
+    sparse_vector: object = None
+    generation: int = 0
+
+
+def plan_query_batch(
+    queries: list[QueryIn], infos: dict[str, CollectionInfo | None] | None = None
+) -> tuple[list, dict[str, list[BatchSlot]]]:
+    """Resolve cached results and group the remaining queries by collection.
+
+    Returns (results, pending) where ``results`` holds cached answers (None
+    for pending slots) and ``pending`` maps collection -> slots to search.
+    ``infos`` supplies collection metadata already looked up by the caller,
+    so the async path does no blocking Qdrant I/O here.
+    """
+    results: list = [None] * len(queries)
+    pending: dict[str, list[BatchSlot]] = {}
+    for i, q in enumerate(queries):
+        target = resolve_collection(q.collection)
+        info = infos[target] if infos is not None else collection_info(target)
+        check_embedder(info)
+        hybrid = use_hybrid(info, target, q.hybrid)
+        search = resolve_search(q.hnsw_ef, q.rescore, q.oversampling)
+        post = resolve_postprocess(q.fields, q.snippet, q.collapse, q.mmr, q.mmr_lambda, q.rerank)
+        key = result_cache_key(q.query, q.top_k, target, hybrid, search, post)
+        cached = cached_results(key)
+        if cached is not None:
+            metrics.QUERIES_TOTAL.inc(collection=metrics.collection_label(target), cache="hit")
+            results[i] = cached
+            continue
+        metrics.QUERIES_TOTAL.inc(collection=metrics.collection_label(target), cache="miss")
+        pending.setdefault(target, []).append(BatchSlot(
+            i, q.query, q.top_k, target, key, info, hybrid, search, post, generation=cache_generation(target)
+        ))
+    return results, pending
+
+
+def embed_query_batch(pending: dict[str, list[BatchSlot]]) -> None:
+    """Embed every pending query of a batch with a single embedding call."""
+    slots = [slot for group in pending.values() for slot in group]
+    for slot, vec in zip(slots, embed_queries([slot.query for slot in slots])):
+        slot.vector = vec
+    hybrid = [slot for slot in slots if slot.hybrid]
+    if hybrid:
+        for slot, vec in zip(hybrid, embed_sparse_queries([slot.query for slot in hybrid])):
+            slot.sparse_vector = vec
+
+
+def query_requests(slots: list[BatchSlot]) -> list:
+    """One QueryRequest per slot; dense and hybrid queries share a single query_batch_points call."""
+    return [
+        hybrid_request(slot.info, slot.vector, slot.sparse_vector, slot.top_k, slot.search, slot.post)
+        if slot.hybrid
+        else dense_request(slot.info, slot.vector, slot.top_k, slot.search, slot.post)
+        for slot in slots
+    ]
+
+
+def fill_batch_results(results: list, slots: list[BatchSlot], responses) -> None:
+    """Post-process each slot's hits (reranking all slots in one pass) and cache them."""
+    items = [
+        (slot.query, slot.vector, hits, slot.top_k, slot.post, slot.info.vector_name if slot.info else None)
+        for slot, hits in zip(slots, responses)
+    ]
+    for slot, slot_results in zip(slots, postprocess.apply_many(items)):
+        results[slot.index] = slot_results
+        store_results(slot.cache_key, slot_results, slot.generation)
+
+
+def query_batch(queries: list[QueryIn]) -> list[list[SearchResult]]:
+    """Answer several queries with one embedding call and one batched search per collection."""
+    results, pending = plan_query_batch(queries)
+    if pending:
+        embed_query_batch(pending)
+        client = get_search_client()
+        for target, slots in pending.items():
+            bind_collection(target)
+            with stage("search"):
+                responses = qdrant_search(client.query_batch_points, collection_name=target, requests=query_requests(slots))
+            fill_batch_results(results, slots, [r.points for r in responses])
+    logger.info(f"Batch of {len(queries)} queries answered ({sum(len(g) for g in pending.values())} searched).")
+    return results
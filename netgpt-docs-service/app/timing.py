@@ -0,0 +1,53 @@
+"""Per-request stage timing for the ingest and query hot paths.
+
+Service code wraps each stage in ``with stage("embed"):``. Every stage is
+observed in the ``docservice_stage_seconds`` histogram, labelled with the
+collection bound for the current request. When a caller has opened
+``record_stages()`` (benchmarks, the Server-Timing header), the elapsed seconds
+are also added to that recorder. Both live in ContextVars, so they follow the
+request across ``await`` points and into executor threads that run with a
+copied context (see ``async_services.run_cpu``).
+"""
+from __future__ import annotations
+
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+try:
+    from app.metrics import STAGE_SECONDS, collection_label
+except ImportError:
+    from metrics import STAGE_SECONDS, collection_label
+
+# Active recorders, innermost last; nested record_stages() blocks all receive timings
+_recorders: ContextVar[tuple[dict, ...]] = ContextVar("docservice_stage_timings", default=())
+_collection: ContextVar[str] = ContextVar("docservice_collection", default="")
+
+
+def bind_collection(name: str) -> None:
+    """Label stages timed from here on in this context with ``name`` (see ``metrics.collection_label``)."""
+    _collection.set(name)
+
+
+@contextmanager
+def stage(name: str):
+    """Time a block and add it to the active recorder under ``name``."""
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        elapsed = time.perf_counter() - started
+        STAGE_SECONDS.observe(elapsed, stage=name, collection=collection_label(_collection.get()))
+        for rec in _recorders.get():
+            rec[name] = rec.get(name, 0.0) + elapsed
+
+
+@contextmanager
+def record_stages():
+    """Collect {stage: seconds} for everything timed inside the block."""
+    rec: dict[str, float] = {}
+    token = _recorders.set(_recorders.get() + (rec,))
+    try:
+        yield rec
+    finally:
+        _recorders.reset(token)
@@ -0,0 +1,132 @@
+"""Batched, retried and parallel upload of embedded chunks to Qdrant.
+
+An ingest plan is uploaded in slices of UPLOAD_BATCH_SIZE points. Slices are
+built lazily from the plan's embeddings and at most UPLOAD_PARALLEL of them
+are in flight at once, so the extra memory used for upload stays bounded
+however large the document is. A failed slice is retried with exponential
+backoff. Only when its retries are exhausted does the ingest fail, and
+slices that already succeeded remain stored; since point ids are
+deterministic, re-ingesting the document skips them without re-embedding.
+
+Each slice is one ``upsert`` of a ``models.Batch`` on the caller's client: the
+pooled sync client or ``AsyncQdrantClient``, so uploads reuse their
+connections. Only the slice being sent is converted from NumPy to lists, in
+one ``tolist`` call; letting pydantic validate the array element by element
+is far slower.
+"""
+from __future__ import annotations
+
+import asyncio
+import logging
+import threading
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+
+try:
+    from app.config import UPLOAD_BATCH_SIZE, UPLOAD_PARALLEL, UPLOAD_MAX_RETRIES, UPLOAD_RETRY_BACKOFF
+    from app.registry import is_not_found
+    from app import metrics
+except ImportError:
+    from config import UPLOAD_BATCH_SIZE, UPLOAD_PARALLEL, UPLOAD_MAX_RETRIES, UPLOAD_RETRY_BACKOFF
+    from registry import is_not_found
+    import metrics
+
+logger = logging.getLogger("docservice")
+
+_executor: ThreadPoolExecutor | None = None
+_executor_lock = threading.Lock()
+
+
+def get_executor() -> ThreadPoolExecutor:
+    """Threads shared by all sync uploads."""
+    global _executor
+    if _executor is None:
+        with _executor_lock:
+            if _executor is None:
+                _executor = ThreadPoolExecutor(max_workers=max(1, UPLOAD_PARALLEL), thread_name_prefix="docservice-upload")
+    return _executor
+
+
+def _retry_delay(collection: str, batch_no: int, attempt: int, error: Exception) -> float:
+    """Log a failed attempt and return the backoff before the next one (raises when exhausted)."""
+    if is_not_found(error):
+        # The collection is gone; retrying cannot succeed
+        raise error
+    metrics.UPLOAD_RETRIES_TOTAL.inc(collection=metrics.collection_label(collection))
+    if attempt > UPLOAD_MAX_RETRIES:
+        logger.error("Upload of batch %d to '%s' failed after %d attempts: %s", batch_no, collection, attempt, error)
+        raise error
+    delay = UPLOAD_RETRY_BACKOFF * (2 ** (attempt - 1))
+    logger.warning("Upload of batch %d to '%s' failed (attempt %d), retrying in %.2fs: %s", batch_no, collection, attempt, delay, error)
+    return delay
+
+
+def _to_list(vectors):
+    return vectors.tolist() if hasattr(vectors, "tolist") else vectors
+
+
+def _points(batch):
+    """``models.Batch`` for one (ids, vectors, payloads) slice of ``IngestPlan.upload_batches``."""
+    from qdrant_client import models as qmodels
+    ids, vectors, payloads = batch
+    if isinstance(vectors, dict):
+        vectors = {name: _to_list(named) for name, named in vectors.items()}
+    else:
+        vectors = _to_list(vectors)
+    return qmodels.Batch(ids=ids, vectors=vectors, payloads=payloads)
+
+
+def _send(client, collection: str, batch_no: int, batch) -> int:
+    points = _points(batch)
+    attempt = 0
+    while True:
+        attempt += 1
+        try:
+            client.upsert(collection_name=collection, points=points, wait=True)
+            return len(batch[0])
+        except Exception as e:
+            time.sleep(_retry_delay(collection, batch_no, attempt, e))
+
+
+def upload_plan(client, plan) -> int:
+    """Upload the plan's pending chunks in parallel slices; returns points written."""
+    in_flight: deque = deque()
+    written = 0
+    executor = get_executor()
+    try:
+        for batch_no, batch in enumerate(plan.upload_batches(UPLOAD_BATCH_SIZE)):
+            in_flight.append(executor.submit(_send, client, plan.collection, batch_no, batch))
+            if len(in_flight) >= max(1, UPLOAD_PARALLEL):
+                written += in_flight.popleft().result()
+        while in_flight:
+            written += in_flight.popleft().result()
+    finally:
+        for future in in_flight:
+            future.cancel()
+    return written
+
+
+async def _send_async(client, collection: str, batch_no: int, batch) -> int:
+    points = _points(batch)
+    attempt = 0
+    while True:
+        attempt += 1
+        try:
+            await client.upsert(collection_name=collection, points=points, wait=True)
+            return len(batch[0])
+        except Exception as e:
+            await asyncio.sleep(_retry_delay(collection, batch_no, attempt, e))
+
+
+async def upload_plan_async(client, plan) -> int:
+    """Async counterpart of ``upload_plan``: UPLOAD_PARALLEL workers share one slice iterator."""
+    batches = enumerate(plan.upload_batches(UPLOAD_BATCH_SIZE))
+
+    async def worker() -> int:
+        written = 0
+        for batch_no, batch in batches:
+            written += await _send_async(client, plan.collection, batch_no, batch)
+        return written
+
+    return sum(await asyncio.gather(*(worker() for _ in range(max(1, UPLOAD_PARALLEL)))))
@@ -0,0 +1,85 @@
+"""Opt-in startup warm-up and readiness state.
+
+Without warm-up, the first /ingest or /query after a deploy pays for the
+tokenizer and model download, ONNX session creation, the Qdrant connectivity retry loop and
+a cold first inference. When WARMUP_ON_STARTUP=1, these run as a background
+task at startup. /ready reports 503 until they have finished, while /health
+keeps answering liveness checks.
+"""
+from __future__ import annotations
+
+import logging
+import time
+
+try:
+    from app import services, async_services, postprocess
+    from app.chunking import get_chunker
+except ImportError:
+    import services
+    import async_services
+    import postprocess
+    from chunking import get_chunker
+
+logger = logging.getLogger("docservice")
+
+
+class WarmupState:
+    """Progress and per-phase timings of the startup warm-up."""
+
+    def __init__(self, enabled: bool):
+        self.enabled = enabled
+        self.done = not enabled
+        self.error: str | None = None
+        self.phases: dict[str, float] = {}
+        self.collections: dict[str, dict] = {}
+        self.started_at: float | None = None
+
+    @property
+    def ready(self) -> bool:
+        return self.done and self.error is None
+
+    def as_dict(self) -> dict:
+        return {
+            "ready": self.ready,
+            "warmup": "disabled" if not self.enabled else ("done" if self.done else "running"),
+            "error": self.error,
+            "phases_ms": dict(self.phases),
+            "collections": dict(self.collections),
+        }
+
+
+async def _phase(state: WarmupState, name: str, fn, *args):
+    started = time.perf_counter()
+    try:
+        return await fn(*args)
+    finally:
+        state.phases[name] = round((time.perf_counter() - started) * 1000.0, 2)
+        logger.info("Warm-up phase '%s' took %.1f ms", name, state.phases[name])
+
+
+async def _collection_metadata() -> dict[str, dict]:
+    """Load every collection's vector size/distance into the shared registry."""
+    for name in await async_services.list_collections():
+        await async_services.collection_info(name)
+    return async_services.get_collection_registry().snapshot()
+
+
+async def run_warmup(state: WarmupState) -> None:
+    """Preload the embedder, run a dummy inference and open the Qdrant clients."""
+    state.started_at = time.time()
+    try:
+        await _phase(state, "chunker_load", async_services.run_cpu, get_chunker)
+        await _phase(state, "embedder_load", async_services.run_cpu, services.preload_embedder)
+        await _phase(state, "inference", async_services.run_cpu, services.embed_texts, ["warm-up inference"])
+        if services.HYBRID_SEARCH:
+            await _phase(state, "sparse_inference", async_services.run_cpu, services.embed_sparse, ["warm-up inference"])
+        if postprocess.RERANK_ENABLED:
+            await _phase(state, "reranker_load", async_services.run_cpu, postprocess.preload_reranker)
+        await _phase(state, "qdrant_client", async_services.run_cpu, services.get_client)
+        await _phase(state, "async_qdrant_client", async_services.get_async_client)
+        state.collections = await _phase(state, "collections", _collection_metadata)
+    except Exception as e:
+        logger.exception("Startup warm-up failed")
+        state.error = f"{e.__class__.__name__}: {e}"
+    finally:
+        state.done = True
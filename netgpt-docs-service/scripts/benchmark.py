@@ -0,0 +1,353 @@
+"""Load and latency benchmark for the docs service.
+
+Drives ``ingest_document``/``query_text`` directly (``service`` mode) and the
+FastAPI endpoints in-process through httpx's ASGI transport (``http`` mode).
+``chunk`` mode measures chunking throughput alone: a chunker built per call
+(the old behaviour), the shared cached chunker for each tokenizer passed in
+``--chunk-tokenizers``, and the process pool when CHUNK_PARALLEL_WORKERS > 0.
+By default it runs against qdrant-client's local ``:memory:`` mode, so no
+Qdrant server is needed. It reports docs/sec, chunks/sec, queries/sec and
+p50/p95/p99 latencies overall and per stage (chunk, embed, upload, search, ...),
+and writes the results as JSON that can be compared between runs.
+``--transports rest,grpc`` runs the whole benchmark once per Qdrant transport,
+each in its own process, and prints the results side by side; it needs a real
+server (``--qdrant-url``), since local mode has no network transport.
+
+Usage:
+    python3 scripts/benchmark.py --docs 200 --doc-words 800 --queries 200 --concurrency 8
+    python3 scripts/benchmark.py --mode http --output bench.json
+    python3 scripts/benchmark.py --compare bench-before.json --output bench-after.json
+    python3 scripts/benchmark.py --mode chunk --docs 50 --doc-words 20000 --chunk-tokenizers gpt2,embedding
+    python3 scripts/benchmark.py --qdrant-url http://localhost:6333 --transports rest,grpc
+
+Environment variables such as EMBEDDING_MODEL, EMBEDDING_ONNX_FILE,
+EMBEDDING_DIM, CHUNK_SIZE or EMBED_BATCHING are honoured as usual, so the same
+corpus can be replayed under different settings.
+"""
+import argparse
+import asyncio
+import json
+import os
+import platform
+import random
+import subprocess
+import sys
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+project_root = Path(__file__).resolve().parent.parent
+if str(project_root) not in sys.path:
+    sys.path.insert(0, str(project_root))
+
+WORDS = (
+    "interface ethernet vlan trunk port switch router gateway subnet mask dhcp dns lease "
+    "bgp ospf neighbor adjacency route table prefix firewall nat policy acl packet drop "
+    "latency jitter throughput bandwidth mtu fragment tcp udp handshake timeout retry "
+    "error code link down up flap duplex speed negotiation spanning tree loop broadcast "
+    "multicast igmp snooping qos queue shaping policing tunnel ipsec vpn certificate key "
+    "wireless ssid channel interference roaming controller access point client auth radius"
+).split()
+
+
+def make_corpus(docs: int, words: int, seed: int) -> list[tuple[str, str]]:
+    rng = random.Random(seed)
+    corpus = []
+    for i in range(docs):
+        sentences = []
+        remaining = words
+        while remaining > 0:
+            n = min(remaining, rng.randint(8, 20))
+            sentences.append(" ".join(rng.choice(WORDS) for _ in range(n)).capitalize() + ".")
+            remaining -= n
+        corpus.append((f"bench-doc-{i}", " ".join(sentences)))
+    return corpus
+
+
+def make_queries(count: int, seed: int) -> list[str]:
+    rng = random.Random(seed + 1)
+    return [" ".join(rng.choice(WORDS) for _ in range(rng.randint(2, 6))) for _ in range(count)]
+
+
+def latency_stats(seconds: list[float]) -> dict:
+    if not seconds:
+        return {"count": 0}
+    ms = sorted(s * 1000.0 for s in seconds)
+
+    def pct(p: float) -> float:
+        return round(ms[min(len(ms) - 1, int(round(p / 100.0 * (len(ms) - 1))))], 3)
+
+    return {
+        "count": len(ms),
+        "mean": round(sum(ms) / len(ms), 3),
+        "p50": pct(50),
+        "p95": pct(95),
+        "p99": pct(99),
+        "max": round(ms[-1], 3),
+    }
+
+
+def summarize(wall: float, samples: list[tuple[float, dict]], docs: int = 0, chunks: int = 0) -> dict:
+    stages: dict[str, list[float]] = {}
+    for _, recorded in samples:
+        for name, seconds in recorded.items():
+            stages.setdefault(name, []).append(seconds)
+    summary = {
+        "operations": len(samples),
+        "wall_seconds": round(wall, 3),
+        "ops_per_sec": round(len(samples) / wall, 3) if wall > 0 else 0.0,
+        "latency_ms": latency_stats([total for total, _ in samples]),
+        "stages_ms": {name: latency_stats(values) for name, values in sorted(stages.items())},
+    }
+    if docs:
+        summary["docs_per_sec"] = round(docs / wall, 3) if wall > 0 else 0.0
+        summary["chunks"] = chunks
+        summary["chunks_per_sec"] = round(chunks / wall, 3) if wall > 0 else 0.0
+    return summary
+
+
+def bench_service(args, corpus, queries) -> dict:
+    from app import services
+    from app.timing import record_stages
+
+    collection = f"{args.collection}_service"
+    services.delete_collection(collection)
+
+    def ingest_one(doc):
+        doc_id, text = doc
+        with record_stages() as recorded:
+            started = time.perf_counter()
+            result = services.ingest_document(doc_id, text, collection=collection)
+            elapsed = time.perf_counter() - started
+        return elapsed, dict(recorded), result.chunks
+
+    def query_one(query):
+        with record_stages() as recorded:
+            started = time.perf_counter()
+            services.query_text(query, top_k=args.top_k, collection=collection)
+            elapsed = time.perf_counter() - started
+        return elapsed, dict(recorded)
+
+    with ThreadPoolExecutor(max_workers=args.concurrency) as ex:
+        started = time.perf_counter()
+        ingested = list(ex.map(ingest_one, corpus))
+        ingest_wall = time.perf_counter() - started
+
+        started = time.perf_counter()
+        queried = list(ex.map(query_one, queries))
+        query_wall = time.perf_counter() - started
+
+    chunks = sum(c for _, _, c in ingested)
+    return {
+        "ingest": summarize(ingest_wall, [(t, s) for t, s, _ in ingested], docs=len(corpus), chunks=chunks),
+        "query": summarize(query_wall, queried),
+    }
+
+
+def bench_chunking(args, corpus) -> dict:
+    from chonkie import RecursiveChunker
+    from app import chunking, config
+
+    def run(chunk_fn) -> dict:
+        samples, chunks = [], 0
+        started = time.perf_counter()
+        for _, text in corpus:
+            t0 = time.perf_counter()
+            chunks += len(chunk_fn(text))
+            samples.append((time.perf_counter() - t0, {}))
+        wall = time.perf_counter() - started
+        summary = summarize(wall, samples, docs=len(corpus), chunks=chunks)
+        summary["chars_per_sec"] = round(sum(len(t) for _, t in corpus) / wall, 1) if wall > 0 else 0.0
+        return summary
+
+    def uncached(text):
+        return [c.text for c in RecursiveChunker(chunk_size=config.CHUNK_SIZE, tokenizer="gpt2")(text)]
+
+    results = {"uncached_gpt2": run(uncached)}
+    for tokenizer in args.chunk_tokenizers.split(","):
+        chunking.get_chunker(config.CHUNK_SIZE, tokenizer, config.CHUNK_OVERLAP)  # load outside the timed run
+        results[f"cached_{tokenizer}"] = run(
+            lambda text: chunking.chunk_segment(text, config.CHUNK_SIZE, tokenizer, config.CHUNK_OVERLAP)
+        )
+    if config.CHUNK_PARALLEL_WORKERS > 0:
+        chunking.chunk_document(corpus[0][1], parallel=True)  # start workers and load their chunkers
+        results["parallel"] = run(lambda text: chunking.chunk_document(text, parallel=True))
+    return results
+
+
+async def bench_http(args, corpus, queries) -> dict:
+    import httpx
+    from app.main import app
+    from app.timing import record_stages
+
+    collection = f"{args.collection}_http"
+    sem = asyncio.Semaphore(args.concurrency)
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://benchmark", timeout=None) as client:
+        await client.delete(f"/admin/collections/{collection}")
+
+        async def ingest_one(doc):
+            doc_id, text = doc
+            async with sem:
+                with record_stages() as recorded:
+                    started = time.perf_counter()
+                    resp = await client.post("/ingest", json={"doc_id": doc_id, "text": text, "collection": collection})
+                    elapsed = time.perf_counter() - started
+            resp.raise_for_status()
+            return elapsed, dict(recorded), resp.json()["chunks_ingested"]
+
+        async def query_one(query):
+            async with sem:
+                with record_stages() as recorded:
+                    started = time.perf_counter()
+                    resp = await client.post(
+                        "/query", json={"query": query, "collection": collection, "top_k": args.top_k}
+                    )
+                    elapsed = time.perf_counter() - started
+            resp.raise_for_status()
+            return elapsed, dict(recorded)
+
+        started = time.perf_counter()
+        ingested = await asyncio.gather(*(ingest_one(d) for d in corpus))
+        ingest_wall = time.perf_counter() - started
+
+        started = time.perf_counter()
+        queried = await asyncio.gather(*(query_one(q) for q in queries))
+        query_wall = time.perf_counter() - started
+
+    chunks = sum(c for _, _, c in ingested)
+    return {
+        "ingest": summarize(ingest_wall, [(t, s) for t, s, _ in ingested], docs=len(corpus), chunks=chunks),
+        "query": summarize(query_wall, list(queried)),
+    }
+
+
+def compare(previous: dict, current: dict, labels: tuple[str, str] = ("before", "after")) -> None:
+    """Print relative changes in throughput and tail latency versus a prior run."""
+    print(f"{'metric':<44} {labels[0]:>12} {labels[1]:>12} {'change':>9}")
+    for mode, phases in current.get("results", {}).items():
+        for phase, summary in phases.items():
+            before = previous.get("results", {}).get(mode, {}).get(phase)
+            if not before:
+                continue
+            rows = [("ops_per_sec", before.get("ops_per_sec"), summary.get("ops_per_sec"))]
+            for p in ("p50", "p95", "p99"):
+                rows.append((f"latency_ms.{p}", before["latency_ms"].get(p), summary["latency_ms"].get(p)))
+            for name, b, a in rows:
+                if not b or a is None:
+                    continue
+                print(f"{mode + '.' + phase + '.' + name:<44} {b:>12.3f} {a:>12.3f} {(a - b) / b * 100:>+8.1f}%")
+
+
+def strip_options(argv: list[str], names: tuple[str, ...]) -> list[str]:
+    """Drop ``--name value`` and ``--name=value`` pairs from an argument list."""
+    kept, skip = [], False
+    for arg in argv:
+        if skip:
+            skip = False
+        elif arg in names:
+            skip = True
+        elif not arg.startswith(tuple(f"{name}=" for name in names)):
+            kept.append(arg)
+    return kept
+
+
+def bench_transports(args) -> dict:
+    """Run the benchmark in a child process per transport and collect the reports."""
+    if args.qdrant_url == ":memory:":
+        print("warning: --transports with ':memory:' compares local mode with itself; pass --qdrant-url", file=sys.stderr)
+    argv = strip_options(sys.argv[1:], ("--transports", "--output", "--compare"))
+    reports = {}
+    with tempfile.TemporaryDirectory() as tmp:
+        for transport in [t.strip() for t in args.transports.split(",") if t.strip()]:
+            output = Path(tmp) / f"{transport}.json"
+            env = {**os.environ, "QDRANT_PREFER_GRPC": "1" if transport == "grpc" else "0"}
+            subprocess.run(
+                [sys.executable, __file__, *argv, "--output", str(output)],
+                env=env, check=True, stdout=subprocess.DEVNULL,
+            )
+            reports[transport] = json.loads(output.read_text())
+    return reports
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--mode", choices=["service", "http", "chunk", "both"], default="both",
+                        help="'both' runs service and http; 'chunk' runs the chunking benchmark only")
+    parser.add_argument("--docs", type=int, default=100, help="number of documents to ingest")
+    parser.add_argument("--doc-words", type=int, default=600, help="words per generated document")
+    parser.add_argument("--queries", type=int, default=100, help="number of queries to run")
+    parser.add_argument("--concurrency", type=int, default=4, help="concurrent ingests/queries in flight")
+    parser.add_argument("--top-k", type=int, default=5)
+    parser.add_argument("--collection", default="benchmark")
+    parser.add_argument("--seed", type=int, default=1234)
+    parser.add_argument("--chunk-tokenizers", default="gpt2",
+                        help="comma-separated CHUNK_TOKENIZER values compared in chunk mode")
+    parser.add_argument("--qdrant-url", default=":memory:", help="Qdrant URL; ':memory:' uses qdrant-client local mode")
+    parser.add_argument("--output", help="write JSON results to this file")
+    parser.add_argument("--compare", help="previous JSON results to compare against")
+    parser.add_argument("--transports", help="comma-separated Qdrant transports to compare, e.g. rest,grpc")
+    args = parser.parse_args()
+
+    if args.transports:
+        reports = bench_transports(args)
+        text = json.dumps({"transports": reports}, indent=2, sort_keys=True)
+        if args.output:
+            Path(args.output).write_text(text + "\n")
+        print(text)
+        names = list(reports)
+        for other in names[1:]:
+            print()
+            compare(reports[names[0]], reports[other], labels=(names[0], other))
+        return
+
+    # Must be set before the app modules read their configuration
+    os.environ["QDRANT_URL"] = args.qdrant_url
+
+    from app import config, services
+
+    corpus = make_corpus(args.docs, args.doc_words, args.seed)
+    queries = make_queries(args.queries, args.seed)
+
+    results = {}
+    if args.mode == "chunk":
+        results["chunk"] = bench_chunking(args, corpus)
+    else:
+        # Load the model and run a first inference outside the timed sections
+        services.preload_embedder()
+        services.embed_texts(["benchmark warm-up"])
+    if args.mode in ("service", "both"):
+        results["service"] = bench_service(args, corpus, queries)
+    if args.mode in ("http", "both"):
+        results["http"] = asyncio.run(bench_http(args, corpus, queries))
+
+    report = {
+        "config": {k: v for k, v in vars(args).items() if k not in ("output", "compare")},
+        "environment": {
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "cpu_count": os.cpu_count(),
+            "embedding_model": config.EMBEDDING_MODEL,
+            "embedding_onnx_file": config.EMBEDDING_ONNX_FILE,
+            "embedding_dim": config.EMBEDDING_DIM,
+            "vector_datatype": config.VECTOR_DATATYPE,
+            "chunk_size": config.CHUNK_SIZE,
+            "chunk_tokenizer": config.CHUNK_TOKENIZER,
+            "chunk_parallel_workers": config.CHUNK_PARALLEL_WORKERS,
+            "qdrant_transport": "grpc" if config.QDRANT_PREFER_GRPC else "rest",
+            "qdrant_client_pool_size": config.QDRANT_CLIENT_POOL_SIZE,
+        },
+        "results": results,
+    }
+    text = json.dumps(report, indent=2, sort_keys=True)
+    if args.output:
+        Path(args.output).write_text(text + "\n")
+    print(text)
+
+    if args.compare:
+        compare(json.loads(Path(args.compare).read_text()), report)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,75 @@
+"""Shared fixtures: an in-memory Qdrant, a deterministic embedder and a
+paragraph chunker, so the service layer runs without model downloads or a
+Qdrant server."""
+from __future__ import annotations
+
+import hashlib
+import os
+import sys
+import threading
+from pathlib import Path
+
+# Configuration is read at import time, so it has to be in place before ``app``
+os.environ["QDRANT_URL"] = ":memory:"
+os.environ["COLLECTION_NAME"] = "docs"
+os.environ["EMBED_STORE_PATH"] = ""
+os.environ["WARMUP_ON_STARTUP"] = "0"
+os.environ["QDRANT_SKIP_CONNECT_CHECK"] = "1"
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+import numpy as np
+import pytest
+
+from app import async_services, services
+from app.cache import LRUCache
+from app.registry import CollectionRegistry
+
+DIM = 8
+
+
+class FakeEmbedder:
+    """Stands in for fastembed's TextEmbedding: one unit vector per text, derived from its hash."""
+
+    def __init__(self):
+        self.calls: list[list[str]] = []
+
+    def embed(self, texts):
+        texts = list(texts)
+        self.calls.append(texts)
+        for text in texts:
+            seed = int.from_bytes(hashlib.sha256(text.encode("utf-8")).digest()[:8], "little")
+            vec = np.random.default_rng(seed).standard_normal(DIM).astype(np.float32)
+            yield vec / np.linalg.norm(vec)
+
+
+def paragraphs(text: str, parallel: bool | None = None) -> list[str]:
+    return [part.strip() for part in text.split("\n\n") if part.strip()]
+
+
+def document(name: str, chunks: int) -> str:
+    return "\n\n".join(f"{name} paragraph {i}" for i in range(chunks))
+
+
+@pytest.fixture
+def embedder() -> FakeEmbedder:
+    return FakeEmbedder()
+
+
+@pytest.fixture
+def svc(monkeypatch, embedder):
+    """``services`` with fresh clients, caches and registry for every test."""
+    monkeypatch.setattr(services, "_clients", [])
+    monkeypatch.setattr(services, "_search_clients", [])
+    monkeypatch.setattr(services, "_connected", False)
+    monkeypatch.setattr(services, "_thread_clients", threading.local())
+    monkeypatch.setattr(services, "_collections", CollectionRegistry())
+    monkeypatch.setattr(services, "_query_vector_cache", LRUCache(64))
+    monkeypatch.setattr(services, "_result_cache", LRUCache(64, 60))
+    monkeypatch.setattr(services, "_cache_generations", {})
+    monkeypatch.setattr(services, "_embedder", embedder)
+    monkeypatch.setattr(services, "_embedding_dim", None)
+    monkeypatch.setattr(services, "chunk_document", paragraphs)
+    monkeypatch.setattr(async_services, "_async_client", None)
+    monkeypatch.setattr(async_services, "_client_lock", None)
+    monkeypatch.setattr(async_services, "_memory_registry", CollectionRegistry())
+    return services
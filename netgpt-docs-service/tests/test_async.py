@@ -0,0 +1,42 @@
+import asyncio
+import threading
+
+from fastapi.testclient import TestClient
+
+from app import async_services, main
+from app.timing import record_stages, stage
+from conftest import document
+
+
+def test_cpu_work_runs_off_the_loop_and_keeps_stage_timings():
+    def work():
+        with stage("chunk"):
+            return threading.current_thread().name
+
+    async def run():
+        with record_stages() as stages:
+            name = await async_services.run_cpu(work)
+        return name, stages
+
+    name, stages = asyncio.run(run())
+    assert name.startswith("docservice-cpu")
+    assert "chunk" in stages
+
+
+def test_ingest_and_query_endpoints_use_the_async_client(svc):
+    client = TestClient(main.app)
+    client.post("/ingest", json={"doc_id": "a", "text": document("a", 3)})
+    response = client.post("/query", json={"query": "a paragraph 1", "top_k": 2})
+
+    assert response.status_code == 200
+    hits = response.json()
+    assert len(hits) == 2 and hits[0]["chunk"] == "a paragraph 1"
+    # Written and read through the async client only
+    assert not svc.get_client().collection_exists("docs")
+
+
+def test_query_against_a_collection_of_another_dimension_is_a_bad_request(svc):
+    client = TestClient(main.app)
+    client.post("/admin/ensure-collection?name=wide&dim=16")
+    response = client.post("/query", json={"query": "anything", "collection": "wide"})
+    assert response.status_code == 400
@@ -0,0 +1,65 @@
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+from app import async_services
+from app.batching import EmbeddingBatcher
+from conftest import document
+
+
+@pytest.fixture
+def batching(svc, monkeypatch):
+    batcher = EmbeddingBatcher(svc._embed_direct, max_batch_size=32, max_wait_ms=200)
+    monkeypatch.setattr(svc, "EMBED_BATCHING", True)
+    monkeypatch.setattr(svc, "_batcher", batcher)
+    # A single executor thread: batches must not be capped by the executor width
+    executor = ThreadPoolExecutor(max_workers=1)
+    monkeypatch.setattr(async_services, "_cpu_executor", executor)
+    yield batcher
+    executor.shutdown()
+
+
+def test_async_queries_are_batched_beyond_the_executor_width(svc, batching, embedder):
+    async def run():
+        await async_services.ingest_document("a", document("a", 2))
+        embedder.calls.clear()
+        return await asyncio.gather(*(async_services.query_text(f"question {i}") for i in range(8)))
+
+    results = asyncio.run(run())
+    assert all(len(r) == 2 for r in results)
+    assert [len(call) for call in embedder.calls] == [8]
+    assert batching.stats()["max_batch_size_seen"] == 8
+
+
+def test_async_query_vectors_are_cached(svc, batching, embedder):
+    async def run():
+        first = await async_services.embed_queries(["Same question", "other"])
+        second = await async_services.embed_queries(["Same  question"])
+        return first, second
+
+    first, second = asyncio.run(run())
+    assert (second[0] == first[0]).all()
+    assert sum(len(call) for call in embedder.calls) == 2
+
+
+def test_a_failed_batch_fails_every_caller_and_is_counted():
+    calls = []
+
+    def broken(texts):
+        calls.append(texts)
+        raise RuntimeError("model crashed")
+
+    batcher = EmbeddingBatcher(broken, max_batch_size=4, max_wait_ms=50)
+    futures = [batcher.submit(text) for text in ("a", "b")]
+    for future in futures:
+        with pytest.raises(RuntimeError, match="model crashed"):
+            future.result(timeout=5)
+    assert batcher.stats()["errors"] == len(calls)
+
+
+def test_batches_are_capped_at_the_maximum_size(embedder):
+    batcher = EmbeddingBatcher(lambda texts: list(embedder.embed(texts)), max_batch_size=3, max_wait_ms=50)
+    assert len(batcher.embed_many([f"t{i}" for i in range(7)])) == 7
+    assert max(len(call) for call in embedder.calls) == 3
+    assert batcher.stats()["items"] == 7
@@ -0,0 +1,51 @@
+import asyncio
+import importlib.util
+from argparse import Namespace
+from pathlib import Path
+
+import pytest
+
+spec = importlib.util.spec_from_file_location(
+    "benchmark", Path(__file__).resolve().parent.parent / "scripts" / "benchmark.py"
+)
+benchmark = importlib.util.module_from_spec(spec)
+spec.loader.exec_module(benchmark)
+
+
+@pytest.fixture
+def args():
+    return Namespace(collection="bench", concurrency=3, top_k=2)
+
+
+def test_corpus_and_queries_are_reproducible():
+    corpus = benchmark.make_corpus(3, 40, seed=7)
+    assert corpus == benchmark.make_corpus(3, 40, seed=7)
+    assert [doc_id for doc_id, _ in corpus] == ["bench-doc-0", "bench-doc-1", "bench-doc-2"]
+    assert all(len(text.split()) == 40 for _, text in corpus)
+    assert benchmark.make_queries(5, seed=7) == benchmark.make_queries(5, seed=7)
+
+
+def test_latency_stats_and_summary():
+    stats = benchmark.latency_stats([0.001 * i for i in range(1, 101)])
+    assert (stats["count"], stats["p50"], stats["max"]) == (100, 51.0, 100.0)
+    summary = benchmark.summarize(2.0, [(0.5, {"embed": 0.1}), (0.5, {"embed": 0.3})], docs=2, chunks=6)
+    assert (summary["ops_per_sec"], summary["chunks_per_sec"]) == (1.0, 3.0)
+    assert summary["stages_ms"]["embed"]["max"] == 300.0
+
+
+def test_strip_options_drops_both_spellings():
+    argv = ["--docs", "5", "--output", "x.json", "--transports=rest,grpc", "--mode", "http"]
+    assert benchmark.strip_options(argv, ("--output", "--transports")) == ["--docs", "5", "--mode", "http"]
+
+
+def test_service_and_http_modes_run_in_one_process(svc, args):
+    corpus = [(doc_id, text.replace(". ", ".\n\n")) for doc_id, text in benchmark.make_corpus(4, 60, seed=1)]
+    queries = benchmark.make_queries(6, seed=1)
+
+    service = benchmark.bench_service(args, corpus, queries)
+    http = asyncio.run(benchmark.bench_http(args, corpus, queries))
+
+    for report in (service, http):
+        assert report["ingest"]["operations"] == 4 and report["ingest"]["chunks"] > 4
+        assert report["query"]["operations"] == 6
+        assert "embed" in report["ingest"]["stages_ms"] and "search" in report["query"]["stages_ms"]
@@ -0,0 +1,80 @@
+import asyncio
+
+from app import async_services
+from app.cache import LRUCache, normalize_query
+from app.models import QueryIn
+from conftest import document
+
+
+def test_lru_cache_evicts_least_recent_and_expires(monkeypatch):
+    now = [0.0]
+    monkeypatch.setattr("app.cache.time.monotonic", lambda: now[0])
+    cache = LRUCache(2, ttl_seconds=10)
+    cache.put("a", 1)
+    cache.put("b", 2)
+    assert cache.get("a") == 1
+    cache.put("c", 3)
+    assert cache.get("b") is None and cache.get("a") == 1
+    now[0] = 11.0
+    assert cache.get("a") is None
+    assert normalize_query("  what  is\tBGP ") == "what is BGP"
+
+
+def test_results_are_served_from_cache_until_ingest(svc, embedder):
+    svc.ingest_document("a", document("a", 2))
+    first = svc.query_text("paragraph")
+    calls = len(embedder.calls)
+    assert svc.query_text("paragraph") == first
+    assert len(embedder.calls) == calls
+
+    svc.ingest_document("b", document("b", 2))
+    assert len(svc.query_text("paragraph", top_k=5)) == 4
+
+
+def test_search_overlapping_an_ingest_is_not_cached(svc):
+    svc.ingest_document("a", document("a", 2))
+    client = svc.get_search_client()
+    search = client.query_batch_points
+
+    def search_then_ingest(**kwargs):
+        hits = search(**kwargs)
+        # An ingest commits while the search is in flight
+        svc.ingest_document("b", document("b", 2))
+        return hits
+
+    client.query_batch_points = search_then_ingest
+    assert len(svc.query_text("paragraph")) == 2
+    client.query_batch_points = search
+    assert len(svc.query_text("paragraph")) == 4
+
+
+def test_batch_slots_overlapping_an_ingest_are_not_cached(svc):
+    svc.ingest_document("a", document("a", 2))
+    results, pending = svc.plan_query_batch([QueryIn(query="paragraph")])
+    svc.invalidate_collection_cache("docs")
+    svc.embed_query_batch(pending)
+    slots = pending["docs"]
+    response = svc.get_search_client().query_batch_points(collection_name="docs", requests=svc.query_requests(slots))
+    svc.fill_batch_results(results, slots, [r.points for r in response])
+    assert len(results[0]) == 2
+    assert svc._result_cache.stats()["size"] == 0
+
+
+def test_async_search_overlapping_an_ingest_is_not_cached(svc):
+    async def run():
+        await async_services.ingest_document("a", document("a", 2))
+        client = await async_services.get_async_client()
+        search = client.query_batch_points
+
+        async def search_then_ingest(**kwargs):
+            hits = await search(**kwargs)
+            await async_services.ingest_document("b", document("b", 2))
+            return hits
+
+        client.query_batch_points = search_then_ingest
+        stale = await async_services.query_text("paragraph")
+        client.query_batch_points = search
+        return stale, await async_services.query_text("paragraph")
+
+    stale, fresh = asyncio.run(run())
+    assert (len(stale), len(fresh)) == (2, 4)
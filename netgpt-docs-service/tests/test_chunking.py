@@ -0,0 +1,52 @@
+import pytest
+from chonkie import RecursiveChunker, TokenChunker
+
+from app import chunking
+
+
+@pytest.fixture
+def characters(monkeypatch):
+    # chonkie's character tokenizer needs no download
+    monkeypatch.setattr(chunking, "CHUNK_TOKENIZER", "character")
+    monkeypatch.setattr(chunking, "CHUNK_SIZE", 40)
+    monkeypatch.setattr(chunking, "CHUNK_OVERLAP", 0)
+    yield
+    chunking.shutdown()
+
+
+def paragraphs(count: int) -> str:
+    return "\n\n".join(f"Paragraph {i} about routing." for i in range(count))
+
+
+def test_chunkers_are_built_once_per_setting():
+    first = chunking.get_chunker(40, "character", 0)
+    assert chunking.get_chunker(40, "character", 0) is first
+    assert isinstance(first, RecursiveChunker)
+    assert isinstance(chunking.get_chunker(40, "character", 5), TokenChunker)
+    assert chunking.get_chunker(80, "character", 0) is not first
+
+
+def test_segments_cut_at_paragraph_breaks():
+    text = paragraphs(12)
+    segments = chunking.split_segments(text, 4)
+    assert "".join(segments) == text
+    assert 3 <= len(segments) <= 5
+    assert all(segment.endswith("\n\n") for segment in segments[:-1])
+    assert chunking.split_segments("no breaks at all " * 10, 4) == ["no breaks at all " * 10]
+
+
+def test_short_documents_are_chunked_in_process(characters, monkeypatch):
+    monkeypatch.setattr(chunking, "CHUNK_PARALLEL_WORKERS", 2)
+    monkeypatch.setattr(chunking, "CHUNK_PARALLEL_MIN_CHARS", 10_000)
+    chunks = chunking.chunk_document(paragraphs(4))
+    assert chunks and all(len(chunk) <= 40 for chunk in chunks)
+    assert chunking._pool is None
+
+
+def test_parallel_chunking_keeps_the_text_in_order(characters, monkeypatch):
+    monkeypatch.setattr(chunking, "CHUNK_PARALLEL_WORKERS", 2)
+    text = paragraphs(16)
+    parallel = chunking.chunk_document(text, parallel=True)
+    assert chunking._pool is not None
+    assert "".join(parallel) == text
+    assert all(len(chunk) <= 40 for chunk in parallel)
@@ -0,0 +1,43 @@
+import threading
+
+import httpx
+from fastapi.testclient import TestClient
+from qdrant_client.http.exceptions import ResponseHandlingException
+
+from app import async_services, main, services
+from conftest import document
+
+
+def test_pool_checks_connectivity_once_outside_the_lock(svc, monkeypatch):
+    monkeypatch.setattr(services, "QDRANT_URL", "http://qdrant.invalid:6333")
+    monkeypatch.setattr(services, "QDRANT_CLIENT_POOL_SIZE", 3)
+    checks = []
+
+    def check(client):
+        # Other threads must still be able to take the pool lock meanwhile
+        assert services._clients_lock.acquire(blocking=False)
+        services._clients_lock.release()
+        checks.append(client)
+
+    monkeypatch.setattr(services, "_check_connectivity", check)
+    services.get_client()
+    other = threading.Thread(target=services.get_client)
+    other.start()
+    other.join()
+    services.get_search_client()
+
+    assert checks == services._clients[:1] and len(services._clients) == 3
+    # The rest of the pool and the search pool are built without checking
+    assert len(services._search_clients) == 3
+
+
+def test_slow_search_fails_fast_with_504(svc):
+    client = TestClient(main.app)
+    client.post("/ingest", json={"doc_id": "a", "text": document("a", 2)})
+
+    async def slow(**kwargs):
+        raise ResponseHandlingException(httpx.ReadTimeout("timed out"))
+
+    async_services._async_client.query_batch_points = slow
+    response = client.post("/query", json={"query": "paragraph"})
+    assert response.status_code == 504
@@ -0,0 +1,55 @@
+import pytest
+from fastapi.testclient import TestClient
+from qdrant_client import models
+
+from app import main
+from app.models import CollectionOptions
+
+
+def test_defaults_create_a_plain_float32_collection(svc):
+    kwargs, info = svc.collection_schema("docs", 8, hybrid=False)
+    assert "quantization_config" not in kwargs and "hnsw_config" not in kwargs
+    assert kwargs["vectors_config"].on_disk is None and kwargs["vectors_config"].datatype is None
+    assert (info.size, info.distance, info.vector_name) == (8, "Cosine", None)
+
+
+@pytest.mark.parametrize("kind, config", [
+    ("scalar", models.ScalarQuantization),
+    ("binary", models.BinaryQuantization),
+    ("product", models.ProductQuantization),
+])
+def test_options_select_quantization_and_storage(svc, kind, config):
+    options = CollectionOptions(quantization=kind, on_disk=True, datatype="float16", hnsw_m=0, hnsw_ef_construct=64)
+    kwargs, _ = svc.collection_schema("docs", 8, hybrid=False, options=options)
+    assert isinstance(kwargs["quantization_config"], config)
+    assert kwargs["vectors_config"].on_disk is True
+    assert kwargs["vectors_config"].datatype == models.Datatype.FLOAT16
+    assert (kwargs["hnsw_config"].m, kwargs["hnsw_config"].ef_construct) == (0, 64)
+
+
+def test_unknown_quantization_is_rejected(svc):
+    with pytest.raises(ValueError):
+        svc.quantization_config("int4")
+    assert svc.quantization_config("none") is None
+
+
+def test_per_query_search_parameters_override_the_config(svc, monkeypatch):
+    monkeypatch.setattr(svc, "SEARCH_HNSW_EF", 64)
+    monkeypatch.setattr(svc, "QUANTIZATION_RESCORE", True)
+    monkeypatch.setattr(svc, "QUANTIZATION_OVERSAMPLING", 2.0)
+    assert svc.resolve_search() == (64, True, 2.0)
+    params = svc.search_params(svc.resolve_search(hnsw_ef=200, rescore=False, oversampling=3.0))
+    assert (params.hnsw_ef, params.quantization.rescore, params.quantization.oversampling) == (200, False, 3.0)
+
+
+def test_quantized_collection_is_created_and_searchable(svc):
+    client = TestClient(main.app)
+    created = client.post(
+        "/admin/ensure-collection?name=small&dim=8",
+        json={"quantization": "scalar", "on_disk": True, "datatype": "float16"},
+    )
+    assert created.status_code == 200
+    client.post("/ingest", json={"doc_id": "a", "text": "one\n\ntwo", "collection": "small"})
+    response = client.post("/query", json={"query": "one", "collection": "small", "hnsw_ef": 32, "rescore": True})
+    assert [hit["chunk"] for hit in response.json()][:1] == ["one"]
+    assert client.post("/admin/ensure-collection?name=bad&dim=8", json={"quantization": "int4"}).status_code == 422
@@ -0,0 +1,37 @@
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+import pytest
+
+from app import embed_pool
+from app.embed_pool import EmbeddingProcessPool
+from conftest import DIM, FakeEmbedder
+
+
+@pytest.fixture
+def pool(monkeypatch):
+    """A pool whose workers are threads sharing a fake model (spawned workers would load fastembed)."""
+    worker = FakeEmbedder()
+    monkeypatch.setattr(embed_pool, "_worker_embedder", worker)
+    pool = EmbeddingProcessPool("fake", workers=2, sub_batch=3)
+    pool._executor, pool._dim = ThreadPoolExecutor(max_workers=2), DIM
+    yield pool, worker
+    pool.shutdown()
+
+
+def test_sub_batches_are_written_into_one_shared_buffer(pool):
+    pool, worker = pool
+    texts = [f"text {i}" for i in range(7)]
+    vectors = pool.embed(texts)
+
+    assert sorted(len(call) for call in worker.calls) == [1, 3, 3]
+    expected = list(FakeEmbedder().embed(texts))
+    for got, want in zip(vectors, expected):
+        assert got.dtype == np.float32
+        np.testing.assert_array_equal(got, want)
+    assert pool.embed([]) == []
+
+
+def test_known_dim_does_not_start_the_pool():
+    pool = EmbeddingProcessPool("fake", workers=1)
+    assert pool.known_dim is None and pool._executor is None
@@ -0,0 +1,50 @@
+import numpy as np
+import pytest
+
+from app import embedding_model
+from app.registry import CollectionInfo
+
+
+def test_truncate_keeps_the_leading_dimensions_at_unit_length(monkeypatch):
+    monkeypatch.setattr(embedding_model, "EMBEDDING_DIM", 2)
+    vector = np.array([3.0, 4.0, 12.0], dtype=np.float32)
+    np.testing.assert_allclose(embedding_model.truncate(vector), [0.6, 0.8])
+    with pytest.raises(ValueError):
+        embedding_model.truncate(vector[:1])
+
+    monkeypatch.setattr(embedding_model, "EMBEDDING_DIM", 0)
+    assert embedding_model.truncate(vector) is vector
+
+
+def test_signature_names_the_model_variant_and_size(monkeypatch):
+    monkeypatch.setattr(embedding_model, "EMBEDDING_MODEL", "org/model")
+    assert embedding_model.model_signature() == "org/model"
+    monkeypatch.setattr(embedding_model, "EMBEDDING_ONNX_REPO", "org/model")
+    monkeypatch.setattr(embedding_model, "EMBEDDING_ONNX_FILE", "onnx/model_quantized.onnx")
+    monkeypatch.setattr(embedding_model, "EMBEDDING_DIM", 256)
+    assert embedding_model.model_signature() == "org/model[org/model/onnx/model_quantized.onnx]@256"
+
+
+def test_variant_needs_the_native_dimension(monkeypatch):
+    monkeypatch.setattr(embedding_model, "EMBEDDING_ONNX_FILE", "onnx/model_quantized.onnx")
+    monkeypatch.setattr(embedding_model, "EMBEDDING_NATIVE_DIM", 0)
+    monkeypatch.setattr(embedding_model, "_registered", False)
+    with pytest.raises(ValueError):
+        embedding_model._register_variant()
+
+
+def test_collections_of_another_model_are_rejected(svc, monkeypatch):
+    monkeypatch.setattr(svc, "EMBEDDING_MODEL", "org/model")
+    with pytest.raises(ValueError, match="built with embedding model"):
+        svc.check_embedder(CollectionInfo("docs", size=8, embedding_model="org/other"))
+    # Another variant of the same model is accepted, as is a collection without metadata
+    svc.check_embedder(CollectionInfo("docs", size=8, embedding_model="org/model", embedding_variant="x/model.onnx"))
+    svc.check_embedder(CollectionInfo("docs", size=8))
+    with pytest.raises(ValueError):
+        svc.check_embedder(CollectionInfo("docs", size=16))
+
+
+def test_new_collections_record_the_model(svc):
+    svc.ingest_document("a", "text")
+    info = svc.get_collection_registry().get("docs")
+    assert (info.embedding_model, info.embedding_variant) == (svc.EMBEDDING_MODEL, None)
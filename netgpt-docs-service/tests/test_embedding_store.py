@@ -0,0 +1,68 @@
+import hashlib
+
+import numpy as np
+import pytest
+
+from app.embedding_store import EmbeddingStore, fcntl
+
+
+def digest(text: str) -> str:
+    return hashlib.sha256(text.encode()).hexdigest()
+
+
+def vec(value: float) -> np.ndarray:
+    return np.full(4, value, dtype=np.float32)
+
+
+@pytest.fixture
+def store(tmp_path):
+    store = EmbeddingStore(tmp_path, "model", max_entries=2)
+    yield store
+    store.close()
+
+
+def test_round_trip_and_persistence(tmp_path):
+    store = EmbeddingStore(tmp_path, "model")
+    store.put_many([digest("a"), digest("b")], [vec(1), vec(2)])
+    store.close()
+    reopened = EmbeddingStore(tmp_path, "model")
+    found = reopened.get_many([digest("a"), digest("b"), digest("c")])
+    assert set(found) == {digest("a"), digest("b")}
+    np.testing.assert_array_equal(found[digest("b")], vec(2))
+    reopened.close()
+
+
+def test_lookups_survive_eviction_of_their_slot(store):
+    store.put_many([digest("a"), digest("b")], [vec(1), vec(2)])
+    found = store.get_many([digest("a")])
+    # Evicts both old entries and reuses their slots
+    store.put_many([digest("c"), digest("d")], [vec(3), vec(4)])
+    assert store.get_many([digest("a")]) == {}
+    np.testing.assert_array_equal(found[digest("a")], vec(1))
+
+
+def test_replacing_a_digest_reuses_its_slot(store):
+    store.put_many([digest("a")], [vec(1)])
+    free = len(store._free)
+    store.put_many([digest("a")], [vec(5)])
+    assert len(store) == 1 and len(store._free) == free
+    np.testing.assert_array_equal(store.get_many([digest("a")])[digest("a")], vec(5))
+
+
+def test_full_store_keeps_the_entries_being_replaced(store):
+    store.put_many([digest("a"), digest("b")], [vec(1), vec(2)])
+    store.put_many([digest("a"), digest("c")], [vec(6), vec(3)])
+    assert set(store.get_many([digest(t) for t in "abc"])) == {digest("a"), digest("c")}
+
+
+@pytest.mark.skipif(fcntl is None, reason="store locking needs fcntl")
+def test_compact_refuses_while_open_elsewhere(tmp_path):
+    store = EmbeddingStore(tmp_path, "model")
+    store.put_many([digest("a")], [vec(1)])
+    other = EmbeddingStore(tmp_path, "model")
+    with pytest.raises(RuntimeError):
+        store.compact()
+    other.close()
+    assert store.compact() > 0
+    np.testing.assert_array_equal(store.get_many([digest("a")])[digest("a")], vec(1))
+    store.close()
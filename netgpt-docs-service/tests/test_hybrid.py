@@ -0,0 +1,65 @@
+import asyncio
+import zlib
+from types import SimpleNamespace
+
+import numpy as np
+import pytest
+from qdrant_client import models
+
+from app import async_services
+
+
+class FakeSparseEmbedder:
+    """Bag of words: one index per distinct word (stands in for BM25/SPLADE)."""
+
+    def embed(self, texts):
+        for text in texts:
+            words = sorted({zlib.crc32(w.encode()) % 10_000 for w in text.lower().split()})
+            yield SimpleNamespace(indices=np.array(words), values=np.ones(len(words), dtype=np.float32))
+
+    query_embed = embed
+
+
+@pytest.fixture
+def hybrid(svc, monkeypatch):
+    monkeypatch.setattr(svc, "_sparse_embedder", FakeSparseEmbedder())
+    monkeypatch.setattr(svc, "HYBRID_SEARCH", True)
+    return svc
+
+
+def test_hybrid_schema_uses_named_vectors(svc, monkeypatch):
+    monkeypatch.setattr(svc, "SPARSE_MODEL", "Qdrant/bm25")
+    kwargs, info = svc.collection_schema("docs", 8, hybrid=True)
+    assert set(kwargs["vectors_config"]) == {info.vector_name}
+    assert kwargs["sparse_vectors_config"][info.sparse_name].modifier == models.Modifier.IDF
+
+    monkeypatch.setattr(svc, "SPARSE_MODEL", "prithivida/Splade_PP_en_v1")
+    kwargs, _ = svc.collection_schema("docs", 8, hybrid=True)
+    assert kwargs["sparse_vectors_config"][info.sparse_name].modifier is None
+
+
+def test_hybrid_query_fuses_dense_and_sparse_hits(hybrid):
+    hybrid.ingest_document("a", "ospf area border router\n\nbgp route reflector\n\nvlan trunk port")
+    info = hybrid.get_collection_registry().get("docs")
+    assert info.sparse_name is not None
+
+    results = hybrid.query_text("route reflector", top_k=1)
+    assert [r.chunk for r in results] == ["bgp route reflector"]
+    request = hybrid.hybrid_request(info, np.zeros(8, dtype=np.float32), models.SparseVector(indices=[1], values=[1.0]), 3)
+    assert [p.using for p in request.prefetch] == [info.vector_name, info.sparse_name]
+
+
+def test_hybrid_on_a_dense_collection_is_rejected(svc):
+    svc.ingest_document("a", "text")
+    info = svc.get_collection_registry().get("docs")
+    assert svc.use_hybrid(info, "docs", None) is False
+    with pytest.raises(ValueError, match="no sparse vectors"):
+        svc.query_text("text", hybrid=True)
+
+
+def test_async_hybrid_query(hybrid):
+    async def run():
+        await async_services.ingest_document("a", "ospf area\n\nbgp route reflector")
+        return await async_services.query_text("bgp reflector", top_k=1)
+
+    assert [r.chunk for r in asyncio.run(run())] == ["bgp route reflector"]
@@ -0,0 +1,59 @@
+import asyncio
+
+from fastapi.testclient import TestClient
+
+from app import async_services, main
+from conftest import document
+
+
+def count(svc, collection="docs") -> int:
+    return svc.get_client().count(collection).count
+
+
+def test_reingesting_the_same_document_is_a_no_op(svc, embedder):
+    first = svc.ingest_document("a", document("a", 3))
+    calls = len(embedder.calls)
+    again = svc.ingest_document("a", document("a", 3))
+
+    assert (first.new, first.unchanged, first.deleted) == (3, 0, 0)
+    assert (again.new, again.unchanged, again.deleted) == (0, 3, 0)
+    assert len(embedder.calls) == calls
+    assert count(svc) == 3
+
+
+def test_changed_chunks_replace_only_what_differs(svc, embedder):
+    svc.ingest_document("a", "one\n\ntwo\n\nthree")
+    embedder.calls.clear()
+    result = svc.ingest_document("a", "one\n\nTWO")
+
+    assert (result.chunks, result.new, result.unchanged, result.deleted) == (2, 1, 1, 2)
+    assert embedder.calls == [["TWO"]]
+    assert count(svc) == 2
+
+
+def test_point_ids_depend_on_document_position_and_content(svc):
+    digest = svc.content_hash("text")
+    assert svc.chunk_point_id("a", 0, digest) == svc.chunk_point_id("a", 0, digest)
+    assert len({svc.chunk_point_id(*key, digest) for key in [("a", 0), ("a", 1), ("b", 0)]}) == 3
+
+
+def test_documents_do_not_share_points(svc):
+    svc.ingest_document("a", "same text")
+    result = svc.ingest_document("b", "same text")
+    assert result.new == 1 and count(svc) == 2
+
+
+def test_async_reingest_matches_the_sync_path(svc):
+    async def run():
+        await async_services.ingest_document("a", "one\n\ntwo")
+        return await async_services.ingest_document("a", "one\n\nthree")
+
+    result = asyncio.run(run())
+    assert (result.new, result.unchanged, result.deleted) == (1, 1, 1)
+
+
+def test_ingest_endpoint_reports_counts(svc):
+    client = TestClient(main.app)
+    body = {"doc_id": "a", "text": document("a", 2)}
+    assert client.post("/ingest", json=body).json()["chunks_new"] == 2
+    assert client.post("/ingest", json=body).json()["chunks_unchanged"] == 2
@@ -0,0 +1,83 @@
+import time
+
+import pytest
+from fastapi.testclient import TestClient
+
+from app import jobs, main
+from app.config import INGEST_JOB_MAX_PRIORITY
+from app.jobs import IngestJobQueue, JobStore
+from conftest import document
+
+
+@pytest.fixture
+def job_db(tmp_path, monkeypatch):
+    path = tmp_path / "jobs" / "jobs.sqlite"
+    monkeypatch.setattr(jobs, "INGEST_JOBS_DB", str(path))
+    monkeypatch.setattr(jobs, "_queue", None)
+    yield path
+    jobs.shutdown()
+
+
+def wait_for(job_id: str, timeout: float = 10.0) -> dict:
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        job = jobs.get_job(job_id)
+        if job["status"] in ("done", "failed"):
+            return job
+        time.sleep(0.02)
+    raise AssertionError(f"job {job_id} did not finish")
+
+
+def test_claims_by_priority_then_least_recently_served_collection(tmp_path):
+    store = JobStore(str(tmp_path / "jobs.sqlite"))
+    low = store.enqueue("low", "a", "text")
+    urgent = store.enqueue("urgent", "a", "text", priority=5)
+    other = store.enqueue("other", "b", "text")
+    assert store.get(low)["queued_ahead"] == 1
+    assert store.claim_next({})[0] == urgent
+    # "a" was just served, so "b" goes before the next job of "a"
+    assert store.claim_next({"a": 2.0, "b": 1.0})[0] == other
+    assert store.claim_next({})[0] == low
+    assert store.claim_next({}) is None
+
+
+def test_lookup_does_not_create_the_database(job_db):
+    assert jobs.get_job("missing") is None
+    assert not job_db.exists()
+    assert jobs.job_stats() == {"workers": jobs.INGEST_JOB_WORKERS, "started": False}
+
+
+def test_stats_keep_worker_flag_and_status_counts_apart(tmp_path):
+    queue = IngestJobQueue(JobStore(str(tmp_path / "jobs.sqlite")), workers=1).start()
+    try:
+        stats = queue.stats()
+        assert stats["started"] is True and stats["running"] == 0
+    finally:
+        queue.stop()
+
+
+def test_priority_is_bounded(svc, job_db):
+    client = TestClient(main.app)
+    doc = {"doc_id": "a", "text": document("a", 2)}
+    for priority in (-1, INGEST_JOB_MAX_PRIORITY + 1):
+        response = client.post(f"/ingest?background=true&priority={priority}", json=doc)
+        assert response.status_code == 422
+    assert not job_db.exists()
+
+
+def test_background_job_runs_and_is_readable_after_restart(svc, job_db, monkeypatch):
+    client = TestClient(main.app)
+    response = client.post(
+        f"/ingest?background=true&priority={INGEST_JOB_MAX_PRIORITY}",
+        json={"doc_id": "a", "text": document("a", 3)},
+    )
+    assert response.status_code == 202
+    job = wait_for(response.json()["job_id"])
+    assert job["status"] == "done" and job["result"]["new"] == 3
+
+    # Without a running queue the job is read from the database, read-only
+    jobs.shutdown()
+    monkeypatch.setattr(jobs, "_queue", None)
+    assert client.get(f"/ingest/jobs/{job['id']}").json()["status"] == "done"
+    assert jobs._queue is None
+    assert client.get("/ingest/jobs/unknown").status_code == 404
@@ -0,0 +1,41 @@
+import pytest
+from fastapi.testclient import TestClient
+
+from app import main, metrics
+from conftest import document
+
+
+def test_only_known_collections_are_used_as_labels(svc):
+    svc.ingest_document("a", document("a", 2))
+    svc.query_text("paragraph")
+    with pytest.raises(Exception):
+        svc.query_text("paragraph", collection="made-up-by-a-client")
+
+    text = metrics.render()
+    assert 'docservice_queries_total{collection="docs",cache="miss"}' in text
+    assert 'docservice_ingest_documents_total{collection="docs"}' in text
+    assert "made-up-by-a-client" not in text
+    assert 'docservice_queries_total{collection="other",cache="miss"}' in text
+    assert 'stage="search",collection="other"' in text
+
+
+def test_deleted_collection_label_falls_back_to_other(svc):
+    svc.ingest_document("a", document("a", 2), collection="short-lived")
+    assert metrics.collection_label("short-lived") == "short-lived"
+    svc.delete_collection("short-lived")
+    assert metrics.collection_label("short-lived") == "other"
+    assert metrics.collection_label("") == ""
+
+
+def test_metrics_endpoint_and_server_timing(svc, monkeypatch):
+    monkeypatch.setattr(main, "SERVER_TIMING", True)
+    client = TestClient(main.app)
+    response = client.post("/ingest", json={"doc_id": "a", "text": document("a", 2)})
+    timings = response.headers["Server-Timing"]
+    assert "embed;dur=" in timings and "total;dur=" in timings
+
+    scrape = client.get("/metrics")
+    assert scrape.headers["content-type"].startswith("text/plain")
+    assert 'docservice_http_requests_total{method="POST",route="/ingest",status="200"}' in scrape.text
+    assert client.get("/no-such-route").status_code == 404
+    assert 'route="unmatched"' in client.get("/metrics").text
@@ -0,0 +1,55 @@
+import json
+
+from fastapi.testclient import TestClient
+
+from app import main
+from app.pipeline import IngestPipeline
+from conftest import document
+
+
+def run_pipeline(lines: list[bytes], **kwargs) -> list[dict]:
+    pipeline = IngestPipeline(**kwargs).start()
+    for line_no, raw in enumerate(lines, start=1):
+        pipeline.submit_line(line_no, raw)
+    pipeline.close()
+    return [json.loads(line) for line in pipeline.iter_results()]
+
+
+def doc_line(doc_id: str, text: str, **extra) -> bytes:
+    return json.dumps({"doc_id": doc_id, "text": text, **extra}).encode()
+
+
+def points_of(svc, doc_id: str) -> int:
+    return svc.get_client().count("docs", count_filter=svc._doc_filter(doc_id)).count
+
+
+def test_repeated_doc_id_replaces_the_earlier_version(svc):
+    first = [doc_line(f"b{i}", document(f"old b{i}", 4)) for i in range(3)]
+    second = [doc_line(f"b{i}", document(f"new b{i}", 4)) for i in range(3)]
+    results = run_pipeline(first + second, queue_size=8)
+
+    assert [r["status"] for r in results] == ["success"] * 6
+    assert [r["chunks_deleted"] for r in results[3:]] == [4, 4, 4]
+    assert [points_of(svc, f"b{i}") for i in range(3)] == [4, 4, 4]
+
+
+def test_unchanged_repeat_is_skipped(svc):
+    line = doc_line("same", document("same", 3))
+    results = run_pipeline([line, line])
+    assert results[1]["chunks_new"] == 0 and results[1]["chunks_unchanged"] == 3
+    assert points_of(svc, "same") == 3
+
+
+def test_bad_lines_report_errors_in_order(svc):
+    results = run_pipeline([b"{not json", doc_line("ok", "one\n\ntwo"), doc_line("empty", "")])
+    assert [(r["line"], r["status"]) for r in results] == [(1, "error"), (2, "success"), (3, "error")]
+    assert results[0]["detail"].startswith("Invalid document")
+    assert results[2]["detail"] == "No content to ingest."
+
+
+def test_bulk_endpoint_streams_one_result_per_line(svc):
+    body = b"\n".join([doc_line("a", "x\n\ny"), b"", doc_line("b", "z", collection="other")]) + b"\n"
+    response = TestClient(main.app).post("/ingest/bulk", content=body)
+    assert response.status_code == 200
+    results = [json.loads(line) for line in response.text.splitlines()]
+    assert [(r["line"], r["doc_id"], r["collection"]) for r in results] == [(1, "a", "docs"), (3, "b", "other")]
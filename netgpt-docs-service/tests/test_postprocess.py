@@ -0,0 +1,103 @@
+from types import SimpleNamespace
+
+import numpy as np
+import pytest
+
+from app import postprocess
+from app.postprocess import CrossEncoderReranker, PostProcess
+from conftest import document
+
+
+def hit(doc_id: str, chunk: str, score: float, vector=None):
+    return SimpleNamespace(payload={"doc_id": doc_id, "chunk": chunk, "content_hash": chunk, "lang": "en"}, score=score, vector=vector)
+
+
+class FakeCrossEncoder:
+    """Scores a pair by how often the query's first word occurs in the text."""
+
+    def __init__(self):
+        self.pairs: list = []
+
+    def rerank_pairs(self, pairs, batch_size):
+        self.pairs.extend(pairs)
+        return [text.count(query.split()[0]) for query, text in pairs]
+
+
+@pytest.fixture
+def reranker(monkeypatch):
+    reranker = CrossEncoderReranker("fake")
+    reranker._model = FakeCrossEncoder()
+    monkeypatch.setattr(postprocess, "_reranker", reranker)
+    return reranker
+
+
+def test_collapse_keeps_the_best_hit_per_document():
+    hits = [hit("a", "1", 0.9), hit("a", "2", 0.8), hit("b", "3", 0.7)]
+    results = postprocess.apply("q", None, hits, 5, PostProcess(collapse=True))
+    assert [(r.doc_id, r.chunk) for r in results] == [("a", "1"), ("b", "3")]
+
+
+def test_mmr_skips_near_duplicates():
+    query = [1.0, 0.0]
+    vectors = [[1.0, 0.0], [0.99, 0.01], [0.7, 0.7]]
+    assert postprocess.mmr_order(query, vectors, 2, lam=1.0) == [0, 1]
+    assert postprocess.mmr_order(query, vectors, 2, lam=0.3) == [0, 2]
+
+
+def test_mmr_uses_the_named_vector_of_each_hit():
+    hits = [hit(str(i), str(i), 1.0, {"dense": v}) for i, v in enumerate([[1, 0], [0.99, 0.01], [0.7, 0.7]])]
+    results = postprocess.apply("q", np.array([1.0, 0.0]), hits, 2, PostProcess(mmr=0.3), "dense")
+    assert [r.doc_id for r in results] == ["0", "2"]
+
+
+def test_snippet_is_a_window_around_the_first_query_term():
+    text = "x" * 100 + " routing table " + "y" * 100
+    snippet = postprocess.make_snippet(text, "the routing", 40)
+    assert len(snippet) == 46 and "routing" in snippet
+    assert snippet.startswith("...") and snippet.endswith("...")
+    assert postprocess.make_snippet("short", "q", 40) == "short"
+
+
+def test_fields_limit_the_payload():
+    post = PostProcess(fields=("lang",))
+    assert post.with_payload() == ["doc_id", "lang"]
+    result = postprocess.to_result(hit("a", "text", 0.5), post)
+    assert (result.chunk, result.payload) == (None, {"lang": "en"})
+    assert PostProcess().with_payload() is True
+
+
+def test_reordering_steps_fetch_more_candidates(monkeypatch):
+    monkeypatch.setattr(postprocess, "POSTPROCESS_CANDIDATES_FACTOR", 4)
+    monkeypatch.setattr(postprocess, "RERANK_CANDIDATES", 30)
+    assert PostProcess().fetch_limit(5) == 5
+    assert PostProcess(collapse=True).fetch_limit(5) == 20
+    assert PostProcess(rerank=True).fetch_limit(5) == 30
+
+
+def test_rerank_orders_by_cross_encoder_score_and_caches_pairs(reranker):
+    hits = [hit("a", "bgp", 0.9), hit("b", "bgp bgp bgp", 0.5), hit("c", "bgp bgp", 0.4)]
+    results = postprocess.apply("bgp peers", None, hits, 2, PostProcess(rerank=True))
+    assert [(r.doc_id, r.rerank_score) for r in results] == [("b", 3.0), ("c", 2.0)]
+
+    postprocess.apply("bgp  peers", None, hits, 2, PostProcess(rerank=True))
+    assert len(reranker._model.pairs) == 3
+
+
+def test_batch_reranks_all_queries_in_one_pass(reranker):
+    items = [
+        ("bgp", None, [hit("a", "bgp", 0.9)], 1, PostProcess(rerank=True), None),
+        ("ospf", None, [hit("b", "ospf", 0.9)], 1, PostProcess(), None),
+        ("isis", None, [hit("c", "isis", 0.9)], 1, PostProcess(rerank=True), None),
+    ]
+    results = postprocess.apply_many(items)
+    assert [r[0].doc_id for r in results] == ["a", "b", "c"]
+    assert [pair[0] for pair in reranker._model.pairs] == ["bgp", "isis"]
+
+
+def test_query_collapses_and_snips_end_to_end(svc):
+    svc.ingest_document("a", document("a", 3))
+    svc.ingest_document("b", document("b", 3))
+    post = postprocess.resolve_postprocess(collapse=True, snippet=8, mmr=False, rerank=False)
+    results = svc.query_text("paragraph", top_k=5, post=post)
+    assert sorted(r.doc_id for r in results) == ["a", "b"]
+    assert all(len(r.chunk) <= 14 for r in results)
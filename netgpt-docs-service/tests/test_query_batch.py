@@ -0,0 +1,51 @@
+import asyncio
+
+from fastapi.testclient import TestClient
+
+from app import async_services, main
+from app.models import QueryIn
+from conftest import document
+
+
+def test_batch_answers_in_order_with_one_embedding_call(svc, embedder):
+    svc.ingest_document("a", document("a", 3))
+    svc.ingest_document("b", document("b", 3), collection="other")
+    embedder.calls.clear()
+
+    queries = [QueryIn(query="a paragraph 2", top_k=1), QueryIn(query="b paragraph 0", top_k=1, collection="other")]
+    results = svc.query_batch(queries)
+
+    assert [r[0].chunk for r in results] == ["a paragraph 2", "b paragraph 0"]
+    assert embedder.calls == [["a paragraph 2", "b paragraph 0"]]
+
+
+def test_batch_matches_single_queries_and_reuses_the_cache(svc, embedder):
+    svc.ingest_document("a", document("a", 4))
+    single = svc.query_text("a paragraph 1", top_k=3)
+    embedder.calls.clear()
+
+    results = svc.query_batch([QueryIn(query="a paragraph 1", top_k=3), QueryIn(query="a  paragraph 1", top_k=3)])
+    assert results == [single, single]
+    assert embedder.calls == []
+
+
+def test_async_batch_matches_the_sync_path(svc):
+    queries = [QueryIn(query=f"a paragraph {i}", top_k=2) for i in range(3)]
+
+    async def run():
+        await async_services.ingest_document("a", document("a", 3))
+        return await async_services.query_batch(queries)
+
+    svc.ingest_document("a", document("a", 3))
+    assert asyncio.run(run()) == svc.query_batch(queries)
+
+
+def test_batch_endpoint_limits_the_batch_size(svc, monkeypatch):
+    monkeypatch.setattr(main, "QUERY_BATCH_MAX", 2)
+    client = TestClient(main.app)
+    client.post("/ingest", json={"doc_id": "a", "text": document("a", 2)})
+
+    response = client.post("/query/batch", json={"queries": [{"query": "paragraph", "top_k": 1}] * 2})
+    assert response.status_code == 200 and [len(r) for r in response.json()] == [1, 1]
+    assert client.post("/query/batch", json={"queries": [{"query": "x"}] * 3}).status_code == 400
+    assert client.post("/query/batch", json={"queries": []}).status_code == 422
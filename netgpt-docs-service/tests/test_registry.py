@@ -0,0 +1,86 @@
+import asyncio
+
+import pytest
+from qdrant_client.http.exceptions import UnexpectedResponse
+
+from app import async_services
+from app.registry import CollectionInfo, CollectionRegistry, is_not_found
+from conftest import document
+
+
+def not_found(*args, **kwargs):
+    raise UnexpectedResponse(404, "Not Found", b'{"status": {"error": "Not found: Collection `docs` doesn\'t exist!"}}', None)
+
+
+async def async_not_found(*args, **kwargs):
+    not_found()
+
+
+def test_registry_expires_entries(monkeypatch):
+    registry = CollectionRegistry(ttl_seconds=10)
+    registry.put(CollectionInfo("docs", size=8, cached_at=0.0))
+    monkeypatch.setattr("app.registry.time.monotonic", lambda: 5.0)
+    assert registry.get("docs").size == 8
+    monkeypatch.setattr("app.registry.time.monotonic", lambda: 11.0)
+    assert registry.get("docs") is None
+
+
+def test_is_not_found_looks_through_wrapping():
+    try:
+        try:
+            not_found()
+        except UnexpectedResponse as e:
+            raise RuntimeError("wrapped") from e
+    except RuntimeError as e:
+        assert is_not_found(e)
+    assert not is_not_found(ValueError("bad request"))
+
+
+def test_search_not_found_forgets_the_collection(svc):
+    svc.ingest_document("a", document("a", 2))
+    assert svc.get_collection_registry().get("docs") is not None
+    svc.get_client().query_batch_points = not_found
+    with pytest.raises(UnexpectedResponse):
+        svc.query_text("paragraph")
+    assert svc.get_collection_registry().get("docs") is None
+
+
+def test_ingest_recreates_a_collection_deleted_elsewhere(svc):
+    svc.ingest_document("a", document("a", 2))
+    client = svc.get_client()
+    # Deleted behind the service's back; a server answers the scroll with 404
+    client.delete_collection("docs")
+    scroll = client.scroll
+    client.scroll = not_found
+
+    result = svc.ingest_document("a", document("a", 3))
+    assert (result.new, result.unchanged) == (3, 0)
+    client.scroll = scroll
+    assert client.count("docs").count == 3
+    assert svc.get_collection_registry().get("docs") is not None
+
+
+def test_async_ingest_recreates_a_collection_deleted_elsewhere(svc):
+    async def run():
+        await async_services.ingest_document("a", document("a", 2))
+        client = await async_services.get_async_client()
+        await client.delete_collection("docs")
+        scroll = client.scroll
+        client.scroll = async_not_found
+        result = await async_services.ingest_document("a", document("a", 3))
+        client.scroll = scroll
+        return result, (await client.count("docs")).count
+
+    result, count = asyncio.run(run())
+    assert (result.new, count) == (3, 3)
+
+
+def test_memory_mode_keeps_sync_and_async_collections_apart(svc):
+    # Each client is its own in-memory database
+    asyncio.run(async_services.ingest_document("a", document("a", 2), collection="c1"))
+    assert async_services.get_collection_registry().get("c1") is not None
+    assert svc.get_collection_registry().get("c1") is None
+
+    result = svc.ingest_document("a", document("a", 3), collection="c1")
+    assert result.new == 3
+    assert svc.get_client().count("c1").count == 3
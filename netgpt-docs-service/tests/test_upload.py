@@ -0,0 +1,77 @@
+import asyncio
+
+import numpy as np
+import pytest
+from qdrant_client import AsyncQdrantClient, models
+
+from app import upload
+from app.services import IngestPlan
+from conftest import DIM, FakeEmbedder
+
+
+class RecordingClient:
+    """Records upserts; fails the first ``failures`` calls."""
+
+    def __init__(self, failures: int = 0):
+        self.failures = failures
+        self.calls: list[models.Batch] = []
+
+    def upsert(self, collection_name, points, wait):
+        if self.failures:
+            self.failures -= 1
+            raise ConnectionError("transient")
+        self.calls.append(points)
+
+
+def embedded_plan(chunks: int, vector_name=None, sparse_name=None) -> IngestPlan:
+    plan = IngestPlan.build("doc", "docs", [f"chunk {i}" for i in range(chunks)])
+    plan.vector_name, plan.sparse_name = vector_name, sparse_name
+    plan.embeddings = list(FakeEmbedder().embed(plan.texts))
+    if sparse_name:
+        plan.sparse_embeddings = [models.SparseVector(indices=[i], values=[1.0]) for i in range(chunks)]
+    return plan
+
+
+@pytest.fixture(autouse=True)
+def small_slices(monkeypatch):
+    monkeypatch.setattr(upload, "UPLOAD_BATCH_SIZE", 2)
+    monkeypatch.setattr(upload, "UPLOAD_RETRY_BACKOFF", 0)
+
+
+def test_plan_is_upserted_in_slices():
+    client = RecordingClient()
+    assert upload.upload_plan(client, embedded_plan(5)) == 5
+    assert [len(batch.ids) for batch in client.calls] == [2, 2, 1]
+    assert len(client.calls[0].vectors[0]) == DIM
+
+
+def test_failed_slice_is_retried(monkeypatch):
+    client = RecordingClient(failures=2)
+    assert upload.upload_plan(client, embedded_plan(2)) == 2
+    assert len(client.calls) == 1
+
+
+def test_retries_are_bounded(monkeypatch):
+    monkeypatch.setattr(upload, "UPLOAD_MAX_RETRIES", 1)
+    with pytest.raises(ConnectionError):
+        upload.upload_plan(RecordingClient(failures=5), embedded_plan(1))
+
+
+def test_async_upload_uses_the_async_client():
+    async def run():
+        client = AsyncQdrantClient(location=":memory:")
+        await client.create_collection(
+            "docs",
+            vectors_config={"dense": models.VectorParams(size=DIM, distance=models.Distance.COSINE)},
+            sparse_vectors_config={"sparse": models.SparseVectorParams()},
+        )
+        written = await upload.upload_plan_async(client, embedded_plan(5, "dense", "sparse"))
+        return written, (await client.count("docs")).count
+
+    assert asyncio.run(run()) == (5, 5)
+
+
+def test_slices_carry_float32_arrays_until_sent():
+    ids, vectors, payloads = next(embedded_plan(3).upload_batches(2))
+    assert isinstance(vectors, np.ndarray) and vectors.dtype == np.float32
+    assert [p["chunk_index"] for p in payloads] == [0, 1]
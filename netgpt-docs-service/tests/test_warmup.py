@@ -0,0 +1,45 @@
+import asyncio
+
+from fastapi.testclient import TestClient
+
+from app import async_services, main, warmup
+from app.warmup import WarmupState
+
+
+def test_warmup_runs_every_phase_and_loads_collection_metadata(svc, monkeypatch):
+    monkeypatch.setattr(warmup, "get_chunker", lambda: None)
+
+    async def run():
+        await async_services.ingest_document("a", "text")
+        async_services.get_collection_registry().clear()
+        state = WarmupState(enabled=True)
+        await warmup.run_warmup(state)
+        return state
+
+    state = asyncio.run(run())
+    assert state.ready and state.error is None
+    assert {"chunker_load", "embedder_load", "inference", "qdrant_client", "collections"} <= set(state.phases)
+    assert state.collections["docs"]["size"] == 8
+
+
+def test_failed_warmup_is_reported_and_not_ready(svc, monkeypatch):
+    def broken():
+        raise OSError("model download failed")
+
+    monkeypatch.setattr(warmup, "get_chunker", broken)
+    state = WarmupState(enabled=True)
+    asyncio.run(warmup.run_warmup(state))
+    body = state.as_dict()
+    assert (body["ready"], body["warmup"]) == (False, "done")
+    assert body["error"] == "OSError: model download failed"
+
+
+def test_ready_probe_follows_the_warmup_state(svc, monkeypatch):
+    client = TestClient(main.app)
+    assert client.get("/ready").json()["warmup"] == "disabled"
+
+    monkeypatch.setattr(main, "warmup_state", WarmupState(enabled=True))
+    assert client.get("/ready").status_code == 503
+    assert client.get("/health").status_code == 200
+    main.warmup_state.done = True
+    assert client.get("/ready").status_code == 200